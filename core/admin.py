@@ -2,7 +2,7 @@ from django.contrib import admin
 from .models import (
     UserProfile, Subject, ClassSubject, StudyMaterial, VideoConference,
     RecordedSession, Assignment, AssignmentSubmission,
-    AITutorSession, AITutorMessage
+    AITutorSession, AITutorMessage, EmailOutbox
 )
 
 class UserProfileAdmin(admin.ModelAdmin):
@@ -54,6 +54,11 @@ class AITutorSessionAdmin(admin.ModelAdmin):
     search_fields = ('student__username',)
     inlines = [AITutorMessageInline]
 
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'provider')
+    search_fields = ('to_email', 'subject', 'idempotency_key')
+
 admin.site.register(UserProfile, UserProfileAdmin)
 admin.site.register(Subject)
 admin.site.register(ClassSubject, ClassSubjectAdmin)
@@ -64,3 +69,4 @@ admin.site.register(Assignment, AssignmentAdmin)
 admin.site.register(AssignmentSubmission, AssignmentSubmissionAdmin)
 admin.site.register(AITutorSession, AITutorSessionAdmin)
 admin.site.register(AITutorMessage)
+admin.site.register(EmailOutbox, EmailOutboxAdmin)
@@ -1,13 +1,376 @@
 import os
+import re
 import json
-from openai import OpenAI
+import time
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from openai import OpenAI, AsyncOpenAI
+
+logger = logging.getLogger(__name__)
 
 # The newest OpenAI model is "gpt-4o" which was released May 13, 2024.
 # do not change this unless explicitly requested by the user
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 openai = OpenAI(api_key=OPENAI_API_KEY)
 
-def get_ai_response(question, subject_name=None, role='student', class_level=None, class_subjects=None, thread_context=None, edit_context=None):
+# Async client used by the async (ASGI) views and the streaming endpoint
+async_openai = AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+# Bulk quiz question generation: requests are split into batches generated in
+# parallel, and up to QUIZ_QUESTION_ROUNDS rounds top up invalid or duplicate ones
+MAX_GENERATED_QUESTIONS = 50
+QUIZ_QUESTION_BATCH_SIZE = 10
+QUIZ_QUESTION_WORKERS = int(os.getenv('AI_QUIZ_QUESTION_WORKERS', '5'))
+QUIZ_QUESTION_ROUNDS = 3
+# Existing questions listed in the prompt so they are not repeated
+QUIZ_QUESTION_AVOID_LIMIT = 30
+QUIZ_OPTION_MAX_LENGTH = 255
+
+AI_ERROR_MESSAGE = (
+    "I'm sorry, I'm having trouble processing your question right now. "
+    "Please try again in a moment."
+)
+
+
+class AIStreamError(Exception):
+    """Raised by stream_ai_response when the answer cannot be completed"""
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a string (roughly 4 characters per token for English)"""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+def log_token_usage(label, messages, usage=None):
+    """
+    Log the token cost of a chat completion request
+    
+    Args:
+        label (str): Which call made the request
+        messages (list): The messages sent to the model
+        usage (CompletionUsage, optional): Usage reported by the API, if any
+    """
+    system_tokens = sum(estimate_tokens(m['content']) for m in messages if m['role'] == 'system')
+    history_tokens = sum(estimate_tokens(m['content']) for m in messages[:-1] if m['role'] in ('user', 'assistant'))
+    question_tokens = estimate_tokens(messages[-1]['content']) if messages else 0
+    
+    if usage is not None:
+        logger.info(
+            f"{label} tokens: system~{system_tokens} history~{history_tokens} question~{question_tokens} "
+            f"prompt={usage.prompt_tokens} completion={usage.completion_tokens} total={usage.total_tokens}"
+        )
+    else:
+        logger.info(
+            f"{label} tokens: system~{system_tokens} history~{history_tokens} question~{question_tokens} "
+            f"prompt~{system_tokens + history_tokens + question_tokens}"
+        )
+
+
+class AIResponseCache:
+    """
+    In-process cache of AI tutor answers for repeated questions
+    
+    Answers are grouped by context (role, class level, subject and curriculum).
+    A lookup first tries an exact match on the normalized question, then a
+    near-duplicate match using the Jaccard similarity of character shingles,
+    so "What is photosynthesis?" and "what's photosynthesis" share an answer.
+    Entries expire after a TTL and the least recently used entries are
+    evicted once the cache is full.
+    """
+    
+    SHINGLE_SIZE = 3
+    
+    def __init__(self, max_entries=2000, ttl_seconds=6 * 60 * 60, similarity_threshold=0.8):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()  # (context_key, normalized question) -> entry
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+    
+    @staticmethod
+    def normalize(question):
+        """Lowercase the question and strip punctuation and extra whitespace"""
+        question = re.sub(r"\bwhat'?s\b", "what is", question.lower())
+        return " ".join(re.sub(r"[^a-z0-9\s]", " ", question).split())
+    
+    @staticmethod
+    def context_key(subject_name, role, class_level, class_subjects):
+        """Key for everything besides the question that shapes the answer"""
+        subjects = tuple(sorted(class_subjects)) if class_subjects else ()
+        return (role, class_level or '', (subject_name or '').lower(), subjects)
+    
+    @classmethod
+    def shingles(cls, normalized):
+        """Character shingles of a normalized question"""
+        text = f" {normalized} "
+        if len(text) <= cls.SHINGLE_SIZE:
+            return frozenset([text])
+        return frozenset(text[i:i + cls.SHINGLE_SIZE] for i in range(len(text) - cls.SHINGLE_SIZE + 1))
+    
+    @staticmethod
+    def similarity(shingles, other):
+        """Jaccard similarity of two shingle sets"""
+        overlap = len(shingles & other)
+        return overlap / (len(shingles) + len(other) - overlap)
+    
+    def get(self, question, subject_name=None, role='student', class_level=None, class_subjects=None):
+        """Return a cached answer for the question, or None on a miss"""
+        normalized = self.normalize(question)
+        context = self.context_key(subject_name, role, class_level, class_subjects)
+        now = time.monotonic()
+        
+        with self._lock:
+            key = (context, normalized)
+            entry = self._entries.get(key)
+            if entry and now - entry['created'] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['answer']
+            
+            # Near-duplicate tier: the most similar question in the same context.
+            # Numbers must match exactly so "2 + 3" never reuses the answer to "2 + 4".
+            shingles = self.shingles(normalized)
+            numbers = re.findall(r"\d+", normalized)
+            best_key, best_score = None, self.similarity_threshold
+            for candidate_key, candidate in self._entries.items():
+                if candidate_key[0] != context or now - candidate['created'] >= self.ttl_seconds:
+                    continue
+                if candidate['numbers'] != numbers:
+                    continue
+                score = self.similarity(shingles, candidate['shingles'])
+                if score >= best_score:
+                    best_key, best_score = candidate_key, score
+            
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self.near_hits += 1
+                return self._entries[best_key]['answer']
+            
+            self.misses += 1
+            return None
+    
+    def set(self, question, answer, subject_name=None, role='student', class_level=None, class_subjects=None):
+        """Store an answer, evicting expired and least recently used entries"""
+        if not answer or answer == AI_ERROR_MESSAGE:
+            return
+        
+        normalized = self.normalize(question)
+        context = self.context_key(subject_name, role, class_level, class_subjects)
+        now = time.monotonic()
+        
+        with self._lock:
+            key = (context, normalized)
+            self._entries[key] = {
+                'answer': answer,
+                'created': now,
+                'shingles': self.shingles(normalized),
+                'numbers': re.findall(r"\d+", normalized),
+            }
+            self._entries.move_to_end(key)
+            
+            # Oldest entries sit at the front, so expired ones are dropped first
+            while self._entries:
+                oldest_key, oldest = next(iter(self._entries.items()))
+                if len(self._entries) > self.max_entries or now - oldest['created'] >= self.ttl_seconds:
+                    self._entries.pop(oldest_key)
+                else:
+                    break
+    
+    def record_bypass(self):
+        with self._lock:
+            self.bypasses += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'bypasses': self.bypasses,
+                'hit_rate': (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            }
+
+
+response_cache = AIResponseCache(
+    max_entries=int(os.getenv('AI_RESPONSE_CACHE_SIZE', '2000')),
+    ttl_seconds=int(os.getenv('AI_RESPONSE_CACHE_TTL', str(6 * 60 * 60))),
+    similarity_threshold=float(os.getenv('AI_RESPONSE_CACHE_SIMILARITY', '0.8')),
+)
+
+
+BASE_SYSTEM_PROMPT = (
+    "You are an AI tutor for a CBSE educational platform called the360learning. "
+    "Your goal is to help users understand concepts and learn effectively. "
+)
+
+ROLE_SYSTEM_PROMPTS = {
+    'student': (
+        "You are responding to a student who needs help understanding concepts. "
+        "Provide explanations that are clear, accurate, and tailored to the student's "
+        "educational level. Break down complex topics into simpler parts. "
+        "Provide examples that are age-appropriate and align with their curriculum. "
+        "Be encouraging and supportive.\n\n"
+        "IMPORTANT: You must only provide information that is relevant to the student's class level "
+        "and the subjects in their curriculum. If they ask questions about topics outside "
+        "their curriculum or beyond their class level, politely inform them that the topic "
+        "is not part of their current syllabus, and suggest alternatives within their curriculum."
+    ),
+    'teacher': (
+        "You are responding to a teacher who might need assistance with teaching concepts, "
+        "creating lesson plans, or finding resources. Provide pedagogical suggestions, "
+        "teaching methodologies, and content that is appropriate for their class level. "
+        "Offer ideas for classroom activities and assessments.\n\n"
+        "IMPORTANT: Focus your responses on the class level and subjects that this teacher is responsible for. "
+        "Provide teaching methodologies and resources specifically tailored for these subjects and class level."
+    ),
+    'admin': (
+        "You are responding to a school administrator who might need information about "
+        "educational management, curriculum planning, or system features. Provide "
+        "comprehensive information that can help with administrative decisions."
+    ),
+}
+
+# Special instruction for keeping responses appropriate and accurate
+ACCURACY_SYSTEM_PROMPT = (
+    " Strictly provide educational content that is factually accurate and grade-appropriate. "
+    "Do not invent curriculum content or provide speculative information. "
+    "If you're unsure about specific CBSE curriculum details, be honest about your limitations "
+    "and provide general educational guidance that is age-appropriate instead."
+)
+
+
+def get_system_prompt_prefix(role='student'):
+    """
+    Return the part of the system prompt that only depends on the user's role
+    
+    Every system prompt starts with this prefix, and the more specific parts
+    (class level, subject, curriculum) are appended after it, so the leading
+    tokens are identical across requests and provider-side prompt caching can hit.
+    """
+    return BASE_SYSTEM_PROMPT + ROLE_SYSTEM_PROMPTS.get(role, ROLE_SYSTEM_PROMPTS['admin']) + ACCURACY_SYSTEM_PROMPT
+
+
+@lru_cache(maxsize=2048)
+def get_system_prompt(role='student', class_level=None, subject_name=None, class_subjects=()):
+    """
+    Build the AI tutor system prompt, memoized per combination of arguments
+    
+    Args:
+        role (str): The user's role (student, teacher, admin)
+        class_level (str, optional): The class level the user is assigned to
+        subject_name (str, optional): The subject context for the question
+        class_subjects (tuple): Sorted subject names in the user's class curriculum
+        
+    Returns:
+        str: The system prompt
+    """
+    system_message = get_system_prompt_prefix(role)
+    
+    # Add class level context with specific details about what should be taught at this level
+    if class_level:
+        class_level_display = get_class_level_display(class_level)
+        system_message += f" The user is associated with {class_level_display}."
+        
+        # Add age-appropriate context for students
+        if role == 'student':
+            age_appropriate_content = get_age_appropriate_content_by_class(class_level)
+            if age_appropriate_content:
+                system_message += f" {age_appropriate_content}"
+    
+    # Add subject context if provided with strong guidance to stay within subject boundaries
+    if subject_name:
+        system_message += (
+            f" The user is asking about the subject of {subject_name}. "
+            f"Your responses should focus specifically on this subject within the context "
+            f"of their class level and curriculum."
+        )
+        
+        # Add CBSE curriculum specific guidance if we have subject and class level
+        if class_level and role in ['student', 'teacher']:
+            subject_specific_guidance = get_subject_curriculum_guidance(subject_name, class_level)
+            if subject_specific_guidance:
+                system_message += f" {subject_specific_guidance}"
+    
+    # Add curriculum context if available with explicit constraints
+    if class_subjects:
+        subjects_list = ", ".join(class_subjects)
+        system_message += (
+            f" The curriculum for this class includes these subjects: {subjects_list}. "
+            f"These are the only subjects this user should be learning about at their level. "
+            f"If they ask about subjects outside this list, politely explain that it's not part "
+            f"of their current curriculum."
+        )
+    
+    return system_message
+
+
+def clear_system_prompt_cache():
+    """Drop memoized system prompts, e.g. after subjects or class curricula change"""
+    get_system_prompt.cache_clear()
+
+
+def build_ai_messages(question, subject_name=None, role='student', class_level=None, class_subjects=None, thread_context=None, edit_context=None, history=None):
+    """
+    Build the chat messages sent to the AI tutor model
+    
+    Args:
+        question (str): The user's question
+        subject_name (str, optional): The subject context for the question
+        role (str): The user's role (student, teacher, admin)
+        class_level (str, optional): The class level the user is assigned to
+        class_subjects (list, optional): List of subjects in the user's class curriculum
+        thread_context (str, optional): Context for thread replies to provide continuity
+        edit_context (str, optional): Context information when a question has been edited
+        history (list, optional): Earlier conversation messages in the OpenAI chat format
+        
+    Returns:
+        list: Messages in the OpenAI chat format
+    """
+    system_message = get_system_prompt(
+        role,
+        class_level or None,
+        subject_name or None,
+        tuple(sorted(class_subjects)) if class_subjects else ()
+    )
+    
+    # Create messages array
+    messages = [{"role": "system", "content": system_message}]
+    
+    # Add thread context if available to maintain thread continuity
+    if thread_context:
+        messages.append({"role": "system", "content": f"CONTEXT: {thread_context}"})
+    
+    # Add edit context if this is an edited message
+    if edit_context:
+        messages.append({"role": "system", "content": f"CONTEXT: {edit_context}"})
+    
+    # Add earlier turns of the conversation
+    if history:
+        messages.extend(history)
+    
+    # Add the user question
+    messages.append({"role": "user", "content": question})
+    
+    return messages
+
+
+def get_ai_response(question, subject_name=None, role='student', class_level=None, class_subjects=None, thread_context=None, edit_context=None, history=None):
     """
     Get a response from the AI tutor for a student question
     
@@ -19,121 +382,165 @@ def get_ai_response(question, subject_name=None, role='student', class_level=Non
         class_subjects (list, optional): List of subjects in the user's class curriculum
         thread_context (str, optional): Context for thread replies to provide continuity
         edit_context (str, optional): Context information when a question has been edited
+        history (list, optional): Earlier conversation messages, see conversation_service
         
     Returns:
         str: The AI-generated response
     """
+    # Thread replies, edits and follow-ups depend on earlier messages, so they are never cached
+    cacheable = not thread_context and not edit_context and not history
+    if cacheable:
+        cached = response_cache.get(question, subject_name, role, class_level, class_subjects)
+        if cached is not None:
+            return cached
+    else:
+        response_cache.record_bypass()
+    
     try:
-        # Create a system message that guides the AI to provide educational responses
-        system_message = (
-            "You are an AI tutor for a CBSE educational platform called the360learning. "
-            "Your goal is to help users understand concepts and learn effectively. "
+        messages = build_ai_messages(
+            question,
+            subject_name=subject_name,
+            role=role,
+            class_level=class_level,
+            class_subjects=class_subjects,
+            thread_context=thread_context,
+            edit_context=edit_context,
+            history=history
         )
         
-        # Add role-specific context and constraints
-        if role == 'student':
-            system_message += (
-                "You are responding to a student who needs help understanding concepts. "
-                "Provide explanations that are clear, accurate, and tailored to the student's "
-                "educational level. Break down complex topics into simpler parts. "
-                "Provide examples that are age-appropriate and align with their curriculum. "
-                "Be encouraging and supportive.\n\n"
-                "IMPORTANT: You must only provide information that is relevant to the student's class level "
-                "and the subjects in their curriculum. If they ask questions about topics outside "
-                "their curriculum or beyond their class level, politely inform them that the topic "
-                "is not part of their current syllabus, and suggest alternatives within their curriculum."
-            )
-        elif role == 'teacher':
-            system_message += (
-                "You are responding to a teacher who might need assistance with teaching concepts, "
-                "creating lesson plans, or finding resources. Provide pedagogical suggestions, "
-                "teaching methodologies, and content that is appropriate for their class level. "
-                "Offer ideas for classroom activities and assessments.\n\n"
-                "IMPORTANT: Focus your responses on the class level and subjects that this teacher is responsible for. "
-                "Provide teaching methodologies and resources specifically tailored for these subjects and class level."
-            )
-        else:  # admin
-            system_message += (
-                "You are responding to a school administrator who might need information about "
-                "educational management, curriculum planning, or system features. Provide "
-                "comprehensive information that can help with administrative decisions."
-            )
-        
-        # Add class level context with specific details about what should be taught at this level
-        if class_level:
-            class_level_display = get_class_level_display(class_level)
-            system_message += f" The user is associated with {class_level_display}."
-            
-            # Add age-appropriate context for students
-            if role == 'student':
-                age_appropriate_content = get_age_appropriate_content_by_class(class_level)
-                if age_appropriate_content:
-                    system_message += f" {age_appropriate_content}"
-        
-        # Add subject context if provided with strong guidance to stay within subject boundaries
-        if subject_name:
-            system_message += (
-                f" The user is asking about the subject of {subject_name}. "
-                f"Your responses should focus specifically on this subject within the context "
-                f"of their class level and curriculum."
-            )
-            
-            # Add CBSE curriculum specific guidance if we have subject and class level
-            if class_level and role in ['student', 'teacher']:
-                subject_specific_guidance = get_subject_curriculum_guidance(subject_name, class_level)
-                if subject_specific_guidance:
-                    system_message += f" {subject_specific_guidance}"
-        
-        # Add curriculum context if available with explicit constraints
-        if class_subjects and len(class_subjects) > 0:
-            subjects_list = ", ".join(class_subjects)
-            system_message += (
-                f" The curriculum for this class includes these subjects: {subjects_list}. "
-                f"These are the only subjects this user should be learning about at their level. "
-                f"If they ask about subjects outside this list, politely explain that it's not part "
-                f"of their current curriculum."
-            )
-        
-        # Add special instruction for keeping responses appropriate and accurate
-        system_message += (
-            " Strictly provide educational content that is factually accurate and grade-appropriate. "
-            "Do not invent curriculum content or provide speculative information. "
-            "If you're unsure about specific CBSE curriculum details, be honest about your limitations "
-            "and provide general educational guidance that is age-appropriate instead."
+        # Get response from OpenAI
+        response = openai.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            max_tokens=800,
+            temperature=0.7,
         )
-            
-        # Create messages array
-        messages = [{"role": "system", "content": system_message}]
+        log_token_usage("AI tutor", messages, response.usage)
         
-        # Add thread context if available to maintain thread continuity
-        if thread_context:
-            messages.append({"role": "system", "content": f"CONTEXT: {thread_context}"})
+        answer = response.choices[0].message.content
+        if cacheable:
+            response_cache.set(question, answer, subject_name, role, class_level, class_subjects)
         
-        # Add edit context if this is an edited message
-        if edit_context:
-            messages.append({"role": "system", "content": f"CONTEXT: {edit_context}"})
+        # Return the AI's response
+        return answer
         
-        # Add the user question
-        messages.append({"role": "user", "content": question})
+    except Exception as e:
+        # Handle errors gracefully
+        print(f"Error in AI response generation: {str(e)}")
+        return AI_ERROR_MESSAGE
+
+
+async def aget_ai_response(question, subject_name=None, role='student', class_level=None, class_subjects=None, thread_context=None, edit_context=None, history=None):
+    """
+    Async version of get_ai_response for use from async views
+    
+    Takes the same arguments as get_ai_response. The request is made with the
+    async client, so the event loop can serve other requests while waiting.
+    
+    Returns:
+        str: The AI-generated response
+    """
+    cacheable = not thread_context and not edit_context and not history
+    if cacheable:
+        cached = response_cache.get(question, subject_name, role, class_level, class_subjects)
+        if cached is not None:
+            return cached
+    else:
+        response_cache.record_bypass()
+    
+    try:
+        messages = build_ai_messages(
+            question,
+            subject_name=subject_name,
+            role=role,
+            class_level=class_level,
+            class_subjects=class_subjects,
+            thread_context=thread_context,
+            edit_context=edit_context,
+            history=history
+        )
         
-        # Get response from OpenAI
-        response = openai.chat.completions.create(
+        response = await async_openai.chat.completions.create(
             model="gpt-4o",
             messages=messages,
             max_tokens=800,
             temperature=0.7,
         )
+        log_token_usage("AI tutor", messages, response.usage)
         
-        # Return the AI's response
-        return response.choices[0].message.content
+        answer = response.choices[0].message.content
+        if cacheable:
+            response_cache.set(question, answer, subject_name, role, class_level, class_subjects)
+        
+        return answer
         
     except Exception as e:
         # Handle errors gracefully
         print(f"Error in AI response generation: {str(e)}")
-        return (
-            "I'm sorry, I'm having trouble processing your question right now. "
-            "Please try again in a moment."
+        return AI_ERROR_MESSAGE
+
+
+async def stream_ai_response(question, subject_name=None, role='student', class_level=None, class_subjects=None, thread_context=None, edit_context=None, history=None):
+    """
+    Stream a response from the AI tutor token by token
+    
+    Takes the same arguments as get_ai_response, but yields the answer in
+    chunks as the model produces them so the caller can forward them to the
+    browser without holding a worker for the whole completion.
+    
+    Yields:
+        str: The next chunk of the AI-generated response
+    
+    Raises:
+        AIStreamError: If generation fails; chunks already yielded are an
+            incomplete answer
+    """
+    cacheable = not thread_context and not edit_context and not history
+    if cacheable:
+        cached = response_cache.get(question, subject_name, role, class_level, class_subjects)
+        if cached is not None:
+            yield cached
+            return
+    else:
+        response_cache.record_bypass()
+    
+    try:
+        messages = build_ai_messages(
+            question,
+            subject_name=subject_name,
+            role=role,
+            class_level=class_level,
+            class_subjects=class_subjects,
+            thread_context=thread_context,
+            edit_context=edit_context,
+            history=history
+        )
+        
+        stream = await async_openai.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            max_tokens=800,
+            temperature=0.7,
+            stream=True,
         )
+        log_token_usage("AI tutor stream", messages)
+        
+        chunks = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                chunks.append(delta)
+                yield delta
+        
+        if cacheable:
+            response_cache.set(question, ''.join(chunks), subject_name, role, class_level, class_subjects)
+        
+    except Exception as e:
+        # Handle errors gracefully
+        print(f"Error in AI response streaming: {str(e)}")
+        raise AIStreamError(str(e)) from e
 
 
 def get_class_level_display(class_level):
@@ -314,6 +721,50 @@ def get_subject_curriculum_guidance(subject_name, class_level):
         return ""
 
 
+def build_key_points_prompt(text, num_points=5):
+    """Build the prompt used to extract key points from educational text"""
+    return (
+        f"Extract {num_points} important key points from the following educational text. "
+        f"Format the response as a JSON array of strings, where each string is a key point.\n\n"
+        f"Text: {text}"
+    )
+
+
+def build_practice_questions_prompt(topic, num_questions=3, difficulty='medium'):
+    """Build the prompt used to generate practice questions on a topic"""
+    return (
+        f"Generate {num_questions} {difficulty}-level practice questions about '{topic}' for CBSE students. "
+        f"For each question, include a detailed answer explanation. "
+        f"Format the response as a JSON object with a 'questions' key containing an array of objects. "
+        f"Each object should have 'question' and 'answer' keys."
+    )
+
+
+def build_quiz_questions_prompt(topic, num_questions=10, difficulty='medium', batch=1, batches=1, avoid=()):
+    """Build the prompt used to generate multiple-choice quiz questions on a topic"""
+    prompt = (
+        f"Generate {num_questions} {difficulty}-level multiple-choice quiz questions about '{topic}' for CBSE students. "
+        f"Format the response as a JSON object with a 'questions' key containing an array of objects. "
+        f"Each object must have a 'question' string, an 'options' object with keys 'a', 'b', 'c' and 'd' "
+        f"(each a short answer under 200 characters), a 'correct_option' key set to the letter of the single "
+        f"correct option, and an 'explanation' string explaining the correct answer. "
+        f"Wrong options must be plausible, and every question must test something different."
+    )
+    if batches > 1:
+        prompt += f" This is set {batch} of {batches}; cover different subtopics and skills than the other sets would."
+    if avoid:
+        prompt += " Do not repeat any of these existing questions:\n" + "\n".join(f"- {text}" for text in avoid)
+    return prompt
+
+
+def build_summary_prompt(text, max_length=300):
+    """Build the prompt used to summarize educational text"""
+    return (
+        f"Summarize the following educational text in under {max_length} words, "
+        f"while preserving the key educational points:\n\n{text}"
+    )
+
+
 def extract_key_points(text, num_points=5):
     """
     Extract key points from educational text
@@ -326,15 +777,26 @@ def extract_key_points(text, num_points=5):
         list: A list of key points
     """
     try:
-        prompt = (
-            f"Extract {num_points} important key points from the following educational text. "
-            f"Format the response as a JSON array of strings, where each string is a key point.\n\n"
-            f"Text: {text}"
+        response = openai.chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": build_key_points_prompt(text, num_points)}],
+            response_format={"type": "json_object"},
         )
         
-        response = openai.chat.completions.create(
+        result = json.loads(response.choices[0].message.content)
+        return result.get("key_points", [])
+    
+    except Exception as e:
+        print(f"Error extracting key points: {str(e)}")
+        return [f"An error occurred while extracting key points: {str(e)}"]
+
+
+async def aextract_key_points(text, num_points=5):
+    """Async version of extract_key_points"""
+    try:
+        response = await async_openai.chat.completions.create(
             model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
+            messages=[{"role": "user", "content": build_key_points_prompt(text, num_points)}],
             response_format={"type": "json_object"},
         )
         
@@ -362,16 +824,29 @@ def generate_practice_questions(topic, num_questions=3, difficulty='medium'):
         # Limit number of questions to prevent abuse
         num_questions = min(max(1, num_questions), 10)
         
-        prompt = (
-            f"Generate {num_questions} {difficulty}-level practice questions about '{topic}' for CBSE students. "
-            f"For each question, include a detailed answer explanation. "
-            f"Format the response as a JSON object with a 'questions' key containing an array of objects. "
-            f"Each object should have 'question' and 'answer' keys."
+        response = openai.chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": build_practice_questions_prompt(topic, num_questions, difficulty)}],
+            response_format={"type": "json_object"},
         )
         
-        response = openai.chat.completions.create(
+        result = json.loads(response.choices[0].message.content)
+        return result.get("questions", [])
+    
+    except Exception as e:
+        print(f"Error generating practice questions: {str(e)}")
+        return [{"question": f"An error occurred: {str(e)}", "answer": "Please try again later."}]
+
+
+async def agenerate_practice_questions(topic, num_questions=3, difficulty='medium'):
+    """Async version of generate_practice_questions"""
+    try:
+        # Limit number of questions to prevent abuse
+        num_questions = min(max(1, num_questions), 10)
+        
+        response = await async_openai.chat.completions.create(
             model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
+            messages=[{"role": "user", "content": build_practice_questions_prompt(topic, num_questions, difficulty)}],
             response_format={"type": "json_object"},
         )
         
@@ -383,6 +858,198 @@ def generate_practice_questions(topic, num_questions=3, difficulty='medium'):
         return [{"question": f"An error occurred: {str(e)}", "answer": "Please try again later."}]
 
 
+def validate_quiz_question(data):
+    """
+    Check a generated quiz question against the expected schema
+
+    Args:
+        data: One item of the 'questions' array returned by the model
+
+    Returns:
+        dict: Cleaned question (question, options, correct_option, explanation),
+        or None if it does not match the schema
+    """
+    if not isinstance(data, dict):
+        return None
+
+    text = data.get('question')
+    options = data.get('options')
+    if not isinstance(text, str) or not text.strip() or not isinstance(options, dict):
+        return None
+
+    cleaned = {}
+    for letter in 'abcd':
+        value = options.get(letter, options.get(letter.upper()))
+        if value is None or value == '':
+            continue
+        if not isinstance(value, (str, int, float)):
+            return None
+        value = str(value).strip()
+        if not value or len(value) > QUIZ_OPTION_MAX_LENGTH:
+            return None
+        cleaned[letter] = value
+
+    # At least two options, lettered from 'a' without gaps, all different
+    if len(cleaned) < 2 or list(cleaned) != list('abcd'[:len(cleaned)]):
+        return None
+    if len({value.lower() for value in cleaned.values()}) != len(cleaned):
+        return None
+
+    correct_option = str(data.get('correct_option', '')).strip().lower()
+    if correct_option not in cleaned:
+        return None
+
+    explanation = data.get('explanation', '')
+    if not isinstance(explanation, str):
+        return None
+
+    return {
+        'question': text.strip(),
+        'options': cleaned,
+        'correct_option': correct_option,
+        'explanation': explanation.strip(),
+    }
+
+
+def generate_quiz_question_batch(topic, num_questions=10, difficulty='medium', batch=1, batches=1, avoid=()):
+    """
+    Generate one batch of multiple-choice quiz questions
+
+    Args:
+        topic (str): The educational topic
+        num_questions (int): Number of questions in this batch
+        difficulty (str): Difficulty level (easy, medium, hard)
+        batch (int): Position of this batch, for asking batches to differ
+        batches (int): Number of batches generated together
+        avoid (list): Existing question texts the model should not repeat
+
+    Returns:
+        tuple: (valid questions as from validate_quiz_question, number of items rejected)
+
+    Raises:
+        Exception: If the API call fails or does not return a JSON object
+    """
+    messages = [{"role": "user", "content": build_quiz_questions_prompt(
+        topic, num_questions, difficulty, batch=batch, batches=batches, avoid=avoid
+    )}]
+    response = openai.chat.completions.create(
+        model="gpt-4o",
+        messages=messages,
+        response_format={"type": "json_object"},
+    )
+    log_token_usage("Quiz questions", messages, getattr(response, 'usage', None))
+
+    items = json.loads(response.choices[0].message.content).get("questions", [])
+    if not isinstance(items, list):
+        items = []
+    questions = [question for question in map(validate_quiz_question, items) if question]
+    return questions, len(items) - len(questions)
+
+
+class QuestionDeduplicator:
+    """
+    Rejects questions that are near-identical to ones already accepted
+
+    Uses the same normalization and character-shingle Jaccard similarity as
+    AIResponseCache, and never treats questions with different numbers as
+    duplicates.
+    """
+
+    def __init__(self, existing=(), similarity_threshold=0.8):
+        self.similarity_threshold = similarity_threshold
+        self.seen = []  # (numbers, shingles) of accepted questions
+        for text in existing:
+            self.add(text)
+
+    def fingerprint(self, text):
+        normalized = AIResponseCache.normalize(text)
+        return re.findall(r"\d+", normalized), AIResponseCache.shingles(normalized)
+
+    def is_duplicate(self, text):
+        numbers, shingles = self.fingerprint(text)
+        for seen_numbers, seen_shingles in self.seen:
+            if seen_numbers != numbers:
+                continue
+            if AIResponseCache.similarity(shingles, seen_shingles) >= self.similarity_threshold:
+                return True
+        return False
+
+    def add(self, text):
+        """Accept a question; returns False if it duplicates an accepted one"""
+        if self.is_duplicate(text):
+            return False
+        self.seen.append(self.fingerprint(text))
+        return True
+
+
+def generate_quiz_questions_bulk(topic, num_questions, difficulty='medium', existing=(), progress=None):
+    """
+    Generate up to MAX_GENERATED_QUESTIONS unique multiple-choice questions
+
+    The request is split into batches of QUIZ_QUESTION_BATCH_SIZE that are
+    generated in parallel. Invalid and near-duplicate questions (of each other
+    or of `existing`) are dropped, and further rounds top up the shortfall.
+
+    Args:
+        topic (str): The educational topic
+        num_questions (int): Number of questions wanted
+        difficulty (str): Difficulty level (easy, medium, hard)
+        existing (list): Texts of questions already in the quiz
+        progress (callable, optional): Called as progress(accepted, wanted) after each batch
+
+    Returns:
+        tuple: (list of questions as from validate_quiz_question, dict of counts:
+        requested, accepted, invalid, duplicates, failed_batches)
+    """
+    num_questions = min(max(1, num_questions), MAX_GENERATED_QUESTIONS)
+    deduplicator = QuestionDeduplicator(existing)
+    avoid = list(existing)[-QUIZ_QUESTION_AVOID_LIMIT:]
+    accepted = []
+    counts = {'requested': num_questions, 'accepted': 0, 'invalid': 0, 'duplicates': 0, 'failed_batches': 0}
+
+    for _ in range(QUIZ_QUESTION_ROUNDS):
+        missing = num_questions - len(accepted)
+        if missing <= 0:
+            break
+        sizes = [min(QUIZ_QUESTION_BATCH_SIZE, missing - start) for start in range(0, missing, QUIZ_QUESTION_BATCH_SIZE)]
+
+        with ThreadPoolExecutor(max_workers=min(QUIZ_QUESTION_WORKERS, len(sizes))) as executor:
+            futures = [
+                executor.submit(
+                    generate_quiz_question_batch, topic, size, difficulty,
+                    batch=index + 1, batches=len(sizes), avoid=avoid
+                )
+                for index, size in enumerate(sizes)
+            ]
+            for future in as_completed(futures):
+                try:
+                    questions, invalid = future.result()
+                except Exception as e:
+                    logger.error(f"Quiz question batch failed: {str(e)}")
+                    counts['failed_batches'] += 1
+                    continue
+
+                counts['invalid'] += invalid
+                for question in questions:
+                    if len(accepted) >= num_questions:
+                        break
+                    if deduplicator.add(question['question']):
+                        accepted.append(question)
+                    else:
+                        counts['duplicates'] += 1
+                if progress:
+                    progress(len(accepted), num_questions)
+
+        # Nothing came back at all: more rounds would fail the same way
+        if counts['failed_batches'] and not accepted:
+            break
+        avoid = (avoid + [question['question'] for question in accepted])[-QUIZ_QUESTION_AVOID_LIMIT:]
+
+    counts['accepted'] = len(accepted)
+    logger.info(f"Generated quiz questions for '{topic}': {counts}")
+    return accepted, counts
+
+
 def summarize_text(text, max_length=300):
     """
     Create a concise summary of educational text
@@ -395,14 +1062,25 @@ def summarize_text(text, max_length=300):
         str: A summarized version of the input text
     """
     try:
-        prompt = (
-            f"Summarize the following educational text in under {max_length} words, "
-            f"while preserving the key educational points:\n\n{text}"
+        response = openai.chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": build_summary_prompt(text, max_length)}],
+            max_tokens=400,
         )
         
-        response = openai.chat.completions.create(
+        return response.choices[0].message.content
+    
+    except Exception as e:
+        print(f"Error summarizing text: {str(e)}")
+        return f"An error occurred while summarizing: {str(e)}"
+
+
+async def asummarize_text(text, max_length=300):
+    """Async version of summarize_text"""
+    try:
+        response = await async_openai.chat.completions.create(
             model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
+            messages=[{"role": "user", "content": build_summary_prompt(text, max_length)}],
             max_tokens=400,
         )
         
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+    
+    def ready(self):
+        # Register signal handlers
+        from . import signals  # noqa: F401
+        # Register background jobs so workers can look them up by name
+        from . import jobs  # noqa: F401
@@ -0,0 +1,213 @@
+import os
+import time
+import logging
+import smtplib
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils.html import strip_tags
+
+from core.email_service import SENDGRID_API_KEY, SENDGRID_AVAILABLE, USE_GMAIL
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Messages sent over one SMTP connection before it is reopened
+BULK_EMAIL_CHUNK_SIZE = int(os.environ.get('BULK_EMAIL_CHUNK_SIZE', '100'))
+# SMTP messages per second, 0 for no limit
+BULK_EMAIL_RATE = float(os.environ.get('BULK_EMAIL_RATE', '50'))
+# SendGrid accepts at most 1000 personalizations per API call
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+OutgoingEmail = namedtuple('OutgoingEmail', ['to_email', 'subject', 'html_content'])
+EmailOutcome = namedtuple('EmailOutcome', ['to_email', 'sent', 'provider', 'error'])
+
+
+class RateLimiter:
+    """Spaces out calls to wait() so they happen at most `rate` times per second"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_time = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time = max(self.next_time, now) + self.interval
+
+
+def _send_smtp_message(connection, message):
+    """Send one message over an open connection, reconnecting once if the server hung up"""
+    try:
+        return connection.send_messages([message])
+    except smtplib.SMTPServerDisconnected:
+        connection.close()
+        connection.open()
+        return connection.send_messages([message])
+
+
+def send_via_smtp(emails, from_email, connection=None, chunk_size=BULK_EMAIL_CHUNK_SIZE, rate=BULK_EMAIL_RATE):
+    """
+    Send emails one recipient per message over a reused SMTP connection
+
+    Args:
+        emails (list): OutgoingEmail tuples
+        from_email (str): Sender address
+        connection (optional): Django email backend, get_connection() by default
+        chunk_size (int): Messages per connection
+        rate (float): Messages per second, 0 for no limit
+
+    Returns:
+        list: EmailOutcome per email, in order
+    """
+    connection = connection or get_connection(fail_silently=False)
+    limiter = RateLimiter(rate)
+    plain_text = {}
+    outcomes = []
+
+    for start in range(0, len(emails), chunk_size):
+        chunk = emails[start:start + chunk_size]
+        try:
+            connection.open()
+        except Exception as e:
+            logger.error(f"Could not open SMTP connection: {str(e)}")
+            outcomes.extend(EmailOutcome(email.to_email, False, 'smtp', str(e)) for email in chunk)
+            continue
+
+        try:
+            for email in chunk:
+                if email.html_content not in plain_text:
+                    plain_text[email.html_content] = strip_tags(email.html_content)
+                message = EmailMultiAlternatives(
+                    subject=email.subject,
+                    body=plain_text[email.html_content],
+                    from_email=from_email,
+                    to=[email.to_email],
+                    connection=connection
+                )
+                message.attach_alternative(email.html_content, "text/html")
+
+                limiter.wait()
+                try:
+                    sent = _send_smtp_message(connection, message)
+                    outcomes.append(EmailOutcome(email.to_email, bool(sent), 'smtp', None if sent else 'Not sent'))
+                except Exception as e:
+                    outcomes.append(EmailOutcome(email.to_email, False, 'smtp', str(e)))
+        finally:
+            connection.close()
+
+    return outcomes
+
+
+def send_via_sendgrid(emails, from_email):
+    """
+    Send emails through SendGrid, one personalization per recipient
+
+    Emails with the same content share an API call of up to
+    SENDGRID_MAX_PERSONALIZATIONS recipients; recipients only see their own
+    address.
+
+    Args:
+        emails (list): OutgoingEmail tuples
+        from_email (str): Sender address
+
+    Returns:
+        list: EmailOutcome per email, in order
+    """
+    from sendgrid import SendGridAPIClient
+    from sendgrid.helpers.mail import Category, Mail, Personalization, To
+
+    client = SendGridAPIClient(SENDGRID_API_KEY)
+    outcomes = [None] * len(emails)
+
+    by_content = {}
+    for index, email in enumerate(emails):
+        by_content.setdefault(email.html_content, []).append(index)
+
+    for html_content, indexes in by_content.items():
+        plain_text_content = strip_tags(html_content)
+        for start in range(0, len(indexes), SENDGRID_MAX_PERSONALIZATIONS):
+            batch = indexes[start:start + SENDGRID_MAX_PERSONALIZATIONS]
+            message = Mail(
+                from_email=from_email,
+                subject=emails[batch[0]].subject,
+                plain_text_content=plain_text_content,
+                html_content=html_content
+            )
+            for index in batch:
+                personalization = Personalization()
+                personalization.add_to(To(emails[index].to_email))
+                personalization.subject = emails[index].subject
+                message.add_personalization(personalization)
+            message.add_category(Category("the360learning"))
+
+            try:
+                response = client.send(message)
+                error = None if 200 <= response.status_code < 300 else f"SendGrid status {response.status_code}"
+            except Exception as e:
+                error = str(e)
+            for index in batch:
+                outcomes[index] = EmailOutcome(emails[index].to_email, error is None, 'sendgrid', error)
+
+    return outcomes
+
+
+def send_bulk_email(emails, from_email=None, connection=None, chunk_size=BULK_EMAIL_CHUNK_SIZE, rate=BULK_EMAIL_RATE):
+    """
+    Send one email per recipient, using as few connections or API calls as possible
+
+    Providers are tried in the same order as send_email: Gmail SMTP when
+    configured, then SendGrid, then Django's default backend. Recipients a
+    provider fails for are retried with the next one.
+
+    Args:
+        emails (list): OutgoingEmail tuples
+        from_email (str, optional): Sender email, defaults to DEFAULT_FROM_EMAIL in settings
+        connection (optional): Email backend to send all emails through, skipping provider selection
+        chunk_size (int): Messages per SMTP connection
+        rate (float): SMTP messages per second, 0 for no limit
+
+    Returns:
+        list: EmailOutcome per email with an address, in order
+    """
+    if from_email is None:
+        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'senthil@kalsdatalabs.com')
+    emails = [email for email in emails if email.to_email]
+    if not emails:
+        return []
+
+    if connection is not None:
+        providers = ['smtp']
+    else:
+        providers = ['smtp'] if USE_GMAIL else []
+        if SENDGRID_API_KEY and SENDGRID_AVAILABLE:
+            providers.append('sendgrid')
+        if 'smtp' not in providers:
+            providers.append('smtp')
+
+    started = time.perf_counter()
+    outcomes = [None] * len(emails)
+    pending = list(range(len(emails)))
+    for provider in providers:
+        batch = [emails[index] for index in pending]
+        if provider == 'sendgrid':
+            results = send_via_sendgrid(batch, from_email)
+        else:
+            results = send_via_smtp(batch, from_email, connection, chunk_size, rate)
+        for index, outcome in zip(pending, results):
+            outcomes[index] = outcome
+        pending = [index for index in pending if not outcomes[index].sent]
+        if not pending:
+            break
+
+    for index in pending:
+        logger.warning(f"Email to {outcomes[index].to_email} failed via {outcomes[index].provider}: {outcomes[index].error}")
+    logger.info(
+        f"Bulk email: {len(emails) - len(pending)} of {len(emails)} sent "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    return outcomes
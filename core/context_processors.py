@@ -1,25 +1,18 @@
-from .models import Subject
-
 def subjects_processor(request):
     """
-    Context processor to make subjects available in all templates
+    Context processor to make the user's role available in all templates
     """
-    subjects = Subject.objects.all()
-    
     # Get user role if authenticated
     is_teacher = False
     is_admin = False
     
-    if request.user.is_authenticated:
-        try:
-            user_profile = request.user.profile
-            is_teacher = user_profile.role == 'teacher'
-            is_admin = user_profile.role == 'admin'
-        except:
-            pass
+    # Loaded once per request by UserProfileMiddleware
+    user_profile = getattr(request, 'profile', None)
+    if user_profile is not None:
+        is_teacher = user_profile.role == 'teacher'
+        is_admin = user_profile.role == 'admin'
     
     return {
-        'global_subjects': subjects,
         'is_teacher': is_teacher,
         'is_admin': is_admin,
     }
@@ -0,0 +1,257 @@
+import os
+import logging
+
+from django.core.cache import cache
+
+from core.models import AITutorSession, AITutorMessage
+from core.ai_service import estimate_tokens, summarize_text
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Conversation window limits for AI tutor requests
+AI_HISTORY_MAX_MESSAGES = int(os.environ.get('AI_HISTORY_MAX_MESSAGES', '10'))
+AI_HISTORY_TOKEN_BUDGET = int(os.environ.get('AI_HISTORY_TOKEN_BUDGET', '1500'))
+
+# Messages that drop out of the window are folded into the summary in batches
+# of at least this size, so the summary is not rewritten on every turn
+AI_SUMMARY_BATCH_MESSAGES = int(os.environ.get('AI_SUMMARY_BATCH_MESSAGES', '6'))
+
+# Folding runs as a background job, at most one queued per session at a time
+# (until it finishes or this many seconds pass). Each model call folds at most
+# AI_SUMMARY_FOLD_LIMIT messages, so a long backlog is caught up in steps.
+AI_SUMMARY_FOLD_LOCK_SECONDS = int(os.environ.get('AI_SUMMARY_FOLD_LOCK_SECONDS', '300'))
+AI_SUMMARY_FOLD_LIMIT = int(os.environ.get('AI_SUMMARY_FOLD_LIMIT', '40'))
+
+SUMMARY_ERROR_PREFIX = "An error occurred while summarizing"
+
+ROLE_LABELS = {
+    'question': 'Student',
+    'answer': 'Tutor',
+}
+
+
+def get_conversation_history(session, exclude_message_id=None):
+    """
+    Build the bounded conversation history sent with an AI tutor question
+
+    The most recent question/answer messages are kept verbatim, newest first,
+    until either AI_HISTORY_MAX_MESSAGES or AI_HISTORY_TOKEN_BUDGET is reached.
+    Older messages are represented by the session's rolling summary; once a
+    batch of them has left the window a job is queued to fold them into it,
+    so the summary call never delays the answer.
+
+    Args:
+        session (AITutorSession): The chat session
+        exclude_message_id (int, optional): Message to leave out, usually the question being asked
+
+    Returns:
+        tuple: (history: list of OpenAI chat messages, stats: dict of token counts)
+    """
+    messages = AITutorMessage.objects.filter(
+        session=session,
+        parent_message__isnull=True,
+        message_type__in=ROLE_LABELS.keys()
+    )
+    if exclude_message_id:
+        messages = messages.exclude(id=exclude_message_id)
+    if session.summary_last_message_id:
+        messages = messages.filter(id__gt=session.summary_last_message_id)
+
+    # Only fetch what can fit in the window plus one summary batch
+    recent = list(
+        messages.order_by('-id').values('id', 'message_type', 'content')[
+            :AI_HISTORY_MAX_MESSAGES + AI_SUMMARY_BATCH_MESSAGES
+        ]
+    )
+
+    window = []
+    window_tokens = 0
+    for message in recent:
+        tokens = estimate_tokens(message['content'])
+        if len(window) >= AI_HISTORY_MAX_MESSAGES or window_tokens + tokens > AI_HISTORY_TOKEN_BUDGET:
+            break
+        window.append(message)
+        window_tokens += tokens
+
+    # Messages that no longer fit, oldest first. Older unsummarized messages
+    # may not have been fetched; the fold job reads them from the database.
+    overflow = list(reversed(recent[len(window):]))
+    if len(overflow) >= AI_SUMMARY_BATCH_MESSAGES:
+        request_summary_fold(session, overflow[-1]['id'])
+
+    history = []
+    summary_tokens = 0
+    if session.context_summary:
+        summary_tokens = estimate_tokens(session.context_summary)
+        history.append({
+            "role": "system",
+            "content": f"Summary of the earlier conversation: {session.context_summary}"
+        })
+
+    for message in reversed(window):
+        history.append({
+            "role": "user" if message['message_type'] == 'question' else "assistant",
+            "content": message['content']
+        })
+
+    stats = {
+        'history_messages': len(window),
+        'history_tokens': window_tokens,
+        'summary_tokens': summary_tokens,
+        'pending_summary_messages': len(overflow) if len(overflow) < AI_SUMMARY_BATCH_MESSAGES else 0,
+    }
+    logger.info(
+        f"AI session {session.id} context: {stats['history_messages']} messages "
+        f"(~{window_tokens} tokens), summary ~{summary_tokens} tokens"
+    )
+
+    return history, stats
+
+
+def fold_lock_key(session_id):
+    """Cache key held while a summary fold is queued for a session"""
+    return f"ai-summary-fold:{session_id}"
+
+
+def request_summary_fold(session, through_message_id):
+    """
+    Queue a job folding a session's messages up to a given one into its summary
+
+    Does nothing if a fold for the session is already queued.
+
+    Args:
+        session (AITutorSession): The chat session
+        through_message_id (int): Newest message to fold
+
+    Returns:
+        str: The job ID, or None if no job was queued
+    """
+    from core.job_queue import enqueue
+    from core.jobs import fold_conversation_summary
+
+    try:
+        if not cache.add(fold_lock_key(session.id), 1, AI_SUMMARY_FOLD_LOCK_SECONDS):
+            return None
+    except Exception as e:
+        logger.error(f"Summary fold lock unavailable: {str(e)}")
+
+    try:
+        return enqueue(fold_conversation_summary, session.id, through_message_id)
+    except Exception as e:
+        logger.error(f"Could not queue summary fold for AI session {session.id}: {str(e)}")
+        release_fold_lock(session.id)
+        return None
+
+
+def release_fold_lock(session_id):
+    """Allow the next turn of a session to queue a fold again"""
+    try:
+        cache.delete(fold_lock_key(session_id))
+    except Exception:
+        pass
+
+
+def fold_summary_through(session_id, through_message_id):
+    """
+    Fold every unsummarized message up to a given one into the session's summary
+
+    Messages are read from the database starting right after
+    summary_last_message_id, oldest first, so none are skipped however far
+    behind the summary is. They are folded AI_SUMMARY_FOLD_LIMIT at a time.
+
+    Args:
+        session_id (int): ID of the chat session
+        through_message_id (int): Newest message to fold
+
+    Returns:
+        bool: False if a model call failed and messages are left to fold
+    """
+    while True:
+        session = AITutorSession.objects.filter(pk=session_id).only(
+            'id', 'context_summary', 'summary_last_message_id'
+        ).first()
+        if session is None:
+            return True
+
+        messages = AITutorMessage.objects.filter(
+            session_id=session_id,
+            parent_message__isnull=True,
+            message_type__in=ROLE_LABELS.keys(),
+            id__lte=through_message_id
+        )
+        if session.summary_last_message_id:
+            messages = messages.filter(id__gt=session.summary_last_message_id)
+        batch = list(messages.order_by('id').values('id', 'message_type', 'content')[:AI_SUMMARY_FOLD_LIMIT])
+        if not batch:
+            return True
+
+        if not fold_into_summary(session, batch):
+            return False
+
+
+def fold_into_summary(session, messages):
+    """
+    Extend the session's rolling summary with messages that left the window
+
+    Only the previous summary and the new messages are sent to the model, so
+    the cost of a refresh does not grow with the length of the session. The
+    summary is only saved if nothing else moved it meanwhile (a concurrent
+    fold, or an edit that reset it).
+
+    Args:
+        session (AITutorSession): The chat session
+        messages (list): Message dicts (id, message_type, content), oldest first,
+            starting right after the session's summary_last_message_id
+
+    Returns:
+        bool: Whether the summary was updated
+    """
+    transcript = "\n".join(
+        f"{ROLE_LABELS[message['message_type']]}: {message['content']}" for message in messages
+    )
+
+    if session.context_summary:
+        text = (
+            f"Summary of the conversation so far:\n{session.context_summary}\n\n"
+            f"Newer messages to add to the summary:\n{transcript}"
+        )
+    else:
+        text = f"Tutoring conversation:\n{transcript}"
+
+    summary = summarize_text(text, max_length=150)
+    if not summary or summary.startswith(SUMMARY_ERROR_PREFIX):
+        logger.warning(f"Could not refresh context summary for AI session {session.id}")
+        return False
+
+    updated = AITutorSession.objects.filter(
+        pk=session.pk,
+        summary_last_message_id=session.summary_last_message_id
+    ).update(
+        context_summary=summary,
+        summary_last_message_id=messages[-1]['id']
+    )
+    if not updated:
+        logger.info(f"Context summary of AI session {session.id} changed while folding, skipping")
+        return False
+
+    session.context_summary = summary
+    session.summary_last_message_id = messages[-1]['id']
+    return True
+
+
+def reset_summary_if_rewritten(session, message):
+    """
+    Drop the rolling summary when an already-summarized message is edited
+
+    Args:
+        session (AITutorSession): The chat session
+        message (AITutorMessage): The edited message
+    """
+    if session.summary_last_message_id and message.id <= session.summary_last_message_id:
+        session.context_summary = ''
+        session.summary_last_message_id = None
+        AITutorSession.objects.filter(pk=session.pk).update(
+            context_summary='',
+            summary_last_message_id=None
+        )
@@ -0,0 +1,329 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction, close_old_connections
+from django.db.models import F, Case, When, Value, IntegerField
+
+from core.models import StudyMaterial, RecordedSession
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Increments are buffered in Redis when a URL is configured, otherwise in this
+# process, and written to the database in batches every COUNTER_FLUSH_INTERVAL
+# seconds (by run_job_worker, or by a thread in this process).
+COUNTER_BUFFER_URL = os.environ.get('COUNTER_BUFFER_URL', os.environ.get('REDIS_URL', ''))
+COUNTER_PREFIX = os.environ.get('COUNTER_PREFIX', 'counters')
+COUNTER_FLUSH_INTERVAL = float(os.environ.get('COUNTER_FLUSH_INTERVAL', '10'))
+COUNTER_FLUSH_BATCH_SIZE = 500
+
+# Counted fields by "<app_label>.<model>:<field>"
+COUNTED_FIELDS = {}
+
+
+def register_counter(model, field):
+    """Allow buffered increments of an integer field"""
+    COUNTED_FIELDS[counter_key(model, field)] = (model, field)
+
+
+def counter_key(model, field):
+    """Buffer key for a model field"""
+    return f"{model._meta.label_lower}:{field}"
+
+
+class MemoryCounterBuffer:
+    """In-process buffer, flushed by a daemon thread and at exit"""
+
+    def __init__(self):
+        self.pending = defaultdict(Counter)
+        self.flushing = {}
+        self.lock = threading.Lock()
+        self.flush_mutex = threading.Lock()
+        self.thread = None
+
+    def incr(self, key, pk, amount):
+        with self.lock:
+            self.pending[key][pk] += amount
+        self.ensure_thread()
+
+    def ensure_thread(self):
+        if self.thread and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.flush_loop, name='counter-flush', daemon=True)
+            self.thread.start()
+            atexit.register(flush_counters)
+
+    def flush_loop(self):
+        while True:
+            time.sleep(COUNTER_FLUSH_INTERVAL)
+            try:
+                flush_counters()
+            except Exception:
+                logger.exception("Counter flush failed")
+            finally:
+                close_old_connections()
+
+    def get(self, key, pks):
+        with self.lock:
+            pending = self.pending.get(key, {})
+            flushing = self.flushing.get(key, {})
+            return {pk: pending.get(pk, 0) + flushing.get(pk, 0) for pk in pks}
+
+    def keys(self):
+        with self.lock:
+            return set(self.pending) | set(self.flushing)
+
+    def take(self, key):
+        with self.lock:
+            batch = self.flushing.setdefault(key, Counter())
+            batch.update(self.pending.pop(key, Counter()))
+            return dict(batch)
+
+    def done(self, key):
+        with self.lock:
+            self.flushing.pop(key, None)
+
+    @contextmanager
+    def flush_lock(self):
+        acquired = self.flush_mutex.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.flush_mutex.release()
+
+
+class RedisCounterBuffer:
+    """
+    Redis buffer
+
+    Keys (under COUNTER_PREFIX):
+        <prefix>:<counter>           hash of pk -> pending delta
+        <prefix>:<counter>:flushing  hash being written to the database
+        <prefix>:keys                set of counters with pending deltas
+        <prefix>:flush-lock          held by the worker that is flushing
+
+    A flushing hash is only deleted after the database commit, so a failed
+    flush is retried on the next run.
+    """
+
+    FLUSH_LOCK_TIMEOUT = 300
+
+    def __init__(self, url, prefix=COUNTER_PREFIX):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.response_error = redis.ResponseError
+        self.prefix = prefix
+        self.keys_key = f"{prefix}:keys"
+        self.lock_key = f"{prefix}:flush-lock"
+
+    def pending_key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def flushing_key(self, key):
+        return f"{self.prefix}:{key}:flushing"
+
+    def incr(self, key, pk, amount):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hincrby(self.pending_key(key), pk, amount)
+        pipe.sadd(self.keys_key, key)
+        pipe.execute()
+
+    def get(self, key, pks):
+        if not pks:
+            return {}
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hmget(self.pending_key(key), pks)
+        pipe.hmget(self.flushing_key(key), pks)
+        pending, flushing = pipe.execute()
+        return {
+            pk: int(pending[i] or 0) + int(flushing[i] or 0)
+            for i, pk in enumerate(pks)
+        }
+
+    def keys(self):
+        return self.redis.smembers(self.keys_key)
+
+    def take(self, key):
+        flushing_key = self.flushing_key(key)
+        # Finish a previous failed flush before taking new increments
+        if not self.redis.exists(flushing_key):
+            try:
+                self.redis.rename(self.pending_key(key), flushing_key)
+            except self.response_error:
+                # Nothing pending for this counter
+                return {}
+        return {int(pk): int(delta) for pk, delta in self.redis.hgetall(flushing_key).items()}
+
+    def done(self, key):
+        pipe = self.redis.pipeline()
+        pipe.delete(self.flushing_key(key))
+        pipe.exists(self.pending_key(key))
+        _, has_pending = pipe.execute()
+        if not has_pending:
+            self.redis.srem(self.keys_key, key)
+            # An increment may have landed between the EXISTS and the SREM
+            if self.redis.exists(self.pending_key(key)):
+                self.redis.sadd(self.keys_key, key)
+
+    @contextmanager
+    def flush_lock(self):
+        acquired = self.redis.set(self.lock_key, '1', nx=True, ex=self.FLUSH_LOCK_TIMEOUT)
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                self.redis.delete(self.lock_key)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_counter_buffer():
+    """
+    Get the configured counter buffer
+
+    Returns:
+        RedisCounterBuffer or MemoryCounterBuffer: The process-wide buffer
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            if COUNTER_BUFFER_URL and not COUNTER_BUFFER_URL.startswith('memory://'):
+                _buffer = RedisCounterBuffer(COUNTER_BUFFER_URL)
+            else:
+                _buffer = MemoryCounterBuffer()
+        return _buffer
+
+
+def increment_counter(model, pk, field, amount=1):
+    """
+    Add to a counter without touching the database row
+
+    Falls back to a direct atomic UPDATE if the buffer is unavailable.
+
+    Args:
+        model: The model class, e.g. StudyMaterial
+        pk (int): Primary key of the row
+        field (str): Registered counter field, e.g. 'views'
+        amount (int): Increment
+    """
+    key = counter_key(model, field)
+    if key not in COUNTED_FIELDS:
+        raise ValueError(f"{key} is not a registered counter")
+
+    try:
+        get_counter_buffer().incr(key, int(pk), amount)
+    except Exception as e:
+        logger.error(f"Counter buffer unavailable, updating {key} directly: {str(e)}")
+        model.objects.filter(pk=pk).update(**{field: F(field) + amount})
+
+
+def get_pending_counts(model, field, pks):
+    """
+    Get buffered increments that have not reached the database yet
+
+    Args:
+        model: The model class
+        field (str): Counter field
+        pks (list): Primary keys
+
+    Returns:
+        dict: pk -> pending delta (0 if none or if the buffer is unavailable)
+    """
+    pks = [int(pk) for pk in pks]
+    try:
+        return get_counter_buffer().get(counter_key(model, field), pks)
+    except Exception as e:
+        logger.error(f"Counter buffer unavailable: {str(e)}")
+        return {pk: 0 for pk in pks}
+
+
+def apply_pending_counts(objects, *fields):
+    """
+    Add buffered increments to loaded objects so displayed counts are live
+
+    Only use this on objects that are displayed, not saved afterwards.
+
+    Args:
+        objects: A model instance or a list of instances of one model
+        *fields (str): Counter fields to update
+
+    Returns:
+        The objects passed in
+    """
+    instances = [objects] if hasattr(objects, '_meta') else list(objects)
+    if not instances:
+        return objects
+
+    model = type(instances[0])
+    pks = [obj.pk for obj in instances]
+    for field in fields:
+        pending = get_pending_counts(model, field, pks)
+        for obj in instances:
+            setattr(obj, field, getattr(obj, field) + pending.get(obj.pk, 0))
+    return objects
+
+
+def flush_counters():
+    """
+    Write buffered increments to the database
+
+    Each batch is one UPDATE ... SET field = field + CASE pk ... END, so a
+    popular row is written once per flush instead of once per hit.
+
+    Returns:
+        int: Number of rows updated, or None if another flush is running
+    """
+    buffer = get_counter_buffer()
+    with buffer.flush_lock() as acquired:
+        if not acquired:
+            return None
+
+        updated = 0
+        for key in buffer.keys():
+            if key not in COUNTED_FIELDS:
+                logger.warning(f"Dropping unknown counter {key}")
+                buffer.done(key)
+                continue
+            model, field = COUNTED_FIELDS[key]
+
+            deltas = {pk: delta for pk, delta in buffer.take(key).items() if delta}
+            try:
+                with transaction.atomic():
+                    pks = list(deltas)
+                    for start in range(0, len(pks), COUNTER_FLUSH_BATCH_SIZE):
+                        batch = pks[start:start + COUNTER_FLUSH_BATCH_SIZE]
+                        model.objects.filter(pk__in=batch).update(**{
+                            field: F(field) + Case(
+                                *[When(pk=pk, then=Value(deltas[pk])) for pk in batch],
+                                default=Value(0),
+                                output_field=IntegerField()
+                            )
+                        })
+            except Exception:
+                # Keep the batch; it is merged with new increments next time
+                logger.exception(f"Could not flush counter {key}")
+                continue
+
+            buffer.done(key)
+            updated += len(deltas)
+
+        if updated:
+            logger.info(f"Flushed counter increments for {updated} rows")
+        return updated
+
+
+register_counter(StudyMaterial, 'views')
+register_counter(StudyMaterial, 'downloads')
+register_counter(RecordedSession, 'views')
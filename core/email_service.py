@@ -1,9 +1,11 @@
 import os
+import re
 import logging
 from django.core.mail import send_mail, EmailMultiAlternatives
 from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.template.loader import render_to_string, get_template
+from django.utils.html import strip_tags, conditional_escape
+from django.utils.safestring import mark_safe
 
 # Try to import SendGrid if available
 try:
@@ -31,6 +33,22 @@ SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY')
 # Use Gmail SMTP settings if available
 USE_GMAIL = hasattr(settings, 'EMAIL_HOST') and settings.EMAIL_HOST == 'smtp.gmail.com'
 
+def site_url(path):
+    """
+    Absolute URL of a path on this site, for links in emails
+    
+    Args:
+        path (str): Path starting with a slash, e.g. from reverse()
+        
+    Returns:
+        str: https URL on the first REPLIT_DOMAINS domain, or on PUBLIC_URL
+    """
+    domain = os.environ.get('REPLIT_DOMAINS', '').split(',')[0]
+    if not domain:
+        # Fallback to the PUBLIC_URL or localhost
+        domain = os.environ.get('PUBLIC_URL', 'localhost:5000')
+    return f"https://{domain}{path}"
+
 def send_email(to_emails, subject, html_content, from_email=None, attachments=None):
     """
     Send email using either Django's Gmail SMTP settings, SendGrid (if API key is available), 
@@ -183,6 +201,95 @@ def send_email(to_emails, subject, html_content, from_email=None, attachments=No
         logger.error(f"Django email error: {str(e)}")
         return False
 
+class PersonalizedTemplate:
+    """
+    An email template rendered once for many recipients
+
+    The template is rendered with a marker in place of each per-recipient
+    field, and render() fills in the fields by joining the pre-split pieces,
+    so only the fields (escaped unless marked safe) are produced per email.
+    Fields must be output as plain {{ field }} variables in the template.
+    """
+
+    MARKER = '\x00'
+
+    def __init__(self, template_name, context=None, fields=()):
+        markers = {field: f"{self.MARKER}{field}{self.MARKER}" for field in fields}
+        html = render_to_string(template_name, {**(context or {}), **markers})
+        self.parts = re.split(f"{self.MARKER}(\\w+){self.MARKER}", html)
+
+    def render(self, **values):
+        parts = list(self.parts)
+        parts[1::2] = [conditional_escape(values.get(field, '')) for field in self.parts[1::2]]
+        return ''.join(parts)
+
+
+def render_weekly_summaries(summaries):
+    """
+    Render weekly summary emails for a batch of users
+
+    The page layout is rendered once, each user's stats and highlights come
+    from the compiled fragment template, and the upcoming deadlines fragment,
+    shared by every student of a class level, is rendered once per distinct
+    list of deadlines.
+
+    Args:
+        summaries (list): (user, summary) pairs, summary holding 'stats' and 'highlights'
+
+    Returns:
+        list: (user, html_content) pairs
+    """
+    layout = PersonalizedTemplate('email/weekly_summary.html', fields=('recipient_name', 'summary_content'))
+    content_template = get_template('email/weekly_summary_content.html')
+    deadlines_template = get_template('email/weekly_summary_deadlines.html')
+    deadline_fragments = {}
+
+    rendered = []
+    for user, summary in summaries:
+        deadlines = summary['highlights'].get('upcoming_deadlines') or []
+        key = tuple((deadline['title'], deadline['due_date']) for deadline in deadlines)
+        if key not in deadline_fragments:
+            deadline_fragments[key] = mark_safe(deadlines_template.render({'deadlines': deadlines}))
+
+        content = content_template.render({
+            'stats': summary['stats'],
+            'highlights': summary['highlights'],
+            'deadlines_html': deadline_fragments[key],
+        })
+        rendered.append((user, layout.render(
+            recipient_name=user.first_name or user.username,
+            summary_content=mark_safe(content)
+        )))
+    return rendered
+
+def build_meeting_invitations(meeting, participants, is_targeted=False):
+    """
+    Render meeting invitation emails, one per participant with an email address
+    
+    Args:
+        meeting (VideoConference): The meeting object
+        participants (list): List of User objects to invite
+        is_targeted (bool): Whether this is a targeted invitation for specific participants
+        
+    Returns:
+        list: OutgoingEmail tuples
+    """
+    from core.bulk_email_service import OutgoingEmail
+
+    to_emails = [user.email for user in participants if user.email]
+    if not to_emails:
+        return []
+    
+    subject = f"Invitation: {meeting.title} - {meeting.start_time.strftime('%B %d, %Y at %I:%M %p')}"
+    html_content = render_to_string('email/meeting_invitation.html', {
+        'meeting': meeting,
+        'subject_name': meeting.subject.name if meeting.subject else '',
+        'class_level': meeting.get_class_level_display(),
+        'host_name': meeting.scheduled_by.get_full_name() or meeting.scheduled_by.username,
+        'is_targeted_invitation': is_targeted
+    })
+    return [OutgoingEmail(email, subject, html_content) for email in to_emails]
+
 def send_meeting_invitation(meeting, participants, is_targeted=False):
     """
     Send meeting invitation email
@@ -195,48 +302,38 @@ def send_meeting_invitation(meeting, participants, is_targeted=False):
     Returns:
         bool: Success or failure
     """
+    from core.bulk_email_service import send_bulk_email
+
     try:
         logger.info(f"Preparing to send meeting invitation for '{meeting.title}' to {len(participants)} participants")
-        subject = f"Invitation: {meeting.title} - {meeting.start_time.strftime('%B %d, %Y at %I:%M %p')}"
-        
-        # Convert participants list to email addresses
-        to_emails = [user.email for user in participants if user.email]
-        
-        # If no valid emails, return False
-        if not to_emails:
-            logger.warning("No valid email addresses found for participants")
-            return False
-        
-        logger.info(f"Sending invitation emails to: {', '.join(to_emails)}")
         
         # Render email template
         try:
-            html_content = render_to_string('email/meeting_invitation.html', {
-                'meeting': meeting,
-                'subject_name': meeting.subject.name if meeting.subject else '',
-                'class_level': meeting.get_class_level_display(),
-                'host_name': meeting.scheduled_by.get_full_name() or meeting.scheduled_by.username,
-                'is_targeted_invitation': is_targeted
-            })
-            logger.info("Email template rendered successfully")
+            emails = build_meeting_invitations(meeting, participants, is_targeted)
         except Exception as e:
             logger.error(f"Error rendering email template: {str(e)}")
             return False
         
+        # If no valid emails, return False
+        if not emails:
+            logger.warning("No valid email addresses found for participants")
+            return False
+        
         # Check if SendGrid is properly configured
         if SENDGRID_API_KEY:
             logger.info("SendGrid API key is configured")
         else:
             logger.warning("SendGrid API key is not configured, will use Django's default email backend")
         
-        # Send the email
-        result = send_email(to_emails, subject, html_content)
-        if result:
-            logger.info(f"Successfully sent meeting invitation emails to {len(to_emails)} recipients")
+        # Send one email per participant so addresses are not shared
+        outcomes = send_bulk_email(emails)
+        sent = sum(1 for outcome in outcomes if outcome.sent)
+        if sent:
+            logger.info(f"Successfully sent meeting invitation emails to {sent} of {len(emails)} recipients")
         else:
             logger.error("Failed to send meeting invitation emails")
         
-        return result
+        return sent > 0
     except Exception as e:
         logger.error(f"Unexpected error in send_meeting_invitation: {str(e)}")
         return False
@@ -259,15 +356,28 @@ def send_weekly_summary(user, stats, highlights):
     subject = f"Your Weekly Learning Summary - {user.get_full_name() or user.username}"
     
     # Render email template
-    html_content = render_to_string('email/weekly_summary.html', {
-        'user': user,
-        'stats': stats,
-        'highlights': highlights
-    })
+    [(user, html_content)] = render_weekly_summaries([(user, {'stats': stats, 'highlights': highlights})])
     
     # Send the email
     return send_email(user.email, subject, html_content)
 
+def build_weekly_summary_emails(summaries):
+    """
+    Build weekly learning summary emails for a batch of users
+
+    Args:
+        summaries (list): (user, summary) pairs, summary holding 'stats' and 'highlights'
+
+    Returns:
+        list: OutgoingEmail tuples, one per user with an email address
+    """
+    from core.bulk_email_service import OutgoingEmail
+
+    return [
+        OutgoingEmail(user.email, f"Your Weekly Learning Summary - {user.get_full_name() or user.username}", html_content)
+        for user, html_content in render_weekly_summaries([item for item in summaries if item[0].email])
+    ]
+
 def send_assignment_notification(assignment, students):
     """
     Send notification about a new assignment
@@ -279,6 +389,8 @@ def send_assignment_notification(assignment, students):
     Returns:
         bool: Success or failure
     """
+    from core.bulk_email_service import OutgoingEmail, send_bulk_email
+
     subject = f"New Assignment: {assignment.title}"
     
     # Convert students list to email addresses
@@ -296,8 +408,9 @@ def send_assignment_notification(assignment, students):
         'teacher_name': assignment.created_by.get_full_name() or assignment.created_by.username
     })
     
-    # Send the email
-    return send_email(to_emails, subject, html_content)
+    # Send one email per student so addresses are not shared
+    outcomes = send_bulk_email([OutgoingEmail(email, subject, html_content) for email in to_emails])
+    return any(outcome.sent for outcome in outcomes)
 
 
 def send_user_signup_notification(user, user_profile):
@@ -322,19 +435,9 @@ def send_user_signup_notification(user, user_profile):
         from django.contrib.sites.shortcuts import get_current_site
         from django.urls import reverse
         
-        # Get the site domain
-        try:
-            domain = os.environ.get('REPLIT_DOMAINS', '').split(',')[0]
-            if not domain:
-                # Fallback to the PUBLIC_URL or localhost
-                domain = os.environ.get('PUBLIC_URL', 'localhost:5000')
-        except Exception as e:
-            logger.error(f"Error getting domain: {str(e)}")
-            domain = 'localhost:5000'
-        
         # Construct login URL
         try:
-            login_url = f"https://{domain}{reverse('login')}"
+            login_url = site_url(reverse('login'))
             logger.info(f"Login URL for welcome email: {login_url}")
         except Exception as e:
             logger.error(f"Error constructing login URL: {str(e)}")
@@ -367,127 +470,127 @@ def send_user_signup_notification(user, user_profile):
         return False
     
     
-def send_user_login_notification(user, request=None):
+def send_user_login_notification(user, login_time=None, ip_address="Unknown", user_agent="Unknown"):
     """
     Send notification to a user when they log in
     
+    Called from the send_login_notification job, which skips users who turned
+    login emails off; login views queue it with
+    login_notification_service.queue_login_notification.
+    
     Args:
         user (User): The user who logged in
-        request (HttpRequest, optional): The request object to extract IP and user agent
+        login_time (datetime, optional): When the user logged in, defaults to now
+        ip_address (str): IP address the user logged in from
+        user_agent (str): Browser user agent
         
     Returns:
         bool: Success or failure
     """
-    # Run this in a separate thread to prevent blocking login
-    from threading import Thread
-    
-    def send_login_notification_async(user, request):
+    try:
+        if not user.email:
+            logger.warning(f"No email address found for user {user.username}")
+            return False
+        
+        logger.info(f"Sending login notification to {user.email}")
+        
+        from django.urls import reverse
+        from django.utils import timezone
+        
+        # Get the login time
+        login_time = login_time or timezone.now()
+        
+        # Construct account URL
         try:
-            if not user.email:
-                logger.warning(f"No email address found for user {user.username}")
-                return False
-            
-            # Get user settings to check if login notifications are enabled
-            try:
-                from core.models import UserSettings
-                settings, created = UserSettings.objects.get_or_create(user=user)
-                
-                # Skip if login notifications are disabled in user settings
-                if hasattr(settings, 'email_login_notification') and not settings.email_login_notification:
-                    logger.info(f"Login notifications disabled for {user.username}")
-                    return True
-            except Exception as e:
-                logger.warning(f"Could not check user notification settings: {str(e)}")
-            
-            logger.info(f"Sending login notification to {user.email}")
-            
-            from django.urls import reverse
-            import datetime
-            
-            # Get the login time
-            login_time = datetime.datetime.now()
-            
-            # Get IP address and user agent if request is provided
-            ip_address = "Unknown"
-            user_agent = "Unknown"
-            
-            if request:
-                # Get IP from request
-                x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-                if x_forwarded_for:
-                    ip_address = x_forwarded_for.split(',')[0]
-                else:
-                    ip_address = request.META.get('REMOTE_ADDR', 'Unknown')
-                    
-                # Get user agent
-                user_agent = request.META.get('HTTP_USER_AGENT', 'Unknown')
-            
-            # Get the site domain
-            try:
-                domain = os.environ.get('REPLIT_DOMAINS', '').split(',')[0]
-                if not domain:
-                    # Fallback to the PUBLIC_URL or localhost
-                    domain = os.environ.get('PUBLIC_URL', 'localhost:5000')
-            except Exception as e:
-                logger.error(f"Error getting domain: {str(e)}")
-                domain = 'localhost:5000'
-            
-            # Construct account URL
-            try:
-                account_url = f"https://{domain}{reverse('profile_edit')}"
-            except Exception as e:
-                logger.error(f"Error constructing account URL: {str(e)}")
-                account_url = "#"
+            account_url = site_url(reverse('profile_edit'))
+        except Exception as e:
+            logger.error(f"Error constructing account URL: {str(e)}")
+            account_url = "#"
+        
+        subject = "New Login to Your the360learning Account"
+        
+        # Get user role
+        user_role = "Unknown"
+        try:
+            from core.models import UserProfile
+            profile = UserProfile.objects.get(user=user)
+            user_role = profile.get_role_display()
+        except Exception as e:
+            logger.error(f"Error getting user role: {str(e)}")
+        
+        # Render email template
+        try:
+            html_content = render_to_string('email/user_login_notification.html', {
+                'user': user,
+                'login_time': login_time,
+                'ip_address': ip_address,
+                'user_agent': user_agent,
+                'user_role': user_role,
+                'account_url': account_url
+            })
             
-            subject = "New Login to Your the360learning Account"
+            # Send the email
+            result = send_email(user.email, subject, html_content)
             
-            # Get user role
-            user_role = "Unknown"
-            try:
-                from core.models import UserProfile
-                profile = UserProfile.objects.get(user=user)
-                user_role = profile.get_role_display()
-            except Exception as e:
-                logger.error(f"Error getting user role: {str(e)}")
+            if result:
+                logger.info(f"Successfully sent login notification to {user.email}")
+            else:
+                logger.error(f"Failed to send login notification to {user.email}")
             
-            # Render email template
-            try:
-                html_content = render_to_string('email/user_login_notification.html', {
-                    'user': user,
-                    'login_time': login_time,
-                    'ip_address': ip_address,
-                    'user_agent': user_agent,
-                    'user_role': user_role,
-                    'account_url': account_url
-                })
-                
-                # Send the email
-                result = send_email(user.email, subject, html_content)
-                
-                if result:
-                    logger.info(f"Successfully sent login notification to {user.email}")
-                else:
-                    logger.error(f"Failed to send login notification to {user.email}")
-                
-                return result
-            except Exception as e:
-                logger.error(f"Error sending login notification: {str(e)}")
-                return False
+            return result
         except Exception as e:
-            logger.error(f"Unexpected error in send_login_notification_async: {str(e)}")
+            logger.error(f"Error sending login notification: {str(e)}")
             return False
-    
-    # Start a thread to send the notification without blocking login
-    try:
-        thread = Thread(target=send_login_notification_async, args=(user, request))
-        thread.daemon = True  # Make thread a daemon so it doesn't block application exit
-        thread.start()
-        return True  # Return success immediately; actual success is logged by the thread
     except Exception as e:
-        logger.error(f"Error starting notification thread: {str(e)}")
+        logger.error(f"Unexpected error in send_user_login_notification: {str(e)}")
         return False
 
 
+def build_meeting_update_notifications(meeting, recipients, update_type, changes=None, recording_url=None):
+    """
+    Render meeting update emails, one per recipient with an email address
+    
+    The shared body is rendered once and personalized for each recipient.
+    
+    Args:
+        meeting (VideoConference): The meeting object
+        recipients (list): List of User objects to notify
+        update_type (str): Type of update ('Meeting Scheduled', 'Meeting Updated', 'Meeting Cancelled', 'Recording Available')
+        changes (list, optional): List of changes made to the meeting
+        recording_url (str, optional): URL to the recording if available
+        
+    Returns:
+        list: OutgoingEmail tuples
+    """
+    from core.bulk_email_service import OutgoingEmail
+
+    recipients = [recipient for recipient in recipients if recipient.email]
+    if not recipients:
+        return []
+    
+    subject_prefixes = {
+        'Meeting Scheduled': 'New Meeting:',
+        'Meeting Updated': 'Meeting Updated:',
+        'Meeting Cancelled': 'Meeting Cancelled:',
+        'Recording Available': 'Recording Available:'
+    }
+    subject = f"{subject_prefixes.get(update_type, 'Meeting:')} {meeting.title}"
+    
+    template = PersonalizedTemplate('email/meeting_update_notification.html', {
+        'meeting': meeting,
+        'update_type': update_type,
+        'changes': changes,
+        'recording_url': recording_url
+    }, fields=('recipient_name', 'recipient_email'))
+    
+    return [
+        OutgoingEmail(recipient.email, subject, template.render(
+            recipient_name=recipient.first_name or recipient.username,
+            recipient_email=recipient.email
+        ))
+        for recipient in recipients
+    ]
+
 def send_meeting_update_notification(meeting, recipients, update_type, changes=None, recording_url=None):
     """
     Send notification when a meeting is updated, created, cancelled, or has a recording available
@@ -502,51 +605,28 @@ def send_meeting_update_notification(meeting, recipients, update_type, changes=N
     Returns:
         bool: Success or failure
     """
+    from core.bulk_email_service import send_bulk_email
+
     if not recipients:
         logger.warning(f"No recipients specified for meeting update notification")
         return False
     
-    # Convert recipients list to email addresses
-    to_emails = [user.email for user in recipients if user.email]
+    # Render the shared body once, then personalize it for each recipient
+    try:
+        emails = build_meeting_update_notifications(meeting, recipients, update_type, changes, recording_url)
+    except Exception as e:
+        logger.error(f"Error rendering meeting update notification: {str(e)}")
+        return False
     
     # If no valid emails, return False
-    if not to_emails:
+    if not emails:
         logger.warning(f"No valid email addresses found for recipients")
         return False
     
-    subject_prefixes = {
-        'Meeting Scheduled': 'New Meeting:',
-        'Meeting Updated': 'Meeting Updated:',
-        'Meeting Cancelled': 'Meeting Cancelled:',
-        'Recording Available': 'Recording Available:'
-    }
-    
-    subject_prefix = subject_prefixes.get(update_type, 'Meeting:')
-    subject = f"{subject_prefix} {meeting.title}"
-    
-    logger.info(f"Sending {update_type} notification for meeting '{meeting.title}' to {len(to_emails)} recipients")
+    logger.info(f"Sending {update_type} notification for meeting '{meeting.title}' to {len(emails)} recipients")
     
-    # Prepare individual emails for each recipient to personalize them
-    success_count = 0
-    for recipient in recipients:
-        if not recipient.email:
-            continue
-        
-        # Render email template
-        try:
-            html_content = render_to_string('email/meeting_update_notification.html', {
-                'meeting': meeting,
-                'recipient': recipient,
-                'update_type': update_type,
-                'changes': changes,
-                'recording_url': recording_url
-            })
-            
-            # Send the individual email
-            if send_email(recipient.email, subject, html_content):
-                success_count += 1
-        except Exception as e:
-            logger.error(f"Error sending meeting update to {recipient.email}: {str(e)}")
+    # Send the individual emails over a shared connection
+    success_count = sum(1 for outcome in send_bulk_email(emails) if outcome.sent)
     
     if success_count > 0:
         logger.info(f"Successfully sent {update_type} notifications to {success_count} recipients")
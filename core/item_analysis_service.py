@@ -0,0 +1,249 @@
+import os
+import hashlib
+import logging
+
+import numpy as np
+from django.db.models import FilteredRelation
+from django.utils import timezone
+
+from core.models import QuizAttempt, QuizStats
+from core.quiz_service import get_answer_key, ON_TIME_ATTEMPT_RESPONSES
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Bump when the stored result format changes, so cached analyses are recomputed
+ITEM_ANALYSIS_FORMAT = 1
+
+# Questions are only flagged for review once a quiz has this many completed attempts
+ITEM_ANALYSIS_MIN_ATTEMPTS = int(os.environ.get('ITEM_ANALYSIS_MIN_ATTEMPTS', '10'))
+
+# Usual classical test theory review thresholds
+ITEM_EASY_P_VALUE = 0.9
+ITEM_HARD_P_VALUE = 0.2
+ITEM_LOW_DISCRIMINATION = 0.2
+
+# Response matrix codes: 0 = unanswered, 1-4 = options a-d
+OPTION_LETTERS = 'abcd'
+OPTION_CODES = {letter: code for code, letter in enumerate(OPTION_LETTERS, start=1)}
+
+
+def answer_key_digest(answer_key):
+    """Short hash of an answer key, to tell whether an analysis used the current key"""
+    return hashlib.sha1(repr(tuple(answer_key)).encode()).hexdigest()[:16]
+
+
+def load_response_matrix(quiz_id, question_ids):
+    """
+    Load the options selected in a quiz's completed attempts as a matrix
+
+    One query; attempts without any responses are included as unanswered rows.
+    Only responses that were scored (see quiz_service.ON_TIME_RESPONSES) are
+    loaded, so late answers do not count here either.
+
+    Args:
+        quiz_id (int): ID of the quiz
+        question_ids (tuple): Question ids, one per matrix column
+
+    Returns:
+        numpy.ndarray: int8 matrix of option codes, one row per completed attempt
+    """
+    rows = list(
+        QuizAttempt.objects.filter(quiz_id=quiz_id, completed=True)
+        .annotate(on_time=FilteredRelation('responses', condition=ON_TIME_ATTEMPT_RESPONSES))
+        .order_by()
+        .values_list('id', 'on_time__question_id', 'on_time__selected_option')
+    )
+    if not rows:
+        return np.zeros((0, len(question_ids)), dtype=np.int8)
+
+    attempt_col, question_col, option_col = zip(*rows)
+    attempt_col = np.array(attempt_col, dtype=np.int64)
+    question_col = np.fromiter((question_id or 0 for question_id in question_col), dtype=np.int64, count=len(rows))
+    codes = np.fromiter((OPTION_CODES.get(option, 0) for option in option_col), dtype=np.int8, count=len(rows))
+
+    attempt_ids, row_index = np.unique(attempt_col, return_inverse=True)
+    matrix = np.zeros((len(attempt_ids), len(question_ids)), dtype=np.int8)
+    if not question_ids:
+        return matrix
+
+    # Column of each response; responses to questions no longer in the quiz are dropped
+    key_ids = np.asarray(question_ids, dtype=np.int64)
+    order = np.argsort(key_ids)
+    position = np.minimum(np.searchsorted(key_ids[order], question_col), len(key_ids) - 1)
+    column = order[position]
+    valid = (key_ids[column] == question_col) & (codes > 0)
+
+    matrix[row_index[valid], column[valid]] = codes[valid]
+    return matrix
+
+
+def _rounded(values):
+    """Round a float array for storage, with None for undefined values"""
+    return [None if not np.isfinite(value) else round(float(value), 4) for value in values]
+
+
+def analyze_responses(matrix, correct_options):
+    """
+    Item statistics for a response matrix
+
+    For each question: p-value (fraction of attempts answering correctly),
+    discrimination (point-biserial correlation between answering it correctly
+    and the score on the other questions), and for each option the fraction
+    of attempts selecting it and those attempts' mean score.
+
+    Args:
+        matrix (numpy.ndarray): Option codes, one row per attempt (see load_response_matrix)
+        correct_options (tuple): Correct option per column
+
+    Returns:
+        dict: attempts, mean_score, score_sd, reliability (KR-20) and items, a
+        list of dicts in column order (p_value, discrimination, options, unanswered)
+    """
+    attempts, questions = matrix.shape
+    correct_codes = np.array([OPTION_CODES.get(option, -1) for option in correct_options], dtype=np.int8)
+
+    correct = (matrix == correct_codes).astype(np.float64)
+    totals = correct.sum(axis=1)
+    scores = totals * 100 / questions if questions else totals
+
+    # Explicit sums over attempts, so an empty matrix gives NaN (stored as None)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_values = correct.sum(axis=0) / attempts
+
+        # Point-biserial against the rest score, so a question does not correlate with itself
+        rest = totals[:, None] - correct
+        rest_mean = rest.sum(axis=0) / attempts
+        rest_sd = np.sqrt(np.maximum((rest ** 2).sum(axis=0) / attempts - rest_mean ** 2, 0))
+        covariance = (correct * rest).sum(axis=0) / attempts - p_values * rest_mean
+        discrimination = covariance / (np.sqrt(p_values * (1 - p_values)) * rest_sd)
+
+        # Selection counts and chooser score sums per (question, option code)
+        cells = (np.arange(questions, dtype=np.int64) * 5 + matrix).ravel()
+        counts = np.bincount(cells, minlength=questions * 5).reshape(questions, 5)
+        score_sums = np.bincount(
+            cells, weights=np.repeat(scores, questions), minlength=questions * 5
+        ).reshape(questions, 5)
+        rates = counts / attempts
+        chooser_scores = score_sums / counts
+
+        mean_score = scores.sum() / attempts
+        score_sd = np.sqrt(max((scores ** 2).sum() / attempts - mean_score ** 2, 0))
+        reliability = np.nan
+        if questions > 1:
+            total_mean = totals.sum() / attempts
+            variance = (totals ** 2).sum() / attempts - total_mean ** 2
+            reliability = questions / (questions - 1) * (1 - (p_values * (1 - p_values)).sum() / variance)
+
+    items = []
+    for index, (p_value, item_discrimination) in enumerate(zip(_rounded(p_values), _rounded(discrimination))):
+        option_rates = _rounded(rates[index])
+        option_scores = _rounded(chooser_scores[index])
+        items.append({
+            'p_value': p_value,
+            'discrimination': item_discrimination,
+            'unanswered': option_rates[0],
+            'options': {
+                letter: {'rate': option_rates[code], 'mean_score': option_scores[code]}
+                for letter, code in OPTION_CODES.items()
+            },
+        })
+
+    mean_score, score_sd, reliability = _rounded([mean_score, score_sd, reliability])
+    return {
+        'attempts': attempts,
+        'mean_score': mean_score,
+        'score_sd': score_sd,
+        'reliability': reliability,
+        'items': items,
+    }
+
+
+def item_flags(item, correct_option, attempts):
+    """
+    Reasons a question may need reviewing
+
+    Args:
+        item (dict): Item from analyze_responses
+        correct_option (str): The question's correct option
+        attempts (int): Completed attempts analysed
+
+    Returns:
+        list: Flag names (too_easy, too_hard, low_discrimination, distractor_preferred)
+    """
+    if attempts < ITEM_ANALYSIS_MIN_ATTEMPTS or item['p_value'] is None:
+        return []
+
+    flags = []
+    if item['p_value'] > ITEM_EASY_P_VALUE:
+        flags.append('too_easy')
+    elif item['p_value'] < ITEM_HARD_P_VALUE:
+        flags.append('too_hard')
+    if item['discrimination'] is not None and item['discrimination'] < ITEM_LOW_DISCRIMINATION:
+        flags.append('low_discrimination')
+    correct_rate = item['options'][correct_option]['rate'] if correct_option in item['options'] else 0
+    if any(option['rate'] > correct_rate for letter, option in item['options'].items() if letter != correct_option):
+        flags.append('distractor_preferred')
+    return flags
+
+
+def analyze_quiz(quiz_id, answer_key=None):
+    """
+    Run item analysis over all completed attempts of a quiz
+
+    Args:
+        quiz_id (int): ID of the quiz
+        answer_key (AnswerKey, optional): The quiz's answer key, loaded if not given
+
+    Returns:
+        dict: analyze_responses result whose items also carry question_id,
+        correct_option and flags, plus key_digest and computed_at
+    """
+    answer_key = answer_key or get_answer_key(quiz_id)
+    matrix = load_response_matrix(quiz_id, answer_key.question_ids)
+    analysis = analyze_responses(matrix, answer_key.correct_options)
+
+    for item, question_id, correct_option in zip(
+        analysis['items'], answer_key.question_ids, answer_key.correct_options
+    ):
+        item['question_id'] = question_id
+        item['correct_option'] = correct_option
+        item['flags'] = item_flags(item, correct_option, analysis['attempts'])
+
+    analysis['format'] = ITEM_ANALYSIS_FORMAT
+    analysis['key_digest'] = answer_key_digest(answer_key)
+    analysis['computed_at'] = timezone.now().isoformat()
+    return analysis
+
+
+def get_item_analysis(quiz_id):
+    """
+    Get a quiz's item analysis, cached on its QuizStats row
+
+    The cached result is reused until another attempt is completed or the
+    answer key changes.
+
+    Args:
+        quiz_id (int): ID of the quiz
+
+    Returns:
+        dict: See analyze_quiz
+    """
+    answer_key = get_answer_key(quiz_id)
+    digest = answer_key_digest(answer_key)
+    stats, created = QuizStats.objects.get_or_create(quiz_id=quiz_id)
+
+    cached = stats.item_analysis
+    if (
+        cached
+        and cached.get('format') == ITEM_ANALYSIS_FORMAT
+        and cached.get('key_digest') == digest
+        and cached.get('stats_completions') == stats.completions
+    ):
+        return cached
+
+    analysis = analyze_quiz(quiz_id, answer_key)
+    analysis['stats_completions'] = stats.completions
+    QuizStats.objects.filter(pk=quiz_id).update(item_analysis=analysis)
+    logger.info(f"Item analysis for quiz {quiz_id} over {analysis['attempts']} attempts")
+    return analysis
@@ -0,0 +1,584 @@
+import os
+import json
+import time
+import uuid
+import heapq
+import random
+import logging
+import threading
+from collections import deque
+
+from django.db import close_old_connections
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Broker configuration. An empty URL or memory:// keeps jobs in this process,
+# which is what tests and local development without Redis use.
+JOB_QUEUE_URL = os.environ.get('JOB_QUEUE_URL', os.environ.get('REDIS_URL', ''))
+JOB_QUEUE_PREFIX = os.environ.get('JOB_QUEUE_PREFIX', 'jobs')
+
+# Run jobs inline on enqueue (useful for tests and debugging)
+JOB_QUEUE_EAGER = os.environ.get('JOB_QUEUE_EAGER', '').lower() in ('1', 'true', 'yes')
+
+# Retry policy: delay = base * 2 ** (attempt - 1), capped, plus up to 10% jitter
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BASE_DELAY = float(os.environ.get('JOB_RETRY_BASE_DELAY', '5'))
+JOB_RETRY_MAX_DELAY = float(os.environ.get('JOB_RETRY_MAX_DELAY', '600'))
+
+# How long finished job records are kept for status polling (seconds)
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', '86400'))
+
+# A worker that has not sent a heartbeat for this long is considered dead, and
+# recover() requeues the jobs it had taken (seconds)
+JOB_WORKER_TIMEOUT = int(os.environ.get('JOB_WORKER_TIMEOUT', '60'))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+RETRYING = 'retrying'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+# Registered job functions by name
+JOBS = {}
+
+# Functions run by every worker on a fixed interval, by name
+PERIODIC_TASKS = {}
+
+# Broker and ID of the job running in the current thread, for report_progress
+_current_job = threading.local()
+
+
+class JobRetry(Exception):
+    """Raised by a job to request another attempt without logging a traceback"""
+
+
+def job(name=None, max_attempts=None):
+    """
+    Register a function as a background job
+
+    Job arguments must be JSON serializable, so pass model IDs, not instances.
+
+    Args:
+        name (str, optional): Registry name, defaults to the function name
+        max_attempts (int, optional): Attempts before the job is marked failed
+
+    Returns:
+        function: Decorator that registers the function and returns it unchanged
+    """
+    def decorator(func):
+        func.job_name = name or func.__name__
+        func.max_attempts = max_attempts or JOB_MAX_ATTEMPTS
+        JOBS[func.job_name] = func
+        return func
+    return decorator
+
+
+def periodic(interval, name=None):
+    """
+    Register a function that workers call every `interval` seconds
+
+    Periodic tasks run between jobs in each worker, so they must be safe to
+    run concurrently from several workers.
+
+    Args:
+        interval (float): Seconds between runs
+        name (str, optional): Registry name, defaults to the function name
+
+    Returns:
+        function: Decorator that registers the function and returns it unchanged
+    """
+    def decorator(func):
+        PERIODIC_TASKS[name or func.__name__] = (interval, func)
+        return func
+    return decorator
+
+
+def retry_delay(attempt):
+    """
+    Get the backoff delay before the given retry attempt
+
+    Args:
+        attempt (int): The attempt that just failed, starting at 1
+
+    Returns:
+        float: Delay in seconds
+    """
+    delay = min(JOB_RETRY_MAX_DELAY, JOB_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return delay + random.uniform(0, delay * 0.1)
+
+
+class MemoryBroker:
+    """
+    In-process broker with the same interface as RedisBroker
+
+    Jobs live only as long as the process. Unless a worker is run explicitly,
+    a daemon thread is started on the first enqueue to process them. Finished
+    records are dropped after JOB_RESULT_TTL, like the Redis record expiry.
+    """
+
+    def __init__(self, start_thread=True):
+        self.jobs = {}
+        self.queue = deque()
+        self.delayed = []
+        # (expires_at, job_id) of finished records, oldest first
+        self.expiring = deque()
+        self.condition = threading.Condition()
+        self.start_thread = start_thread
+        self.thread = None
+
+    def push(self, record):
+        with self.condition:
+            self.purge_expired()
+            self.jobs[record['id']] = dict(record)
+            self.queue.appendleft(record['id'])
+            self.condition.notify()
+        if self.start_thread:
+            self.ensure_thread()
+
+    def ensure_thread(self):
+        with self.condition:
+            if self.thread and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(
+                target=Worker(self).run, name='job-queue-worker', daemon=True
+            )
+            self.thread.start()
+
+    def promote_due(self):
+        now = time.time()
+        while self.delayed and self.delayed[0][0] <= now:
+            _, job_id = heapq.heappop(self.delayed)
+            self.queue.appendleft(job_id)
+
+    def pop(self, timeout=1):
+        deadline = time.time() + timeout
+        with self.condition:
+            while True:
+                self.promote_due()
+                if self.queue:
+                    return self.queue.pop()
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                if self.delayed:
+                    remaining = min(remaining, max(0, self.delayed[0][0] - time.time()))
+                self.condition.wait(remaining)
+
+    def purge_expired(self):
+        now = time.time()
+        while self.expiring and self.expiring[0][0] <= now:
+            _, job_id = self.expiring.popleft()
+            record = self.jobs.get(job_id)
+            if record and record['status'] in FINISHED_STATUSES:
+                del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.condition:
+            self.purge_expired()
+            record = self.jobs.get(job_id)
+            return dict(record) if record else None
+
+    def update(self, job_id, **fields):
+        with self.condition:
+            if job_id in self.jobs:
+                self.jobs[job_id].update(fields)
+                if fields.get('status') in FINISHED_STATUSES:
+                    self.expiring.append((time.time() + JOB_RESULT_TTL, job_id))
+
+    def ack(self, job_id):
+        pass
+
+    def schedule(self, job_id, run_at):
+        with self.condition:
+            heapq.heappush(self.delayed, (run_at, job_id))
+            self.condition.notify()
+
+    def recover(self):
+        return 0
+
+    def register_worker(self):
+        pass
+
+    def unregister_worker(self):
+        pass
+
+    def pending_count(self):
+        with self.condition:
+            return len(self.queue) + len(self.delayed)
+
+
+class RedisBroker:
+    """
+    Redis broker
+
+    Keys (under JOB_QUEUE_PREFIX):
+        <prefix>:queue              list of job IDs ready to run
+        <prefix>:processing:<wid>   list of job IDs taken by worker <wid>
+        <prefix>:workers            set of worker IDs that may hold jobs
+        <prefix>:heartbeat:<wid>    present while worker <wid> is alive
+        <prefix>:delayed            sorted set of job IDs scored by retry time
+        <prefix>:job:<id>           hash with the job record
+
+    Each broker instance is one worker, so a process running a Worker must
+    not share its broker with another Worker.
+    """
+
+    def __init__(self, url, prefix=JOB_QUEUE_PREFIX):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.worker_id = uuid.uuid4().hex
+        self.queue_key = f"{prefix}:queue"
+        self.processing_key = self.worker_processing_key(self.worker_id)
+        self.workers_key = f"{prefix}:workers"
+        self.delayed_key = f"{prefix}:delayed"
+        self.job_prefix = f"{prefix}:job:"
+        self.heartbeat_stop = None
+
+    def job_key(self, job_id):
+        return f"{self.job_prefix}{job_id}"
+
+    def worker_processing_key(self, worker_id):
+        return f"{self.prefix}:processing:{worker_id}"
+
+    def heartbeat_key(self, worker_id):
+        return f"{self.prefix}:heartbeat:{worker_id}"
+
+    def heartbeat(self):
+        pipe = self.redis.pipeline()
+        pipe.set(self.heartbeat_key(self.worker_id), 1, ex=JOB_WORKER_TIMEOUT)
+        pipe.sadd(self.workers_key, self.worker_id)
+        pipe.execute()
+
+    def register_worker(self):
+        """Mark this worker alive, and keep it marked from a background thread"""
+        self.heartbeat()
+        self.heartbeat_stop = threading.Event()
+        threading.Thread(
+            target=self.beat, args=(self.heartbeat_stop,), name='job-queue-heartbeat', daemon=True
+        ).start()
+
+    def beat(self, stop):
+        # A heartbeat thread keeps long jobs from looking like a dead worker
+        while not stop.wait(JOB_WORKER_TIMEOUT / 3):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"Could not send job worker heartbeat: {str(e)}")
+
+    def unregister_worker(self):
+        """Stop the heartbeat; anything left in the processing list is recovered later"""
+        if self.heartbeat_stop is not None:
+            self.heartbeat_stop.set()
+            self.heartbeat_stop = None
+        self.redis.delete(self.heartbeat_key(self.worker_id))
+
+    def push(self, record):
+        pipe = self.redis.pipeline()
+        pipe.hset(self.job_key(record['id']), mapping=encode_record(record))
+        pipe.lpush(self.queue_key, record['id'])
+        pipe.execute()
+
+    def promote_due(self):
+        due = self.redis.zrangebyscore(self.delayed_key, 0, time.time(), start=0, num=100)
+        for job_id in due:
+            # Only the worker whose ZREM succeeds moves the job
+            if self.redis.zrem(self.delayed_key, job_id):
+                self.redis.lpush(self.queue_key, job_id)
+
+    def pop(self, timeout=1):
+        self.promote_due()
+        return self.redis.blmove(
+            self.queue_key, self.processing_key, timeout, 'RIGHT', 'LEFT'
+        )
+
+    def get(self, job_id):
+        data = self.redis.hgetall(self.job_key(job_id))
+        return decode_record(data) if data else None
+
+    def update(self, job_id, **fields):
+        key = self.job_key(job_id)
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping=encode_record(fields))
+        if fields.get('status') in FINISHED_STATUSES:
+            pipe.expire(key, JOB_RESULT_TTL)
+        pipe.execute()
+
+    def ack(self, job_id):
+        self.redis.lrem(self.processing_key, 1, job_id)
+
+    def schedule(self, job_id, run_at):
+        pipe = self.redis.pipeline()
+        pipe.zadd(self.delayed_key, {job_id: run_at})
+        pipe.lrem(self.processing_key, 1, job_id)
+        pipe.execute()
+
+    def recover(self):
+        """
+        Requeue jobs held by workers whose heartbeat has expired
+
+        Safe to run from several workers at once: live workers are skipped and
+        each job is moved by a single atomic LMOVE.
+
+        Returns:
+            int: Number of jobs requeued
+        """
+        count = 0
+        for worker_id in self.redis.smembers(self.workers_key):
+            if worker_id == self.worker_id or self.redis.exists(self.heartbeat_key(worker_id)):
+                continue
+            processing_key = self.worker_processing_key(worker_id)
+            while self.redis.lmove(processing_key, self.queue_key, 'RIGHT', 'LEFT'):
+                count += 1
+            self.redis.srem(self.workers_key, worker_id)
+        return count
+
+    def pending_count(self):
+        return self.redis.llen(self.queue_key) + self.redis.zcard(self.delayed_key)
+
+
+def encode_record(record):
+    """Serialize a job record for a Redis hash"""
+    return {key: json.dumps(value) for key, value in record.items()}
+
+
+def decode_record(data):
+    """Deserialize a job record read from a Redis hash"""
+    return {key: json.loads(value) for key, value in data.items()}
+
+
+_broker = None
+_fallback_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    Get the configured broker
+
+    Returns:
+        RedisBroker or MemoryBroker: The process-wide broker
+    """
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            if JOB_QUEUE_URL and not JOB_QUEUE_URL.startswith('memory://'):
+                _broker = RedisBroker(JOB_QUEUE_URL)
+            else:
+                _broker = MemoryBroker()
+        return _broker
+
+
+def set_broker(broker):
+    """Replace the process-wide broker (for tests and benchmarks)"""
+    global _broker
+    with _broker_lock:
+        _broker = broker
+
+
+def get_fallback_broker():
+    """In-process broker used when Redis cannot be reached"""
+    global _fallback_broker
+    with _broker_lock:
+        if _fallback_broker is None:
+            _fallback_broker = MemoryBroker(start_thread=not JOB_QUEUE_EAGER)
+        return _fallback_broker
+
+
+def enqueue(func, *args, owner_id=None, **kwargs):
+    """
+    Queue a registered job
+
+    Args:
+        func (function or str): A function decorated with @job, or its name
+        *args: Positional arguments for the job
+        owner_id (int, optional): User allowed to poll the job status
+        **kwargs: Keyword arguments for the job
+
+    Returns:
+        str: The job ID
+    """
+    name = func if isinstance(func, str) else func.job_name
+    if name not in JOBS:
+        raise ValueError(f"Unknown job: {name}")
+
+    now = time.time()
+    record = {
+        'id': uuid.uuid4().hex,
+        'name': name,
+        'args': list(args),
+        'kwargs': kwargs,
+        'owner_id': owner_id,
+        'status': QUEUED,
+        'attempts': 0,
+        'max_attempts': JOBS[name].max_attempts,
+        'result': None,
+        'error': '',
+        'created_at': now,
+        'updated_at': now,
+    }
+
+    if JOB_QUEUE_EAGER:
+        broker = get_fallback_broker()
+        broker.jobs[record['id']] = record
+        worker = Worker(broker)
+        while worker.execute(record['id']) == RETRYING:
+            pass
+        return record['id']
+
+    try:
+        get_broker().push(record)
+    except Exception as e:
+        # Never lose work because Redis is down: run it in this process instead
+        logger.error(f"Could not queue job {name} in Redis, running it in-process: {str(e)}")
+        get_fallback_broker().push(record)
+
+    logger.info(f"Queued job {name} ({record['id']})")
+    return record['id']
+
+
+def get_job_status(job_id):
+    """
+    Get a job record for status polling
+
+    Args:
+        job_id (str): The job ID returned by enqueue
+
+    Returns:
+        dict: The job record, or None if it is unknown or expired
+    """
+    record = None
+    try:
+        record = get_broker().get(job_id)
+    except Exception as e:
+        logger.error(f"Could not read job {job_id}: {str(e)}")
+    if record is None and _fallback_broker is not None:
+        record = _fallback_broker.get(job_id)
+    return record
+
+
+def report_progress(done, total, message=''):
+    """
+    Record the progress of the running job, shown by job status polling
+
+    Does nothing when called outside a job.
+
+    Args:
+        done (int): Units of work finished
+        total (int): Units of work in total
+        message (str, optional): Short description of the current step
+    """
+    current = getattr(_current_job, 'value', None)
+    if current is None:
+        return
+    broker, job_id = current
+    try:
+        broker.update(
+            job_id, progress={'done': done, 'total': total, 'message': message}, updated_at=time.time()
+        )
+    except Exception as e:
+        logger.error(f"Could not record progress of job {job_id}: {str(e)}")
+
+
+class Worker:
+    """Pulls jobs from a broker and runs them with retries"""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.stopped = False
+        self.periodic_last_run = {}
+
+    def run(self, burst=False, poll_timeout=1):
+        """
+        Process jobs until stopped
+
+        Args:
+            burst (bool): Return once no job is ready instead of waiting
+            poll_timeout (int): Seconds to block waiting for a job
+
+        Returns:
+            int: Number of jobs executed
+        """
+        processed = 0
+        self.broker.register_worker()
+        try:
+            while not self.stopped:
+                self.run_periodic_tasks()
+                job_id = self.broker.pop(timeout=poll_timeout)
+                if job_id is None:
+                    if burst:
+                        break
+                    continue
+                self.execute(job_id)
+                processed += 1
+        finally:
+            self.broker.unregister_worker()
+        return processed
+
+    def run_periodic_tasks(self):
+        """Run the periodic tasks that are due"""
+        now = time.monotonic()
+        for name, (interval, func) in list(PERIODIC_TASKS.items()):
+            last_run = self.periodic_last_run.get(name)
+            if last_run is not None and now - last_run < interval:
+                continue
+            self.periodic_last_run[name] = now
+            close_old_connections()
+            try:
+                func()
+            except Exception:
+                logger.exception(f"Periodic task {name} raised an error")
+            finally:
+                close_old_connections()
+
+    def execute(self, job_id):
+        """
+        Run one job attempt and record the outcome
+
+        Args:
+            job_id (str): The job to run
+
+        Returns:
+            str: The job status after this attempt
+        """
+        record = self.broker.get(job_id)
+        if record is None:
+            logger.warning(f"Job {job_id} has no record, dropping it")
+            self.broker.ack(job_id)
+            return None
+
+        func = JOBS.get(record['name'])
+        attempt = record['attempts'] + 1
+        self.broker.update(job_id, status=RUNNING, attempts=attempt, updated_at=time.time())
+
+        close_old_connections()
+        _current_job.value = (self.broker, job_id)
+        try:
+            if func is None:
+                raise ValueError(f"Unknown job: {record['name']}")
+            result = func(*record['args'], **record['kwargs'])
+        except Exception as e:
+            if isinstance(e, JobRetry):
+                logger.warning(f"Job {record['name']} ({job_id}) attempt {attempt} failed: {str(e)}")
+            else:
+                logger.exception(f"Job {record['name']} ({job_id}) attempt {attempt} raised an error")
+
+            if func is not None and attempt < record['max_attempts']:
+                run_at = time.time() + retry_delay(attempt)
+                self.broker.update(job_id, status=RETRYING, error=str(e), run_at=run_at, updated_at=time.time())
+                self.broker.schedule(job_id, run_at)
+                return RETRYING
+
+            self.broker.update(job_id, status=FAILED, error=str(e), updated_at=time.time())
+            self.broker.ack(job_id)
+            return FAILED
+        finally:
+            _current_job.value = None
+            close_old_connections()
+
+        self.broker.update(job_id, status=SUCCEEDED, result=result, error='', updated_at=time.time())
+        self.broker.ack(job_id)
+        return SUCCEEDED
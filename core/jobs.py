@@ -0,0 +1,274 @@
+import logging
+
+from django.contrib.auth.models import User
+from django.utils.dateparse import parse_datetime
+
+from core.job_queue import job, periodic, enqueue, report_progress, JobRetry
+from core.counter_service import flush_counters, COUNTER_FLUSH_INTERVAL
+from core.outbox_service import dispatch_outbox, queue_emails, OUTBOX_DISPATCH_INTERVAL
+from core.quiz_service import (
+    append_quiz_questions, rescore_quiz, expire_attempts,
+    QUIZ_EXPIRY_INTERVAL, QUIZ_EXPIRY_BATCH_SIZE,
+)
+from core.models import VideoConference, VideoConferenceParticipant, QuizQuestion
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+@periodic(COUNTER_FLUSH_INTERVAL)
+def flush_view_counters():
+    """Write buffered view/download counts to the database"""
+    flush_counters()
+
+
+@periodic(OUTBOX_DISPATCH_INTERVAL)
+@job(max_attempts=1)
+def dispatch_email_outbox(max_batches=20):
+    """Send due emails from the outbox; also queued when emails are added to it"""
+    return dispatch_outbox(max_batches=max_batches)
+
+
+@periodic(QUIZ_EXPIRY_INTERVAL)
+def expire_quiz_attempts(max_batches=20):
+    """Submit timed quiz attempts that were abandoned past their deadline"""
+    for _ in range(max_batches):
+        if expire_attempts() < QUIZ_EXPIRY_BATCH_SIZE:
+            break
+
+
+@job()
+def setup_zoom_meeting(conference_id, use_oauth=False, invite_user_ids=None, is_targeted=False):
+    """
+    Create the Zoom meeting for a conference, then queue its invitations
+
+    Args:
+        conference_id (int): The VideoConference ID
+        use_oauth (bool): Create the meeting with the scheduler's Zoom account
+        invite_user_ids (list, optional): Users to email once the meeting exists
+        is_targeted (bool): Whether the invitations are for hand-picked participants
+
+    Returns:
+        dict: The created meeting ID and the invitation job ID
+    """
+    conference = VideoConference.objects.select_related('scheduled_by').get(pk=conference_id)
+
+    # A previous attempt may have created the meeting before failing later on.
+    # The start URL is only set by the Zoom API; meeting_id may be user-entered.
+    if not conference.zoom_start_url:
+        if use_oauth:
+            created = conference.create_zoom_meeting_oauth()
+        else:
+            created = conference.create_zoom_meeting()
+        if not created:
+            raise JobRetry(f"Zoom meeting could not be created for conference {conference_id}")
+
+    invitation_job_id = None
+    if invite_user_ids:
+        invitation_job_id = enqueue(
+            send_conference_invitations, conference_id, invite_user_ids, is_targeted=is_targeted
+        )
+
+    return {'meeting_id': conference.meeting_id, 'invitation_job_id': invitation_job_id}
+
+
+@job()
+def send_conference_invitations(conference_id, user_ids, is_targeted=False):
+    """
+    Put meeting invitations to conference participants in the email outbox
+
+    Invitations are keyed by conference and address, so a retried job or a
+    participant invited again is not emailed twice.
+
+    Args:
+        conference_id (int): The VideoConference ID
+        user_ids (list): IDs of the users to invite
+        is_targeted (bool): Whether the invitations are for hand-picked participants
+
+    Returns:
+        dict: Number of invitations queued
+    """
+    from core.email_service import build_meeting_invitations
+
+    conference = VideoConference.objects.select_related('subject', 'scheduled_by').get(pk=conference_id)
+    participants = list(User.objects.filter(id__in=user_ids))
+
+    emails = build_meeting_invitations(conference, participants, is_targeted=is_targeted)
+    return {'queued': queue_emails(f"conference-invite:{conference_id}", emails)}
+
+
+@job(max_attempts=3)
+def send_login_notification(user_id, login_time, ip_address, user_agent):
+    """
+    Email a user about a new login to their account
+
+    Args:
+        user_id (int): The user who logged in
+        login_time (str): ISO timestamp of the login
+        ip_address (str): IP address the user logged in from
+        user_agent (str): Browser user agent
+
+    Returns:
+        dict: Whether the email was sent
+    """
+    from core.email_service import send_user_login_notification
+    from core.login_notification_service import login_notifications_enabled, record_delivery, record_skipped
+
+    user = User.objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+        return {'sent': False}
+
+    if not login_notifications_enabled(user):
+        logger.info(f"Login notifications disabled for {user.username}")
+        record_skipped()
+        return {'sent': False}
+
+    sent = send_user_login_notification(user, parse_datetime(login_time), ip_address, user_agent)
+    record_delivery(sent)
+    if not sent:
+        raise JobRetry(f"Login notification could not be sent to user {user_id}")
+
+    return {'sent': True}
+
+
+@job(max_attempts=8)
+def process_conference_recordings(conference_id):
+    """
+    Copy a finished meeting's Zoom recordings to S3 and notify participants
+
+    Zoom can take a while to make recordings available, so this job retries
+    with backoff until they can be downloaded. A retry resumes an interrupted
+    upload from its last uploaded part.
+
+    Args:
+        conference_id (int): The VideoConference ID
+
+    Returns:
+        dict: The recording URL and number of participants notified
+    """
+    from core.zoom_service import download_recording_to_s3
+    from core.email_service import build_meeting_update_notifications, site_url
+
+    conference = VideoConference.objects.get(pk=conference_id)
+
+    result = download_recording_to_s3(
+        conference.meeting_id,
+        conference_obj=conference,
+        progress=lambda done, total: report_progress(done, total or done, 'Uploading recording')
+    )
+    if not result.get('success'):
+        raise JobRetry(result.get('error', 'Unknown error'))
+
+    recording_url = result.get('recording_url')
+    notified = 0
+    if recording_url:
+        participants = VideoConferenceParticipant.objects.filter(
+            conference=conference
+        ).select_related('user')
+        recipients = [p.user for p in participants if p.user.is_active and p.user.email]
+
+        if recipients:
+            # The S3 object is private, so link to the conference page, which
+            # presigns it for the viewer
+            emails = build_meeting_update_notifications(
+                conference, recipients, 'Recording Available',
+                recording_url=site_url(conference.get_absolute_url())
+            )
+            notified = queue_emails(f"conference-recording:{conference_id}", emails)
+
+    return {'recording_url': recording_url, 'notified': notified}
+
+
+@job(max_attempts=3)
+def generate_quiz_questions(quiz_id, topic, num_questions=5, difficulty='medium'):
+    """
+    Generate AI multiple-choice questions and append them to a quiz
+
+    Batches are generated in parallel and reported as job progress. Questions
+    are only saved once all batches are done, so a retried job never adds a
+    partial set twice.
+
+    Args:
+        quiz_id (int): The Quiz ID
+        topic (str): Topic to generate questions about
+        num_questions (int): Number of questions to generate (at most MAX_GENERATED_QUESTIONS)
+        difficulty (str): Difficulty level (easy, medium, hard)
+
+    Returns:
+        dict: Number of questions added and of invalid or duplicate ones dropped
+    """
+    from core.ai_service import generate_quiz_questions_bulk
+
+    existing = list(
+        QuizQuestion.objects.filter(quiz_id=quiz_id).order_by('question_number').values_list('question_text', flat=True)
+    )
+
+    report_progress(0, num_questions, 'Generating questions')
+    questions, counts = generate_quiz_questions_bulk(
+        topic,
+        num_questions,
+        difficulty=difficulty,
+        existing=existing,
+        progress=lambda done, total: report_progress(done, total, 'Generating questions')
+    )
+    if not questions:
+        raise JobRetry(f"No usable questions were generated for quiz {quiz_id}: {counts}")
+
+    report_progress(len(questions), counts['requested'], 'Saving questions')
+    append_quiz_questions(quiz_id, questions)
+
+    return {
+        'added': len(questions),
+        'requested': counts['requested'],
+        'invalid': counts['invalid'],
+        'duplicates': counts['duplicates'],
+    }
+
+
+@job(max_attempts=3)
+def fill_question_bank(subject_id, class_level, difficulty):
+    """
+    Generate practice questions into a (subject, class level, difficulty) bank
+
+    Returns:
+        dict: Number of questions added
+    """
+    from core.question_bank_service import fill_bank, release_fill_lock
+
+    try:
+        added = fill_bank(subject_id, class_level, difficulty)
+    except Exception:
+        release_fill_lock(subject_id, class_level, difficulty)
+        raise
+    if added:
+        release_fill_lock(subject_id, class_level, difficulty)
+    else:
+        # Keep the lock until it expires, so a full bank or a failing generator
+        # is not refilled on every request that finds the bank low
+        logger.warning(f"No practice questions added to bank {subject_id}/{class_level}/{difficulty}")
+    return {'added': added}
+
+
+@job(max_attempts=3)
+def fold_conversation_summary(session_id, through_message_id):
+    """
+    Fold AI tutor messages that left the history window into the session summary
+
+    Returns:
+        dict: Whether every message up to through_message_id was folded
+    """
+    from core.conversation_service import fold_summary_through, release_fold_lock
+
+    try:
+        folded = fold_summary_through(session_id, through_message_id)
+    finally:
+        release_fold_lock(session_id)
+    if not folded:
+        raise JobRetry(f"Context summary of AI session {session_id} could not be refreshed")
+    return {'folded': True}
+
+
+@job()
+def rescore_quiz_attempts(quiz_id):
+    """Recalculate every completed attempt of a quiz after its answer key changes"""
+    return {'rescored': rescore_quiz(quiz_id)}
@@ -9,11 +9,12 @@ from datetime import datetime, timedelta
 from .models import UserProfile, Subject, StudyMaterial
 from .learning_service import get_case_study, get_weekly_learning_summary
 from .email_service import send_weekly_summary
+from .profile_service import get_profile_or_404
 
 @login_required
 def case_study_view(request, subject_id=None):
     """View for case/scenario-based learning"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Check if a specific subject was requested
     if subject_id:
@@ -34,13 +35,13 @@ def case_study_view(request, subject_id=None):
         difficulty = 'medium'
     
     # Generate case study
-    case_study = get_case_study(subject, profile.class_level, difficulty)
+    case_study = get_case_study(subject, profile.class_level, difficulty, user=request.user)
     
     # Get related study materials
     related_materials = StudyMaterial.objects.filter(
         subject=subject,
         class_level=profile.class_level
-    ).order_by('-upload_date')[:5]
+    ).defer('search_vector').order_by('-upload_date')[:5]
     
     return render(request, 'learning/case_study.html', {
         'profile': profile,
@@ -53,7 +54,7 @@ def case_study_view(request, subject_id=None):
 @login_required
 def weekly_summary_view(request):
     """View for displaying the weekly learning summary"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Only students can view their weekly summary
     if profile.role != 'student':
@@ -75,7 +76,7 @@ def weekly_summary_view(request):
 @require_POST
 def send_weekly_summary_email(request):
     """Send weekly summary via email"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Only students can send their weekly summary
     if profile.role != 'student':
@@ -98,7 +99,7 @@ def send_weekly_summary_email(request):
 @login_required
 def areas_of_improvement(request):
     """View for displaying areas of improvement based on user activity"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Only students can view areas of improvement
     if profile.role != 'student':
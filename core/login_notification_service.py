@@ -0,0 +1,147 @@
+import os
+import logging
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+from django.utils import timezone
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# At most one login email per user in this many seconds; later logins are coalesced
+LOGIN_NOTIFICATION_COALESCE_SECONDS = int(os.environ.get('LOGIN_NOTIFICATION_COALESCE_SECONDS', '600'))
+# Notifications are dropped rather than queued while the job queue holds this many jobs
+LOGIN_NOTIFICATION_MAX_PENDING = int(os.environ.get('LOGIN_NOTIFICATION_MAX_PENDING', '1000'))
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+
+
+def _count(outcome):
+    with _counts_lock:
+        _counts[outcome] += 1
+
+
+def coalesce_key(user_id):
+    """Cache key held while a user's login notification is recent"""
+    return f"login_notification:{user_id}"
+
+
+def client_details(request):
+    """
+    IP address and user agent of a request
+
+    Returns:
+        tuple: (ip_address, user_agent), "Unknown" when not available
+    """
+    if request is None:
+        return "Unknown", "Unknown"
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip_address = x_forwarded_for.split(',')[0].strip()
+    else:
+        ip_address = request.META.get('REMOTE_ADDR', 'Unknown')
+    return ip_address, request.META.get('HTTP_USER_AGENT', 'Unknown')
+
+
+def queue_login_notification(user, request=None):
+    """
+    Queue the email telling a user about a new login
+
+    Logins within LOGIN_NOTIFICATION_COALESCE_SECONDS of a notified one are
+    coalesced into it, and notifications are dropped while the job queue is
+    backed up past LOGIN_NOTIFICATION_MAX_PENDING jobs, so a login rush
+    cannot flood the workers or the mail server.
+
+    Args:
+        user (User): The user who logged in
+        request (HttpRequest, optional): The login request, for IP and user agent
+
+    Returns:
+        str: The job ID, or None if the notification was coalesced, dropped or not needed
+    """
+    from core.job_queue import enqueue, get_broker
+    from core.jobs import send_login_notification
+
+    if not user.email:
+        return None
+
+    key = coalesce_key(user.id)
+    try:
+        if not cache.add(key, 1, LOGIN_NOTIFICATION_COALESCE_SECONDS):
+            _count('coalesced')
+            return None
+    except Exception as e:
+        logger.error(f"Login notification coalescing unavailable: {str(e)}")
+
+    try:
+        pending = get_broker().pending_count()
+    except Exception as e:
+        logger.error(f"Could not read job queue depth: {str(e)}")
+        pending = 0
+    if pending >= LOGIN_NOTIFICATION_MAX_PENDING:
+        _count('dropped')
+        logger.warning(f"Job queue holds {pending} jobs, dropping login notification for user {user.id}")
+        # Let the next login try again
+        try:
+            cache.delete(key)
+        except Exception:
+            pass
+        return None
+
+    ip_address, user_agent = client_details(request)
+    try:
+        job_id = enqueue(send_login_notification, user.id, timezone.now().isoformat(), ip_address, user_agent)
+    except Exception as e:
+        _count('failed')
+        logger.error(f"Could not queue login notification for user {user.id}: {str(e)}")
+        return None
+
+    _count('queued')
+    return job_id
+
+
+def login_notifications_enabled(user):
+    """
+    Whether a user's settings allow login emails
+
+    They are on unless the user's settings have email_login_notification turned off.
+    """
+    from core.models import UserSettings
+
+    settings = UserSettings.objects.filter(user=user).first()
+    return getattr(settings, 'email_login_notification', True)
+
+
+def record_delivery(sent):
+    """Count the outcome of a send_login_notification job"""
+    _count('sent' if sent else 'failed')
+
+
+def record_skipped():
+    """Count a send_login_notification job for a user who turned login emails off"""
+    _count('skipped')
+
+
+def login_notification_stats():
+    """
+    Login notification counters for this process, for monitoring
+
+    Returns:
+        dict: queued, coalesced, dropped, sent, skipped and failed counts, plus
+        the current job queue depth (None if it cannot be read)
+    """
+    from core.job_queue import get_broker
+
+    with _counts_lock:
+        stats = {
+            outcome: _counts[outcome]
+            for outcome in ('queued', 'coalesced', 'dropped', 'sent', 'skipped', 'failed')
+        }
+    try:
+        stats['queue_depth'] = get_broker().pending_count()
+    except Exception as e:
+        logger.error(f"Could not read job queue depth: {str(e)}")
+        stats['queue_depth'] = None
+    return stats
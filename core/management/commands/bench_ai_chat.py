@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from openai import OpenAI, AsyncOpenAI
+
+from core import ai_service
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Local stand-in for the OpenAI chat completions API with a fixed latency"""
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency):
+        self.latency = latency
+        super().__init__(('127.0.0.1', 0), FakeOpenAIHandler)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+
+        body = json.dumps({
+            'id': 'chatcmpl-bench',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': 'gpt-4o',
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': 'Photosynthesis is how plants make food.'},
+                'finish_reason': 'stop',
+            }],
+            'usage': {'prompt_tokens': 400, 'completion_tokens': 10, 'total_tokens': 410},
+        }).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent AI tutor chats against a local fake OpenAI server, "
+        "comparing sync workers (get_ai_response) with the async path (aget_ai_response)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Total chat requests to send')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Sync worker threads, i.e. gunicorn sync workers per process')
+        parser.add_argument('--concurrency', type=int, default=200,
+                            help='Maximum in-flight requests on the async path')
+        parser.add_argument('--latency', type=float, default=0.5,
+                            help='Simulated model latency in seconds')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        server = FakeOpenAIServer(options['latency'])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        original_clients = (ai_service.openai, ai_service.async_openai)
+        ai_service.openai = OpenAI(api_key='bench', base_url=server.base_url, max_retries=0)
+        ai_service.async_openai = AsyncOpenAI(api_key='bench', base_url=server.base_url, max_retries=0)
+
+        try:
+            self.stdout.write(
+                f"{total} chats, {options['latency']:.2f}s simulated model latency, fake server at {server.base_url}"
+            )
+
+            sync_elapsed, sync_results = self.run_sync(total, options['workers'])
+            self.report(f"sync ({options['workers']} workers)", sync_elapsed, sync_results)
+
+            async_elapsed, async_results = asyncio.run(self.run_async(total, options['concurrency']))
+            self.report(f"async (up to {options['concurrency']} in flight)", async_elapsed, async_results)
+
+            self.stdout.write(self.style.SUCCESS(f"Speed-up: {sync_elapsed / async_elapsed:.1f}x"))
+        finally:
+            ai_service.openai, ai_service.async_openai = original_clients
+            server.shutdown()
+
+    def run_sync(self, total, workers):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                lambda i: ai_service.get_ai_response(f"Question {i}", class_level='7'), range(total)
+            ))
+        return time.perf_counter() - start, results
+
+    async def run_async(self, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def chat(i):
+            async with semaphore:
+                return await ai_service.aget_ai_response(f"Question {i}", class_level='7')
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(chat(i) for i in range(total)))
+        return time.perf_counter() - start, results
+
+    def report(self, label, elapsed, results):
+        failed = sum(1 for result in results if result == ai_service.AI_ERROR_MESSAGE)
+        self.stdout.write(
+            f"  {label:<32} {elapsed:7.2f}s  {len(results) / elapsed:8.1f} chats/s  {failed} failed"
+        )
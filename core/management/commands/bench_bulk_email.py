@@ -0,0 +1,142 @@
+import socketserver
+import threading
+import time
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from core.bulk_email_service import BULK_EMAIL_CHUNK_SIZE, OutgoingEmail, send_bulk_email
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Local SMTP server that accepts and discards every message"""
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, connect_latency):
+        self.connect_latency = connect_latency
+        self.connections = 0
+        self.delivered = 0
+        self.lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), SMTPSinkHandler)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line + b'\r\n')
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        # Stands in for the TCP, TLS and login round trips to a real server
+        time.sleep(self.server.connect_latency)
+        self.reply(b'220 localhost SMTP sink')
+
+        recipients = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b'EHLO':
+                self.reply(b'250-localhost')
+                self.reply(b'250 8BITMIME')
+            elif command == b'RCPT':
+                recipients += 1
+                self.reply(b'250 OK')
+            elif command == b'DATA':
+                self.reply(b'354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with self.server.lock:
+                    self.server.delivered += recipients
+                recipients = 0
+                self.reply(b'250 OK')
+            elif command == b'QUIT':
+                self.reply(b'221 Bye')
+                return
+            else:
+                if command == b'RSET':
+                    recipients = 0
+                self.reply(b'250 OK')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare sending a connection per email with send_bulk_email, '
+        'against a local SMTP sink'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=10000, help='Emails to send in bulk')
+        parser.add_argument('--sample', type=int, default=100,
+                            help='Emails sent with a connection each, extrapolated to all messages')
+        parser.add_argument('--connect-latency', type=float, default=0.1,
+                            help='Simulated connection setup time in seconds')
+        parser.add_argument('--chunk-size', type=int, default=BULK_EMAIL_CHUNK_SIZE,
+                            help='Messages per SMTP connection')
+        parser.add_argument('--rate', type=float, default=0, help='Messages per second, 0 for no limit')
+
+    def handle(self, *args, **options):
+        sink = SMTPSink(options['connect_latency'])
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+
+        def connection():
+            return get_connection(
+                'django.core.mail.backends.smtp.EmailBackend',
+                host='127.0.0.1', port=sink.port, username='', password='',
+                use_tls=False, use_ssl=False, fail_silently=False
+            )
+
+        html_content = render_to_string('email/user_signup_notification.html', {
+            'user': {'username': 'student', 'first_name': 'Bench'}, 'user_profile': None, 'login_url': '#'
+        })
+        emails = [
+            OutgoingEmail(f"student{i}@example.com", 'New Assignment: Bench', html_content)
+            for i in range(options['messages'])
+        ]
+
+        try:
+            self.stdout.write(
+                f"{len(emails)} emails of {len(html_content)} bytes, "
+                f"{options['connect_latency']:.2f}s connection setup, sink on port {sink.port}"
+            )
+
+            sample = emails[:options['sample']]
+            start = time.perf_counter()
+            for email in sample:
+                message = EmailMultiAlternatives(
+                    email.subject, strip_tags(email.html_content), 'bench@example.com', [email.to_email],
+                    connection=connection()
+                )
+                message.attach_alternative(email.html_content, 'text/html')
+                message.send()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"  connection per email: {len(sample)} in {elapsed:.2f}s "
+                f"(about {elapsed / max(len(sample), 1) * len(emails):.0f}s for {len(emails)})"
+            )
+
+            connections_before, delivered_before = sink.connections, sink.delivered
+            start = time.perf_counter()
+            outcomes = send_bulk_email(
+                emails, 'bench@example.com', connection=connection(),
+                chunk_size=options['chunk_size'], rate=options['rate']
+            )
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"  send_bulk_email:      {len(emails)} in {elapsed:.2f}s "
+                f"({len(emails) / elapsed:.0f}/s), {sink.connections - connections_before} connections, "
+                f"{sum(1 for outcome in outcomes if outcome.sent)} sent, "
+                f"{sink.delivered - delivered_before} received by the sink"
+            )
+        finally:
+            sink.shutdown()
+            sink.server_close()
@@ -0,0 +1,112 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.template import Engine, engines
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from core.email_service import render_weekly_summaries
+
+CLASS_LEVELS = [str(level) for level in range(1, 13)]
+SUBJECTS = ('Mathematics', 'Science', 'English', 'History', 'Geography', 'Art')
+
+
+class Command(BaseCommand):
+    help = 'Compare rendering weekly summary emails one by one with render_weekly_summaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=5000, help='Emails to render')
+
+    def handle(self, *args, **options):
+        summaries = self.summaries(options['emails'])
+        loaders = [loader.__class__.__module__ for loader in engines['django'].engine.template_loaders]
+        self.stdout.write(f"{len(summaries)} weekly summaries, DEBUG={settings.DEBUG}, template loaders: {loaders}")
+
+        # Same engine settings without the cached loader, so every render parses the templates
+        uncached = Engine(
+            dirs=settings.TEMPLATES[0]['DIRS'],
+            loaders=['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader'],
+        )
+        start = time.perf_counter()
+        for user, summary in summaries:
+            self.render_one(user, summary, uncached.render_to_string)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"  uncached templates:         {elapsed:.2f}s ({elapsed / len(summaries) * 1000:.2f} ms/email)")
+
+        start = time.perf_counter()
+        one_by_one = [(user, self.render_one(user, summary)) for user, summary in summaries]
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"  render_to_string per email: {elapsed:.2f}s ({elapsed / len(summaries) * 1000:.2f} ms/email)")
+
+        start = time.perf_counter()
+        batched = render_weekly_summaries(summaries)
+        batch_elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"  render_weekly_summaries:    {batch_elapsed:.2f}s ({batch_elapsed / len(summaries) * 1000:.2f} ms/email), "
+            f"{elapsed / batch_elapsed:.1f}x faster"
+        )
+
+        mismatches = sum(1 for (_, expected), (_, html) in zip(one_by_one, batched) if expected != html)
+        style = self.style.SUCCESS if not mismatches else self.style.ERROR
+        self.stdout.write(style(f"{mismatches} emails differ between the two paths"))
+
+    def render_one(self, user, summary, render=render_to_string):
+        """Render every template for one email, as a per-email send would"""
+        deadlines = render('email/weekly_summary_deadlines.html', {
+            'deadlines': summary['highlights']['upcoming_deadlines']
+        })
+        content = render('email/weekly_summary_content.html', {
+            'stats': summary['stats'],
+            'highlights': summary['highlights'],
+            'deadlines_html': mark_safe(deadlines),
+        })
+        return render('email/weekly_summary.html', {
+            'recipient_name': user.first_name or user.username,
+            'summary_content': mark_safe(content),
+        })
+
+    def summaries(self, count):
+        rng = random.Random(42)
+        now = timezone.now()
+        deadlines = {
+            level: [
+                {'title': f"Class {level} assignment {i}", 'due_date': now + timedelta(days=i + 1)}
+                for i in range(rng.randint(0, 4))
+            ]
+            for level in CLASS_LEVELS
+        }
+
+        summaries = []
+        for i in range(count):
+            user = User(id=i + 1, username=f"student{i}", first_name=rng.choice(['', 'Asha', 'Ravi', 'Meena']))
+            summaries.append((user, {
+                'stats': {
+                    'materials_viewed': 0,
+                    'assignments_completed': rng.randint(0, 5),
+                    'classes_attended': rng.randint(0, 4),
+                    'study_hours': round(rng.uniform(0, 12), 1),
+                },
+                'highlights': {
+                    'top_subjects': [
+                        {'name': name, 'hours': round(rng.uniform(0.5, 5), 1)}
+                        for name in rng.sample(SUBJECTS, rng.randint(0, 3))
+                    ],
+                    'recent_achievements': [
+                        f"Scored {rng.randint(80, 100)}/100 on 'Quiz {n}'" for n in range(rng.randint(0, 3))
+                    ],
+                    'improvement_areas': [
+                        {
+                            'description': f"Low recent activity in {name}",
+                            'suggestion': f"Consider scheduling more study time for {name}",
+                        }
+                        for name in rng.sample(SUBJECTS, rng.randint(0, 2))
+                    ],
+                    'upcoming_deadlines': deadlines[rng.choice(CLASS_LEVELS)],
+                },
+            }))
+        return summaries
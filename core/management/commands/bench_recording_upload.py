@@ -0,0 +1,171 @@
+import re
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from core import s3_service
+from core.s3_service import S3_MULTIPART_CONCURRENCY, S3_MULTIPART_PART_SIZE, get_s3_client, upload_stream_to_s3
+from core.zoom_service import stream_recording
+
+MB = 1024 * 1024
+
+
+class RecordingServer(ThreadingHTTPServer):
+    """Local HTTP server that serves a fake recording, honouring Range requests"""
+    daemon_threads = True
+
+    def __init__(self, size):
+        self.size = size
+        # Repeating pattern, so a corrupted or misaligned upload shows up in the checks
+        self.block = bytes(range(251)) * (MB // 251 + 1)
+        super().__init__(('127.0.0.1', 0), RecordingHandler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/recording.mp4"
+
+    def read(self, offset, length):
+        data = bytearray()
+        while length > 0:
+            start = offset % 251
+            piece = self.block[start:start + min(length, MB)]
+            data += piece
+            offset += len(piece)
+            length -= len(piece)
+        return bytes(data)
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        size = self.server.size
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        offset = int(match.group(1)) if match else 0
+        self.send_response(206 if match else 200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(size - offset))
+        self.end_headers()
+        while offset < size:
+            length = min(MB, size - offset)
+            try:
+                self.wfile.write(self.server.read(offset, length))
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            offset += length
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare downloading a recording to a temp file and uploading it with '
+        'streaming it into an S3 multipart upload, including resuming after a crash. '
+        'Point AWS_S3_ENDPOINT_URL at MinIO or moto_server to run it locally.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=256, help='Size of the fake recording')
+        parser.add_argument('--part-size-mb', type=int, default=S3_MULTIPART_PART_SIZE // MB,
+                            help='Multipart part size')
+        parser.add_argument('--concurrency', type=int, default=S3_MULTIPART_CONCURRENCY,
+                            help='Parts uploaded at once')
+        parser.add_argument('--create-bucket', action='store_true',
+                            help='Create the bucket first, for a local S3 stand-in')
+
+    def handle(self, *args, **options):
+        if not s3_service.AWS_ACCESS_KEY_ID or not s3_service.AWS_SECRET_ACCESS_KEY:
+            raise CommandError('AWS credentials are not configured')
+
+        s3_client = get_s3_client()
+        bucket = s3_service.AWS_STORAGE_BUCKET_NAME
+        if options['create_bucket']:
+            try:
+                s3_client.head_bucket(Bucket=bucket)
+            except Exception:
+                s3_client.create_bucket(Bucket=bucket)
+
+        size = options['size_mb'] * MB
+        part_size = options['part_size_mb'] * MB
+        server = RecordingServer(size)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        keys = []
+
+        def check(key):
+            head = s3_client.head_object(Bucket=bucket, Key=key)
+            tail = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={size - 1000}-")['Body'].read()
+            return head['ContentLength'] == size and tail == server.read(size - 1000, 1000)
+
+        try:
+            self.stdout.write(
+                f"{size // MB} MB recording from {server.url} to bucket {bucket} "
+                f"({s3_service.AWS_S3_ENDPOINT_URL or 'AWS'}), {part_size // MB} MB parts"
+            )
+
+            # Previous approach: whole file to disk in 8 KB chunks, then upload it
+            key = f"bench/recording-tempfile-{time.time_ns()}.mp4"
+            keys.append(key)
+            start = time.perf_counter()
+            with tempfile.NamedTemporaryFile(suffix='.mp4') as temp_file:
+                with requests.get(server.url, stream=True) as r:
+                    r.raise_for_status()
+                    for chunk in r.iter_content(chunk_size=8192):
+                        temp_file.write(chunk)
+                temp_file.flush()
+                s3_client.upload_file(temp_file.name, bucket, key)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"  temp file then upload: {elapsed:.2f}s ({size / MB / elapsed:.1f} MB/s), "
+                f"{size // MB} MB on disk, intact: {check(key)}"
+            )
+
+            key = f"bench/recording-stream-{time.time_ns()}.mp4"
+            keys.append(key)
+            start = time.perf_counter()
+            result = upload_stream_to_s3(
+                lambda offset: stream_recording(server.url, offset), key,
+                expected_size=size, part_size=part_size, concurrency=options['concurrency']
+            )
+            elapsed = time.perf_counter() - start
+            if not result['success']:
+                raise CommandError(f"Streamed upload failed: {result['error']}")
+            self.stdout.write(
+                f"  streamed multipart:    {elapsed:.2f}s ({result['throughput_mb_s']:.1f} MB/s), "
+                f"at most {(options['concurrency'] + 1) * part_size // MB} MB in memory, intact: {check(key)}"
+            )
+
+            # Crash part way through, then resume from the parts already in S3
+            key = f"bench/recording-resume-{time.time_ns()}.mp4"
+            keys.append(key)
+            crash_at = size // 2
+
+            def crashing_stream(offset):
+                for chunk in stream_recording(server.url, offset):
+                    offset += len(chunk)
+                    if offset > crash_at:
+                        raise ConnectionError('Simulated crash')
+                    yield chunk
+
+            first = upload_stream_to_s3(
+                crashing_stream, key, expected_size=size, part_size=part_size, concurrency=options['concurrency']
+            )
+            second = upload_stream_to_s3(
+                lambda offset: stream_recording(server.url, offset), key,
+                expected_size=size, part_size=part_size, concurrency=options['concurrency']
+            )
+            self.stdout.write(
+                f"  crash at {crash_at // MB} MB: {first.get('bytes_uploaded', 0) // MB} MB kept, "
+                f"resumed from {second.get('resumed_from', 0) // MB} MB, "
+                f"completed: {second['success']}, intact: {second['success'] and check(key)}"
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+            for key in keys:
+                try:
+                    s3_client.delete_object(Bucket=bucket, Key=key)
+                except Exception:
+                    pass
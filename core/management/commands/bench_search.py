@@ -0,0 +1,93 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.models import StudyMaterial, Subject
+from core.search_service import search_queryset, uses_full_text_search
+
+WORDS = (
+    'algebra', 'biology', 'chemistry', 'photosynthesis', 'geometry', 'history', 'literature',
+    'physics', 'equations', 'fractions', 'grammar', 'vocabulary', 'ecosystem', 'electricity',
+    'revolution', 'poetry', 'statistics', 'probability', 'molecules', 'climate', 'revision',
+    'worksheet', 'notes', 'chapter', 'exercise', 'summary', 'practice', 'introduction',
+)
+QUERIES = ('photosynthesis', 'photo', 'algebra equations', 'climate revolution notes', 'zzzz')
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark rows"""
+
+
+class Command(BaseCommand):
+    help = 'Compare LIKE search with search_queryset on generated study materials (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Study materials to generate')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        backend = 'tsvector + GIN' if uses_full_text_search() else 'icontains fallback'
+        self.stdout.write(f"{connection.vendor}: search_queryset uses {backend}")
+
+        try:
+            with transaction.atomic():
+                self.populate(rows)
+                self.stdout.write(f"{rows} study materials")
+                for query in QUERIES:
+                    self.compare(query, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def populate(self, rows):
+        rng = random.Random(42)
+        user = User.objects.create(username='bench-search')
+        subject = Subject.objects.create(name='Bench search')
+
+        start = time.perf_counter()
+        batch = []
+        for i in range(rows):
+            batch.append(StudyMaterial(
+                title=' '.join(rng.sample(WORDS, 3)).title(),
+                description=' '.join(rng.choices(WORDS, k=30)),
+                subject=subject,
+                class_level='1',
+                file_type='pdf',
+                uploaded_by=user,
+            ))
+            if len(batch) == 5000:
+                StudyMaterial.objects.bulk_create(batch)
+                batch = []
+        StudyMaterial.objects.bulk_create(batch)
+        if uses_full_text_search():
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {StudyMaterial._meta.db_table}")
+        self.stdout.write(f"Inserted in {time.perf_counter() - start:.1f}s")
+
+    def compare(self, query, repeat):
+        materials = StudyMaterial.objects.all()
+
+        def like_search():
+            return list(materials.filter(
+                Q(title__icontains=query) | Q(description__icontains=query)
+            ).order_by('-upload_date')[:20])
+
+        def ranked_search():
+            return list(search_queryset(materials, query)[:20])
+
+        for name, run in (('icontains', like_search), ('search_queryset', ranked_search)):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results = run()
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            self.stdout.write(
+                f"{query!r:28} {name:16}: median {timings[len(timings) // 2] * 1000:.1f} ms, "
+                f"{len(results)} results on first page"
+            )
@@ -0,0 +1,157 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import (
+    Assignment, AssignmentSubmission, AITutorSession, Subject, UserProfile,
+    VideoConference, VideoConferenceParticipant,
+)
+from core.learning_service import get_weekly_learning_summary
+from core.weekly_summary_service import WEEKLY_SUMMARY_CHUNK_SIZE, iter_weekly_summaries
+
+CLASS_LEVELS = [str(level) for level in range(1, 13)]
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark rows"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare per-student weekly summaries with the chunked batch engine on '
+        'generated students (rolled back afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=50000, help='Students to generate')
+        parser.add_argument('--sample', type=int, default=500,
+                            help='Students summarised one at a time, extrapolated to all students')
+        parser.add_argument('--chunk-size', type=int, default=WEEKLY_SUMMARY_CHUNK_SIZE,
+                            help='Students per chunk for the batch engine')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{connection.vendor}: {options['students']} students")
+        try:
+            with transaction.atomic():
+                students = self.populate(options['students'])
+                self.compare(students, options['sample'], options['chunk_size'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def bulk_create(self, model, rows):
+        for start in range(0, len(rows), BATCH_SIZE):
+            model.objects.bulk_create(rows[start:start + BATCH_SIZE])
+
+    def populate(self, count):
+        rng = random.Random(42)
+        now = timezone.now()
+        start = time.perf_counter()
+
+        teacher = User.objects.create(username='bench-summary-teacher')
+        subjects = Subject.objects.bulk_create([Subject(name=f"Bench subject {i}") for i in range(6)])
+        self.bulk_create(User, [
+            User(username=f"bench-summary-{i}", email=f"bench-summary-{i}@example.com") for i in range(count)
+        ])
+        students = User.objects.filter(username__startswith='bench-summary-', email__endswith='@example.com')
+        student_ids = list(students.values_list('id', flat=True))
+        levels = {student_id: rng.choice(CLASS_LEVELS) for student_id in student_ids}
+        self.bulk_create(UserProfile, [
+            UserProfile(user_id=student_id, role='student', class_level=levels[student_id])
+            for student_id in student_ids
+        ])
+
+        assignments = []
+        for level in CLASS_LEVELS:
+            for offset in (-20, -10, -3, 2, 5):
+                assignments.append(Assignment(
+                    title=f"Class {level} assignment {offset:+d}", description='', instructions='',
+                    subject=rng.choice(subjects), class_level=level, created_by=teacher,
+                    due_date=now + timedelta(days=offset)
+                ))
+        Assignment.objects.bulk_create(assignments)
+        assignments_by_level = {}
+        for assignment in Assignment.objects.filter(created_by=teacher).order_by('due_date'):
+            assignments_by_level.setdefault(assignment.class_level, []).append(assignment)
+
+        # Older tutor sessions are created first and moved back three weeks, so
+        # some subjects show up as inactive
+        self.bulk_create(AITutorSession, [
+            AITutorSession(student_id=student_id, subject=rng.choice(subjects))
+            for student_id in student_ids for _ in range(2)
+        ])
+        AITutorSession.objects.filter(student_id__in=students).update(
+            started_at=now - timedelta(days=21), last_activity=now - timedelta(days=21)
+        )
+        self.bulk_create(AITutorSession, [
+            AITutorSession(student_id=student_id, subject=rng.choice(subjects))
+            for student_id in student_ids for _ in range(rng.randint(0, 6))
+        ])
+
+        self.bulk_create(AssignmentSubmission, [
+            AssignmentSubmission(
+                assignment=assignment, student_id=student_id, is_graded=True,
+                points_earned=rng.randint(40, 100)
+            )
+            for student_id in student_ids
+            for assignment in assignments_by_level[levels[student_id]][:3]
+            if rng.random() < 0.7
+        ])
+
+        conferences = VideoConference.objects.bulk_create([
+            VideoConference(
+                title=f"Class {level} review", subject=subjects[0], class_level=level, scheduled_by=teacher,
+                start_time=now - timedelta(days=2), end_time=now - timedelta(days=2, hours=-1)
+            )
+            for level in CLASS_LEVELS
+        ])
+        conference_ids = {
+            conference.class_level: conference.id
+            for conference in VideoConference.objects.filter(scheduled_by=teacher)
+        }
+        self.bulk_create(VideoConferenceParticipant, [
+            VideoConferenceParticipant(
+                conference_id=conference_ids[levels[student_id]], user_id=student_id,
+                attended=rng.random() < 0.6
+            )
+            for student_id in student_ids
+        ])
+
+        self.stdout.write(
+            f"Inserted {AITutorSession.objects.filter(student_id__in=students).count()} tutor sessions, "
+            f"{AssignmentSubmission.objects.filter(student_id__in=students).count()} submissions and "
+            f"{len(student_ids)} attendance rows for {len(conferences)} conferences "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        return students
+
+    def compare(self, students, sample, chunk_size):
+        sample_users = list(students.order_by('id')[:sample])
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for user in sample_users:
+                get_weekly_learning_summary(user)
+            elapsed = time.perf_counter() - start
+        total = students.count()
+        self.stdout.write(
+            f"  per student: {len(sample_users)} students in {elapsed:.2f}s, {len(queries)} queries "
+            f"(about {elapsed / max(len(sample_users), 1) * total:.0f}s for {total})"
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            summarised = 0
+            for chunk in iter_weekly_summaries(chunk_size, users=students):
+                summarised += len(chunk)
+            batch_elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"  batch:       {summarised} students in {batch_elapsed:.2f}s, {len(queries)} queries "
+            f"({summarised / batch_elapsed:.0f} students/s, chunks of {chunk_size})"
+        )
@@ -0,0 +1,52 @@
+import time
+import signal
+
+from django.core.management.base import BaseCommand
+
+from core.outbox_service import OUTBOX_BATCH_SIZE, dispatch_batch, pending_outbox_count
+
+
+class Command(BaseCommand):
+    help = 'Send emails from the email outbox; several dispatchers can run in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE,
+                            help='Emails claimed per transaction')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no emails are due instead of waiting for new ones')
+        parser.add_argument('--poll-interval', type=float, default=5,
+                            help='Seconds to wait when no emails are due')
+
+    def handle(self, *args, **options):
+        stopped = False
+
+        def stop(signum, frame):
+            nonlocal stopped
+            self.stdout.write("Stopping after the current batch...")
+            stopped = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f"Outbox dispatcher started ({pending_outbox_count()} pending)")
+        start = time.perf_counter()
+        totals = {'claimed': 0, 'sent': 0, 'failed': 0}
+        while not stopped:
+            result = dispatch_batch(options['batch_size'])
+            for key in totals:
+                totals[key] += result[key]
+
+            if result['claimed']:
+                self.stdout.write(
+                    f"{result['sent']}/{result['claimed']} sent, {result['failed']} given up "
+                    f"({totals['sent'] / (time.perf_counter() - start):.1f} emails/s overall)"
+                )
+            elif options['burst']:
+                break
+            else:
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Outbox dispatcher stopped: {totals['sent']} sent, {totals['failed']} given up "
+            f"of {totals['claimed']} claimed"
+        ))
@@ -0,0 +1,182 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import (
+    StudyMaterial, VideoConference, RecordedSession, Assignment, AssignmentSubmission,
+    AITutorSession, AITutorMessage, QuizAttempt,
+)
+
+# Index names in PostgreSQL ("Index Scan using x", "Bitmap Index Scan on x")
+# and SQLite ("SEARCH t USING INDEX x", "USING COVERING INDEX x") plans
+INDEX_PATTERN = re.compile(r'(?:Index (?:Only )?Scan (?:Backward )?using|Bitmap Index Scan on|USING (?:COVERING )?INDEX) (\w+)')
+SEQ_SCAN_PATTERN = re.compile(r'(?:Seq Scan on|\bSCAN) (\w+)(?!\w| USING)')
+SORT_PATTERN = re.compile(r'(?:->\s+Sort\b|^\s*Sort\b|USE TEMP B-TREE FOR ORDER BY)', re.MULTILINE)
+
+
+def dashboard_queries(user_id, class_level):
+    """
+    The dashboard and list queries to check, as built by the views
+
+    Args:
+        user_id (int): Student/teacher the per-user queries are for
+        class_level (str): Class level for the per-class queries
+
+    Returns:
+        list: (name, queryset, expected index name) tuples
+    """
+    now = timezone.now()
+    return [
+        ('student dashboard: upcoming assignments',
+         Assignment.objects.filter(class_level=class_level, due_date__gt=now).order_by('due_date')[:5],
+         'assignment_class_due_idx'),
+        ('student dashboard: recent materials',
+         StudyMaterial.objects.filter(class_level=class_level).order_by('-upload_date')[:5],
+         'material_class_recent_idx'),
+        ('student dashboard: submitted assignments',
+         AssignmentSubmission.objects.filter(student_id=user_id).order_by('-submitted_at')[:5],
+         'submission_student_recent_idx'),
+        ('student dashboard: upcoming classes',
+         VideoConference.objects.filter(class_level=class_level, start_time__gt=now).order_by('start_time')[:3],
+         'conference_class_start_idx'),
+        ('teacher dashboard: created assignments',
+         Assignment.objects.filter(created_by_id=user_id).order_by('-created_at')[:5],
+         'assignment_creator_recent_idx'),
+        ('teacher dashboard: uploaded materials',
+         StudyMaterial.objects.filter(uploaded_by_id=user_id).order_by('-upload_date')[:5],
+         'material_uploader_recent_idx'),
+        ('teacher dashboard: pending submissions',
+         AssignmentSubmission.objects.filter(
+             assignment__created_by_id=user_id, is_graded=False
+         ).select_related('assignment__subject', 'student').order_by('submitted_at')[:10],
+         'submission_ungraded_idx'),
+        ('teacher dashboard: upcoming classes',
+         VideoConference.objects.filter(scheduled_by_id=user_id, start_time__gt=now).order_by('start_time')[:3],
+         'conference_host_start_idx'),
+        ('materials list',
+         StudyMaterial.objects.filter(class_level=class_level).order_by('-upload_date')[:12],
+         'material_class_recent_idx'),
+        ('recordings list',
+         RecordedSession.objects.filter(class_level=class_level).order_by('-recorded_date')[:12],
+         'recording_class_recent_idx'),
+        ('quizzes list: completed attempts',
+         QuizAttempt.objects.filter(student_id=user_id, completed=True).order_by('-completed_at'),
+         'attempt_student_done_idx'),
+        ('quiz take: open attempt',
+         QuizAttempt.objects.filter(quiz_id=0, student_id=user_id, completed=False),
+         'attempt_open_idx'),
+        ('quiz expiry sweeper: expired attempts',
+         QuizAttempt.objects.filter(completed=False, deadline__lte=now).order_by('deadline')[:500],
+         'attempt_open_deadline_idx'),
+        ('AI tutor: active session',
+         AITutorSession.objects.filter(student_id=user_id, is_active=True).order_by('-last_activity')[:1],
+         'aisession_active_idx'),
+        ('AI tutor: past sessions',
+         AITutorSession.objects.filter(student_id=user_id).order_by('-started_at'),
+         'aisession_student_recent_idx'),
+        ('AI tutor: session messages',
+         AITutorMessage.objects.filter(session_id=0).order_by('timestamp'),
+         'aimessage_session_time_idx'),
+    ]
+
+
+def partial_index_is_complete(model, index_name):
+    """
+    Check whether a partial index currently holds every row of its table
+
+    Such an index is no more selective than a plain index on the same columns,
+    so the planner may pick either (SQLite does, even after ANALYZE).
+
+    Args:
+        model: Model the index is declared on
+        index_name (str): Index name from Meta.indexes
+
+    Returns:
+        bool: True if the index is partial and no row falls outside its condition
+    """
+    for index in model._meta.indexes:
+        if index.name == index_name and index.condition is not None:
+            return not model.objects.exclude(index.condition).exists()
+    return False
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN (ANALYZE on PostgreSQL) on the dashboard and list queries and '
+        'report which indexes they use. Exits with an error if a query does not use '
+        'the index it is expected to.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='User id for per-user queries (default: first user)')
+        parser.add_argument('--class-level', default='1', help='Class level for per-class queries')
+        parser.add_argument(
+            '--allow-seqscan', action='store_true',
+            help='Keep the planner free to choose sequential scans (PostgreSQL). By default they '
+                 'are disabled, so small development databases still show whether an index applies'
+        )
+        parser.add_argument(
+            '--update-statistics', action='store_true',
+            help='Run ANALYZE on the tables first; plans on tables without statistics may ignore partial indexes'
+        )
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan')
+
+    def handle(self, *args, **options):
+        user_id = options['user']
+        if user_id is None:
+            user_id = User.objects.order_by('pk').values_list('pk', flat=True).first() or 0
+
+        is_postgres = connection.vendor == 'postgresql'
+        self.stdout.write(f"{connection.vendor}: user {user_id}, class level {options['class_level']}")
+
+        queries = dashboard_queries(user_id, options['class_level'])
+        if options['update_statistics']:
+            tables = sorted({queryset.model._meta.db_table for _, queryset, _ in queries})
+            with connection.cursor() as cursor:
+                for table in tables:
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+
+        failures = []
+        skipped_count = 0
+        with transaction.atomic():
+            if is_postgres and not options['allow_seqscan']:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset, expected in queries:
+                plan = queryset.explain(analyze=True) if is_postgres else queryset.explain()
+                used = sorted(set(INDEX_PATTERN.findall(plan)))
+                seq_scans = sorted(set(SEQ_SCAN_PATTERN.findall(plan)))
+                sorted_in_memory = bool(SORT_PATTERN.search(plan))
+
+                ok = expected in used
+                skipped = not ok and partial_index_is_complete(queryset.model, expected)
+                if skipped:
+                    ok = True
+                    skipped_count += 1
+                elif not ok:
+                    failures.append(name)
+                status = 'SKIP' if skipped else 'OK  ' if ok else 'MISS'
+                line = f"{status} {name}: indexes {', '.join(used) or '-'}"
+                if skipped:
+                    line += f"; {expected} excludes no rows yet, so any index on the same columns is as good"
+                if seq_scans:
+                    line += f"; seq scan {', '.join(seq_scans)}"
+                if sorted_in_memory:
+                    line += '; sort'
+                self.stdout.write(self.style.SUCCESS(line) if ok else self.style.ERROR(line))
+
+                if options['verbose_plans'] or not ok:
+                    self.stdout.write(f"  expected {expected}")
+                    for plan_line in plan.splitlines():
+                        self.stdout.write(f"    {plan_line}")
+
+        if failures:
+            raise CommandError(f"{len(failures)} queries do not use their index: {', '.join(failures)}")
+        if skipped_count:
+            self.stdout.write(self.style.SUCCESS(f"All other queries use their indexes ({skipped_count} skipped)"))
+        else:
+            self.stdout.write(self.style.SUCCESS('All queries use their indexes'))
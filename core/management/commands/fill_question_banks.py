@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core.question_bank_service import banks_below_target, fill_bank, request_bank_fill
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate practice questions for every class subject and difficulty whose '
+        'question bank is below QUESTION_BANK_TARGET'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sync', action='store_true',
+            help='Generate in this process instead of queueing a job per bank'
+        )
+
+    def handle(self, *args, **options):
+        banks = banks_below_target()
+        if not banks:
+            self.stdout.write(self.style.SUCCESS('All question banks are full'))
+            return
+
+        queued = 0
+        for subject_id, class_level, difficulty in banks:
+            if options['sync']:
+                added = fill_bank(subject_id, class_level, difficulty)
+                self.stdout.write(f"Subject {subject_id}, class {class_level}, {difficulty}: added {added}")
+            elif request_bank_fill(subject_id, class_level, difficulty) is None:
+                self.stdout.write(f"Subject {subject_id}, class {class_level}, {difficulty}: fill already pending")
+            else:
+                queued += 1
+
+        if not options['sync']:
+            self.stdout.write(self.style.SUCCESS(f"Queued fills for {queued} of {len(banks)} question banks"))
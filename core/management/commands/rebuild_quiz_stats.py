@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.quiz_service import rebuild_quiz_stats
+
+
+class Command(BaseCommand):
+    help = 'Recalculate QuizStats from quiz attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int, help='Quizzes to rebuild (default: all)')
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_quiz_stats(options['quiz_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {rebuilt} quizzes"))
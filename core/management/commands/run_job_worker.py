@@ -0,0 +1,36 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from core.job_queue import Worker, get_broker
+
+
+class Command(BaseCommand):
+    help = 'Run a background job worker (Zoom, email, recordings and AI question generation)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the queue is empty instead of waiting for new jobs')
+        parser.add_argument('--recover', action='store_true',
+                            help='Requeue jobs held by workers whose heartbeat has expired')
+        parser.add_argument('--poll-timeout', type=int, default=5,
+                            help='Seconds to block waiting for a job before checking for due retries')
+
+    def handle(self, *args, **options):
+        broker = get_broker()
+        worker = Worker(broker)
+
+        if options['recover']:
+            recovered = broker.recover()
+            self.stdout.write(f"Requeued {recovered} unfinished jobs")
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping after the current job...")
+            worker.stopped = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f"Job worker started ({type(broker).__name__}, {broker.pending_count()} pending)")
+        processed = worker.run(burst=options['burst'], poll_timeout=options['poll_timeout'])
+        self.stdout.write(self.style.SUCCESS(f"Job worker stopped after {processed} jobs"))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.weekly_summary_service import WEEKLY_SUMMARY_CHUNK_SIZE, send_weekly_summaries
+
+
+class Command(BaseCommand):
+    help = 'Queue the weekly learning summary email of every student who has not opted out'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=WEEKLY_SUMMARY_CHUNK_SIZE,
+            help='Students summarised per batch of queries'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Compute the summaries without queueing any email'
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+
+        def progress(processed, total, queued):
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{processed}/{total} students ({processed * 100 // max(total, 1)}%), "
+                f"{queued} queued, {processed / elapsed:.0f} students/s"
+            )
+
+        result = send_weekly_summaries(options['chunk_size'], dry_run=options['dry_run'], progress=progress)
+        action = 'Summarised' if options['dry_run'] else f"Queued {result['queued']} emails for"
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {result['students']} students in {time.perf_counter() - start:.1f}s"
+        ))
@@ -0,0 +1,43 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from core.profile_service import load_user_context, aload_user_context
+
+
+class UserProfileMiddleware:
+    """
+    Load the signed-in user's UserProfile and UserSettings once per request
+
+    Sets request.profile and request.user_settings (None for anonymous users or
+    users without one) and primes request.user.profile / request.user.settings,
+    so views, context processors and templates share a single lookup. Entries
+    are cached per user and invalidated when the profile or settings are saved.
+    Must come after AuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        request.profile = None
+        request.user_settings = None
+        if request.user.is_authenticated:
+            request.profile, request.user_settings = load_user_context(request.user)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.profile = None
+        request.user_settings = None
+
+        user = await request.auser()
+        # Share the resolved user with sync code instead of loading it again
+        request.user = user
+        if user.is_authenticated:
+            request.profile, request.user_settings = await aload_user_context(user)
+        return await self.get_response(request)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_videoconference_auto_record_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aitutorsession',
+            name='context_summary',
+            field=models.TextField(blank=True, help_text='Summary of older messages used as AI context'),
+        ),
+        migrations.AddField(
+            model_name='aitutorsession',
+            name='summary_last_message_id',
+            field=models.BigIntegerField(blank=True, help_text='Last message folded into the context summary', null=True),
+        ),
+    ]
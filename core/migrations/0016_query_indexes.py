@@ -0,0 +1,71 @@
+# Generated by Django 5.2 on 2026-10-18 10:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_search_vectors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aitutormessage',
+            index=models.Index(fields=['session', 'timestamp'], name='aimessage_session_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aitutorsession',
+            index=models.Index(fields=['student', '-started_at'], name='aisession_student_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aitutorsession',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['student', '-last_activity'], name='aisession_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['class_level', 'due_date'], name='assignment_class_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['created_by', '-created_at'], name='assignment_creator_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentsubmission',
+            index=models.Index(fields=['student', '-submitted_at'], name='submission_student_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentsubmission',
+            index=models.Index(condition=models.Q(('is_graded', False)), fields=['assignment', 'submitted_at'], name='submission_ungraded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(condition=models.Q(('completed', True)), fields=['student', '-completed_at'], name='attempt_student_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['quiz', 'student'], name='attempt_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recordedsession',
+            index=models.Index(fields=['class_level', '-recorded_date'], name='recording_class_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studymaterial',
+            index=models.Index(fields=['class_level', '-upload_date'], name='material_class_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studymaterial',
+            index=models.Index(fields=['uploaded_by', '-upload_date'], name='material_uploader_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videoconference',
+            index=models.Index(fields=['class_level', 'start_time'], name='conference_class_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videoconference',
+            index=models.Index(fields=['scheduled_by', 'start_time'], name='conference_host_start_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 10:47
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_responses(apps, schema_editor):
+    """Keep the latest response where a question was answered more than once in an attempt"""
+    QuizResponse = apps.get_model('core', 'QuizResponse')
+    duplicates = (
+        QuizResponse.objects.values('attempt_id', 'question_id')
+        .annotate(count=Count('id'), latest=Max('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates.iterator():
+        QuizResponse.objects.filter(
+            attempt_id=row['attempt_id'], question_id=row['question_id']
+        ).exclude(id=row['latest']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_responses, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='quizresponse',
+            unique_together={('attempt', 'question')},
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-18 10:49
+
+import core.models
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_quiz_stats(apps, schema_editor):
+    """Build stats for existing quizzes; later changes are kept up to date by core.quiz_service"""
+    Quiz = apps.get_model('core', 'Quiz')
+    QuizAttempt = apps.get_model('core', 'QuizAttempt')
+    QuizStats = apps.get_model('core', 'QuizStats')
+
+    passing_scores = dict(Quiz.objects.values_list('id', 'passing_score'))
+    stats = {
+        quiz_id: QuizStats(quiz_id=quiz_id, score_histogram=[0] * 101)
+        for quiz_id in passing_scores
+    }
+    for row in QuizAttempt.objects.values('quiz_id').annotate(count=Count('id')).order_by():
+        stats[row['quiz_id']].attempts = row['count']
+
+    completed = QuizAttempt.objects.filter(completed=True, score__isnull=False)
+    for row in completed.values('quiz_id', 'score').annotate(count=Count('id')).order_by():
+        quiz_stats = stats[row['quiz_id']]
+        quiz_stats.completions += row['count']
+        quiz_stats.score_sum += row['score'] * row['count']
+        quiz_stats.score_histogram[min(max(int(row['score']), 0), 100)] += row['count']
+        if row['score'] >= passing_scores[row['quiz_id']]:
+            quiz_stats.pass_count += row['count']
+
+    QuizStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_quizresponse_unique_answer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizStats',
+            fields=[
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.quiz')),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Attempts started')),
+                ('completions', models.PositiveIntegerField(default=0, help_text='Attempts completed')),
+                ('score_sum', models.FloatField(default=0)),
+                ('pass_count', models.PositiveIntegerField(default=0, help_text='Completed attempts at or above the passing score')),
+                ('score_histogram', models.JSONField(default=core.models.empty_score_histogram)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Quiz stats',
+            },
+        ),
+        migrations.RunPython(backfill_quiz_stats, migrations.RunPython.noop),
+    ]
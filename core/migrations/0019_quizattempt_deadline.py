@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-18 10:51
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_open_attempt_deadlines(apps, schema_editor):
+    """Give open attempts of timed quizzes a deadline so the sweeper can close them"""
+    QuizAttempt = apps.get_model('core', 'QuizAttempt')
+    attempts = QuizAttempt.objects.filter(
+        completed=False, quiz__time_limit__gt=0
+    ).select_related('quiz').only('started_at', 'quiz__time_limit')
+
+    batch = []
+    for attempt in attempts.iterator(chunk_size=1000):
+        attempt.deadline = attempt.started_at + timedelta(minutes=attempt.quiz.time_limit)
+        batch.append(attempt)
+        if len(batch) == 1000:
+            QuizAttempt.objects.bulk_update(batch, ['deadline'])
+            batch = []
+    QuizAttempt.objects.bulk_update(batch, ['deadline'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_quizstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='deadline',
+            field=models.DateTimeField(blank=True, help_text='When a timed attempt is submitted automatically', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(condition=models.Q(('completed', False), ('deadline__isnull', False)), fields=['deadline'], name='attempt_open_deadline_idx'),
+        ),
+        migrations.RunPython(set_open_attempt_deadlines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_quizattempt_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizstats',
+            name='item_analysis',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizresponse',
+            name='saved_at',
+            field=models.DateTimeField(blank=True, help_text="Last save; answers saved after a timed attempt's deadline are not scored", null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_quizresponse_saved_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoconference',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented by every edit; keys the update notifications'),
+        ),
+    ]
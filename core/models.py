@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
 from django.urls import reverse
 import json
@@ -100,6 +101,8 @@ class StudyMaterial(models.Model):
     
     title = models.CharField(max_length=200)
     description = models.TextField()
+    # Full-text index of title and description, maintained by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='materials')
     class_level = models.CharField(max_length=10, choices=UserProfile.CLASS_CHOICES)
     file_type = models.CharField(max_length=10, choices=FILE_TYPE_CHOICES)
@@ -113,6 +116,13 @@ class StudyMaterial(models.Model):
     views = models.PositiveIntegerField(default=0)
     downloads = models.PositiveIntegerField(default=0)
     
+    class Meta:
+        indexes = [
+            # Student dashboard and materials list: newest materials for a class
+            models.Index(fields=['class_level', '-upload_date'], name='material_class_recent_idx'),
+            models.Index(fields=['uploaded_by', '-upload_date'], name='material_uploader_recent_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.title} ({self.get_file_type_display()})"
     
@@ -170,6 +180,7 @@ class VideoConference(models.Model):
     end_time = models.DateTimeField()
     is_recurring = models.BooleanField(default=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
+    revision = models.PositiveIntegerField(default=0, help_text="Incremented by every edit; keys the update notifications")
     
     # Add specific participants beyond the class level
     participants = models.ManyToManyField(User, through='VideoConferenceParticipant', 
@@ -189,11 +200,26 @@ class VideoConference(models.Model):
     recording_processed_at = models.DateTimeField(blank=True, null=True)
     auto_record = models.BooleanField(default=False, help_text="Automatically record this meeting")
     
+    class Meta:
+        indexes = [
+            # Upcoming/past classes for a class level or a teacher
+            models.Index(fields=['class_level', 'start_time'], name='conference_class_start_idx'),
+            models.Index(fields=['scheduled_by', 'start_time'], name='conference_host_start_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.title} - {self.start_time.strftime('%Y-%m-%d %H:%M')}"
     
     def get_absolute_url(self):
-        return reverse('video_detail', args=[self.id])
+        return reverse('video_conference_detail', args=[self.id])
+    
+    def get_recording_url(self):
+        """Generate a URL for viewing the recording; recordings in S3 are private"""
+        from core.s3_service import create_presigned_url
+        
+        if self.recording_s3_key:
+            return create_presigned_url(self.recording_s3_key)
+        return self.recording_url
     
     @property
     def is_active(self):
@@ -549,6 +575,8 @@ class RecordedSession(models.Model):
     """Recorded video sessions for later viewing"""
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
+    # Full-text index of title and description, maintained by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='recordings')
     class_level = models.CharField(max_length=10, choices=UserProfile.CLASS_CHOICES)
     recording_url = models.URLField()
@@ -569,6 +597,11 @@ class RecordedSession(models.Model):
     is_processed = models.BooleanField(default=True, help_text="Indicates if the video has been processed and is ready to view")
     file_size_mb = models.FloatField(null=True, blank=True, help_text="File size in megabytes")
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['class_level', '-recorded_date'], name='recording_class_recent_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.title} - {self.recorded_date}"
     
@@ -597,6 +630,8 @@ class Assignment(models.Model):
     
     title = models.CharField(max_length=200)
     description = models.TextField()
+    # Full-text index of title and description, maintained by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='assignments')
     class_level = models.CharField(max_length=10, choices=UserProfile.CLASS_CHOICES)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_assignments')
@@ -607,6 +642,13 @@ class Assignment(models.Model):
     due_date = models.DateTimeField()
     total_points = models.PositiveIntegerField(default=100)
     
+    class Meta:
+        indexes = [
+            # Upcoming assignments for a class, soonest first
+            models.Index(fields=['class_level', 'due_date'], name='assignment_class_due_idx'),
+            models.Index(fields=['created_by', '-created_at'], name='assignment_creator_recent_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.title} - Due: {self.due_date.strftime('%Y-%m-%d')}"
     
@@ -631,6 +673,17 @@ class AssignmentSubmission(models.Model):
     graded_at = models.DateTimeField(null=True, blank=True)
     graded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='graded_submissions')
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', '-submitted_at'], name='submission_student_recent_idx'),
+            # Teacher grading queue; graded submissions are never read through it
+            models.Index(
+                fields=['assignment', 'submitted_at'],
+                condition=models.Q(is_graded=False),
+                name='submission_ungraded_idx'
+            ),
+        ]
+    
     def __str__(self):
         return f"Submission by {self.student.username} for {self.assignment.title}"
     
@@ -652,6 +705,21 @@ class AITutorSession(models.Model):
     is_active = models.BooleanField(default=True)
     is_pinned = models.BooleanField(default=False, help_text="Pin important sessions")
     
+    # Rolling summary of messages that have scrolled out of the AI context window
+    context_summary = models.TextField(blank=True, help_text="Summary of older messages used as AI context")
+    summary_last_message_id = models.BigIntegerField(null=True, blank=True, help_text="Last message folded into the context summary")
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', '-started_at'], name='aisession_student_recent_idx'),
+            # A student has at most a few active sessions among many finished ones
+            models.Index(
+                fields=['student', '-last_activity'],
+                condition=models.Q(is_active=True),
+                name='aisession_active_idx'
+            ),
+        ]
+    
     def __str__(self):
         if self.title:
             return f"{self.title} - {self.student.username}"
@@ -696,12 +764,18 @@ class AITutorMessage(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Conversation history and context window, oldest first
+            models.Index(fields=['session', 'timestamp'], name='aimessage_session_time_idx'),
+        ]
 
 
 class Quiz(models.Model):
     """Quiz or assessment for students"""
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
+    # Full-text index of title and description, maintained by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='quizzes')
     class_level = models.CharField(max_length=10, choices=UserProfile.CLASS_CHOICES)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_quizzes')
@@ -717,20 +791,73 @@ class Quiz(models.Model):
     def get_absolute_url(self):
         return reverse('quiz_detail', args=[self.id])
     
+    def get_stats(self):
+        """Attempt statistics, or empty ones if nobody has started the quiz yet"""
+        try:
+            return self.stats
+        except QuizStats.DoesNotExist:
+            return QuizStats(quiz=self)
+    
     @property
     def num_questions(self):
-        return self.questions.count()
+        from core.quiz_service import get_answer_key
+        return len(get_answer_key(self.id).question_ids)
     
     @property
     def avg_score(self):
-        attempts = self.attempts.filter(completed=True)
-        if not attempts.exists():
-            return 0
-        return attempts.aggregate(models.Avg('score'))['score__avg']
+        return self.get_stats().avg_score
     
     @property
     def completion_count(self):
-        return self.attempts.filter(completed=True).count()
+        return self.get_stats().completions
+
+
+def empty_score_histogram():
+    return [0] * 101
+
+
+class QuizStats(models.Model):
+    """
+    Running attempt statistics for a quiz
+    
+    Updated when an attempt starts or completes (see core.quiz_service) and
+    rebuilt from QuizAttempt by the rebuild_quiz_stats command.
+    """
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.PositiveIntegerField(default=0, help_text="Attempts started")
+    completions = models.PositiveIntegerField(default=0, help_text="Attempts completed")
+    score_sum = models.FloatField(default=0)
+    pass_count = models.PositiveIntegerField(default=0, help_text="Completed attempts at or above the passing score")
+    # Completed attempts per whole-number score, index 0-100
+    score_histogram = models.JSONField(default=empty_score_histogram)
+    # Per-question statistics from core.item_analysis_service, recomputed when stale
+    item_analysis = models.JSONField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = "Quiz stats"
+    
+    def __str__(self):
+        return f"Stats for {self.quiz_id}: {self.completions} completions"
+    
+    @property
+    def avg_score(self):
+        if not self.completions:
+            return 0
+        return self.score_sum / self.completions
+    
+    @property
+    def pass_rate(self):
+        if not self.completions:
+            return 0
+        return self.pass_count * 100 / self.completions
+    
+    def score_bands(self, width=10):
+        """Completed attempts per score band, e.g. 0-9, 10-19, ..., 90-100"""
+        histogram = self.score_histogram or empty_score_histogram()
+        bands = [sum(histogram[start:start + width]) for start in range(0, 100, width)]
+        bands[-1] += histogram[100]
+        return bands
 
 
 class QuizQuestion(models.Model):
@@ -760,10 +887,33 @@ class QuizAttempt(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempts')
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
     started_at = models.DateTimeField()
+    deadline = models.DateTimeField(null=True, blank=True, help_text="When a timed attempt is submitted automatically")
     completed_at = models.DateTimeField(null=True, blank=True)
     completed = models.BooleanField(default=False)
     score = models.FloatField(null=True, blank=True)
     
+    class Meta:
+        indexes = [
+            # Completed attempts for a student, latest first
+            models.Index(
+                fields=['student', '-completed_at'],
+                condition=models.Q(completed=True),
+                name='attempt_student_done_idx'
+            ),
+            # The open attempt quiz_take resumes
+            models.Index(
+                fields=['quiz', 'student'],
+                condition=models.Q(completed=False),
+                name='attempt_open_idx'
+            ),
+            # Open timed attempts by deadline, for the expiry sweeper
+            models.Index(
+                fields=['deadline'],
+                condition=models.Q(completed=False, deadline__isnull=False),
+                name='attempt_open_deadline_idx'
+            ),
+        ]
+    
     def __str__(self):
         status = "Completed" if self.completed else "In Progress"
         return f"{self.student.username}'s attempt of {self.quiz.title} ({status})"
@@ -787,6 +937,11 @@ class QuizResponse(models.Model):
     attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='responses')
     question = models.ForeignKey(QuizQuestion, on_delete=models.CASCADE)
     selected_option = models.CharField(max_length=1)
+    saved_at = models.DateTimeField(null=True, blank=True, help_text="Last save; answers saved after a timed attempt's deadline are not scored")
+    
+    class Meta:
+        # One answer per question per attempt; saves upsert on this pair
+        unique_together = ['attempt', 'question']
     
     def __str__(self):
         return f"Response to Q{self.question.question_number} by {self.attempt.student.username}"
@@ -796,6 +951,42 @@ class QuizResponse(models.Model):
         return self.selected_option == self.question.correct_option
 
 
+class PracticeQuestion(models.Model):
+    """
+    Pre-generated AI practice question for a subject, class level and difficulty
+    
+    Filled in bulk by background jobs (see core.question_bank_service) so
+    practice questions can be served without a live AI call.
+    """
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='practice_questions')
+    class_level = models.CharField(max_length=10, choices=UserProfile.CLASS_CHOICES)
+    difficulty = models.CharField(max_length=10, choices=Assignment.DIFFICULTY_CHOICES, default='medium')
+    question = models.TextField()
+    answer = models.TextField(blank=True)
+    # Hash of the normalized question text, so a bank never holds the same question twice
+    fingerprint = models.CharField(max_length=40)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['subject', 'class_level', 'difficulty', 'fingerprint']
+    
+    def __str__(self):
+        return f"{self.subject.name} ({self.class_level}, {self.difficulty}): {self.question[:50]}"
+
+
+class PracticeQuestionServed(models.Model):
+    """A bank question shown to a student, so they are not shown it again"""
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='practice_questions_served')
+    question = models.ForeignKey(PracticeQuestion, on_delete=models.CASCADE, related_name='served')
+    served_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['student', 'question']
+    
+    def __str__(self):
+        return f"{self.question_id} served to {self.student.username}"
+
+
 class UserSettings(models.Model):
     """User settings and preferences"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='settings')
@@ -921,3 +1112,40 @@ class VideoConferenceParticipant(models.Model):
         
     def __str__(self):
         return f"{self.user.get_full_name() or self.user.username} - {self.conference.title}"
+
+
+class EmailOutbox(models.Model):
+    """
+    Email waiting to be sent, written in the same transaction as the change
+    that triggers it and sent by the outbox dispatcher
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    
+    idempotency_key = models.CharField(max_length=255, unique=True, help_text="Identifies the email so it is only queued once")
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    html_content = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    provider = models.CharField(max_length=20, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            # Dispatcher claims due pending emails; sent and failed ones are never scanned
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status='pending'),
+                name='outbox_pending_due_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.to_email} - {self.subject} ({self.status})"
@@ -0,0 +1,169 @@
+import os
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import EmailOutbox
+from core.job_queue import retry_delay
+from core.bulk_email_service import OutgoingEmail, send_bulk_email
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Emails claimed per dispatcher transaction; their rows stay locked while they are sent
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '50'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+# Seconds between outbox drains by the job worker's periodic task
+OUTBOX_DISPATCH_INTERVAL = float(os.environ.get('OUTBOX_DISPATCH_INTERVAL', '10'))
+
+
+def outbox_key(key_prefix, to_email):
+    """
+    Idempotency key of an outbox email
+
+    A SHA-256 of "<key_prefix>:<to_email>", so it fits the column however
+    long the prefix and address are.
+    """
+    return hashlib.sha256(f"{key_prefix}:{to_email.lower()}".encode()).hexdigest()
+
+
+def queue_emails(key_prefix, emails):
+    """
+    Add emails to the outbox
+
+    Call inside the transaction that makes the change the emails are about,
+    so they are queued if and only if it commits. An email whose idempotency
+    key (see outbox_key) is already in the outbox is skipped, so retrying the
+    change never sends an email twice.
+
+    Args:
+        key_prefix (str): Identifies what the emails are about, e.g. "conference-invite:12"
+        emails (list): OutgoingEmail tuples
+
+    Returns:
+        int: Number of emails newly added to the outbox
+    """
+    rows = {}
+    for email in emails:
+        if email.to_email:
+            key = outbox_key(key_prefix, email.to_email)
+            rows[key] = EmailOutbox(
+                idempotency_key=key,
+                to_email=email.to_email,
+                subject=email.subject[:255],
+                html_content=email.html_content,
+            )
+
+    # bulk_create does not report which rows ignore_conflicts skipped, so
+    # leave out the keys already queued and count what is left
+    for key in EmailOutbox.objects.filter(idempotency_key__in=list(rows)).values_list('idempotency_key', flat=True):
+        del rows[key]
+
+    if rows:
+        EmailOutbox.objects.bulk_create(rows.values(), ignore_conflicts=True)
+        request_dispatch()
+    return len(rows)
+
+
+def request_dispatch():
+    """Queue an outbox drain for when the current transaction commits"""
+    from core.job_queue import enqueue
+    from core.jobs import dispatch_email_outbox
+
+    def queue_drain():
+        try:
+            enqueue(dispatch_email_outbox)
+        except Exception as e:
+            # The periodic drain still picks the emails up
+            logger.error(f"Could not queue outbox dispatch: {str(e)}")
+
+    transaction.on_commit(queue_drain)
+
+
+def dispatch_batch(batch_size=OUTBOX_BATCH_SIZE, connection=None):
+    """
+    Send one batch of due outbox emails
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+    dispatchers can drain the outbox in parallel without sending an email
+    twice. Failed emails are retried with the job queue's backoff until
+    OUTBOX_MAX_ATTEMPTS.
+
+    Args:
+        batch_size (int): Emails to claim
+        connection (optional): Email backend to send through, see send_bulk_email
+
+    Returns:
+        dict: Number of emails claimed, sent and given up on
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if not rows:
+            return {'claimed': 0, 'sent': 0, 'failed': 0}
+
+        outcomes = send_bulk_email(
+            [OutgoingEmail(row.to_email, row.subject, row.html_content) for row in rows],
+            connection=connection
+        )
+
+        sent = failed = 0
+        sent_at = timezone.now()
+        for row, outcome in zip(rows, outcomes):
+            row.attempts += 1
+            row.provider = outcome.provider
+            if outcome.sent:
+                row.status = 'sent'
+                row.sent_at = sent_at
+                row.last_error = ''
+                sent += 1
+            else:
+                row.last_error = outcome.error or ''
+                if row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    row.status = 'failed'
+                    failed += 1
+                else:
+                    row.next_attempt_at = sent_at + timedelta(seconds=retry_delay(row.attempts))
+        EmailOutbox.objects.bulk_update(
+            rows, ['status', 'attempts', 'provider', 'sent_at', 'last_error', 'next_attempt_at']
+        )
+
+    return {'claimed': len(rows), 'sent': sent, 'failed': failed}
+
+
+def dispatch_outbox(batch_size=OUTBOX_BATCH_SIZE, max_batches=None, connection=None):
+    """
+    Send due outbox emails until none are left
+
+    Args:
+        batch_size (int): Emails per batch
+        max_batches (int, optional): Stop after this many batches
+        connection (optional): Email backend to send through, see send_bulk_email
+
+    Returns:
+        dict: Totals of dispatch_batch
+    """
+    totals = {'claimed': 0, 'sent': 0, 'failed': 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        result = dispatch_batch(batch_size, connection)
+        if not result['claimed']:
+            break
+        for key in totals:
+            totals[key] += result[key]
+        batches += 1
+    if totals['claimed']:
+        logger.info(f"Outbox: {totals['sent']} sent, {totals['failed']} given up of {totals['claimed']} claimed")
+    return totals
+
+
+def pending_outbox_count():
+    """Number of emails waiting in the outbox, including scheduled retries"""
+    return EmailOutbox.objects.filter(status='pending').count()
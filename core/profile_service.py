@@ -0,0 +1,193 @@
+import os
+import logging
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import Http404
+
+from core.models import UserProfile, UserSettings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# How long a user's profile and settings stay cached (seconds). Entries are
+# also dropped whenever the profile or settings are saved or deleted.
+USER_PROFILE_CACHE_TTL = int(os.environ.get('USER_PROFILE_CACHE_TTL', '300'))
+
+DEFAULT_PROFILE = {
+    'role': 'student',
+    'class_level': '1',
+}
+
+
+def profile_cache_key(user_id):
+    """Cache key for a user's profile and settings"""
+    return f"user_profile:{user_id}"
+
+
+def fetch_user_context(user_id):
+    """
+    Load a user's profile and settings in a single query
+
+    Returns:
+        tuple: (UserProfile or None, UserSettings or None)
+    """
+    try:
+        user = User.objects.select_related('profile', 'settings').get(pk=user_id)
+    except User.DoesNotExist:
+        return None, None
+    return related_or_none(user, 'profile'), related_or_none(user, 'settings')
+
+
+def related_or_none(user, name):
+    """
+    Get a reverse one-to-one relation that may not exist
+
+    The back-reference to the user is dropped so the cached entry does not
+    carry a copy of the User row; attach_user_context restores it.
+    """
+    try:
+        related = getattr(user, name)
+    except (UserProfile.DoesNotExist, UserSettings.DoesNotExist):
+        return None
+    related._state.fields_cache.pop('user', None)
+    return related
+
+
+def attach_user_context(user, profile, settings):
+    """
+    Prime the user's related-object cache so user.profile and user.settings
+    do not query again
+    """
+    User.profile.related.set_cached_value(user, profile)
+    User.settings.related.set_cached_value(user, settings)
+    for related in (profile, settings):
+        if related is not None:
+            type(related).user.field.set_cached_value(related, user)
+
+
+def load_user_context(user):
+    """
+    Get a user's profile and settings from the cache, or the database on a miss
+
+    Args:
+        user (User): An authenticated user
+
+    Returns:
+        tuple: (UserProfile or None, UserSettings or None)
+    """
+    key = profile_cache_key(user.pk)
+    try:
+        cached = cache.get(key)
+    except Exception as e:
+        logger.error(f"Profile cache read failed for user {user.pk}: {str(e)}")
+        cached = None
+
+    if cached is None:
+        cached = fetch_user_context(user.pk)
+        try:
+            cache.set(key, cached, USER_PROFILE_CACHE_TTL)
+        except Exception as e:
+            logger.error(f"Profile cache write failed for user {user.pk}: {str(e)}")
+
+    profile, settings = cached
+    attach_user_context(user, profile, settings)
+    return profile, settings
+
+
+async def aload_user_context(user):
+    """Async version of load_user_context"""
+    key = profile_cache_key(user.pk)
+    try:
+        cached = await cache.aget(key)
+    except Exception as e:
+        logger.error(f"Profile cache read failed for user {user.pk}: {str(e)}")
+        cached = None
+
+    if cached is None:
+        try:
+            loaded = await User.objects.select_related('profile', 'settings').aget(pk=user.pk)
+            cached = (related_or_none(loaded, 'profile'), related_or_none(loaded, 'settings'))
+        except User.DoesNotExist:
+            cached = (None, None)
+        try:
+            await cache.aset(key, cached, USER_PROFILE_CACHE_TTL)
+        except Exception as e:
+            logger.error(f"Profile cache write failed for user {user.pk}: {str(e)}")
+
+    profile, settings = cached
+    attach_user_context(user, profile, settings)
+    return profile, settings
+
+
+def invalidate_user_context(user_id):
+    """Drop a user's cached profile and settings"""
+    try:
+        cache.delete(profile_cache_key(user_id))
+    except Exception as e:
+        logger.error(f"Profile cache delete failed for user {user_id}: {str(e)}")
+
+
+def get_or_create_profile(request):
+    """
+    Get the current user's profile, creating a default student profile if needed
+
+    Uses the profile loaded by UserProfileMiddleware, so it only queries when
+    the profile has to be created.
+
+    Args:
+        request: The HTTP request of an authenticated user
+
+    Returns:
+        tuple: (profile: UserProfile, created: bool)
+    """
+    profile = getattr(request, 'profile', None)
+    if profile is not None:
+        return profile, False
+
+    profile, created = UserProfile.objects.get_or_create(
+        user=request.user,
+        defaults=DEFAULT_PROFILE
+    )
+    request.profile = profile
+    User.profile.related.set_cached_value(request.user, profile)
+    return profile, created
+
+
+def get_profile_or_404(request):
+    """
+    Get the current user's profile loaded by UserProfileMiddleware
+
+    Args:
+        request: The HTTP request
+
+    Returns:
+        UserProfile: The profile
+
+    Raises:
+        Http404: If the user has no profile
+    """
+    profile = getattr(request, 'profile', None)
+    if profile is None:
+        raise Http404("No UserProfile matches the given query.")
+    return profile
+
+
+def get_or_create_user_settings(request):
+    """
+    Get the current user's settings, creating the defaults if needed
+
+    Args:
+        request: The HTTP request of an authenticated user
+
+    Returns:
+        tuple: (settings: UserSettings, created: bool)
+    """
+    settings = getattr(request, 'user_settings', None)
+    if settings is not None:
+        return settings, False
+
+    settings, created = UserSettings.objects.get_or_create(user=request.user)
+    request.user_settings = settings
+    User.settings.related.set_cached_value(request.user, settings)
+    return settings, created
@@ -0,0 +1,235 @@
+import os
+import random
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from core.models import ClassSubject, PracticeQuestion, PracticeQuestionServed
+from core.ai_service import (
+    AIResponseCache, QuestionDeduplicator, generate_practice_questions, get_class_level_display,
+    QUIZ_QUESTION_WORKERS,
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Questions kept per (subject, class level, difficulty). Once a student has fewer
+# than QUESTION_BANK_LOW_WATER unseen questions left, a job generates at least
+# QUESTION_BANK_TOP_UP more, up to QUESTION_BANK_MAX.
+QUESTION_BANK_TARGET = int(os.environ.get('QUESTION_BANK_TARGET', '60'))
+QUESTION_BANK_LOW_WATER = int(os.environ.get('QUESTION_BANK_LOW_WATER', '10'))
+QUESTION_BANK_TOP_UP = int(os.environ.get('QUESTION_BANK_TOP_UP', '20'))
+QUESTION_BANK_MAX = int(os.environ.get('QUESTION_BANK_MAX', '500'))
+QUESTION_BANK_BATCH_SIZE = 10
+
+# At most one fill job is queued per bank. The lock expires in case a worker dies,
+# and is kept until then after a fill that added nothing
+QUESTION_BANK_FILL_LOCK_TTL = 15 * 60
+
+QUESTION_BANK_DIFFICULTIES = ('easy', 'medium', 'hard')
+
+AI_ERROR_PREFIX = "An error occurred"
+
+
+def question_fingerprint(text):
+    """Hash of a question's normalized text, for PracticeQuestion.fingerprint"""
+    return hashlib.sha1(AIResponseCache.normalize(text).encode()).hexdigest()
+
+
+def fill_lock_key(subject_id, class_level, difficulty):
+    """Cache key marking a bank as being filled"""
+    return f"question_bank_fill:{subject_id}:{class_level}:{difficulty}"
+
+
+def find_bank_subject(class_level, topic):
+    """
+    Get the subject of a class level whose name is the requested topic
+
+    Args:
+        class_level (str): The user's class level
+        topic (str): Topic entered by the user
+
+    Returns:
+        Subject: The matching subject, or None if the topic is not a class subject
+    """
+    if not class_level or not topic:
+        return None
+    assignment = ClassSubject.objects.filter(
+        class_level=class_level, subject__name__iexact=topic.strip()
+    ).select_related('subject').first()
+    return assignment.subject if assignment else None
+
+
+def request_bank_fill(subject_id, class_level, difficulty):
+    """
+    Queue a job to top up a bank, unless one is already queued
+
+    Returns:
+        str: The job ID, or None if a fill is already pending
+    """
+    from core.job_queue import enqueue
+    from core.jobs import fill_question_bank
+
+    try:
+        if not cache.add(fill_lock_key(subject_id, class_level, difficulty), 1, QUESTION_BANK_FILL_LOCK_TTL):
+            return None
+    except Exception as e:
+        logger.error(f"Question bank fill lock unavailable: {str(e)}")
+        return None
+
+    try:
+        return enqueue(fill_question_bank, subject_id, class_level, difficulty)
+    except Exception as e:
+        logger.error(f"Could not queue question bank fill: {str(e)}")
+        release_fill_lock(subject_id, class_level, difficulty)
+        return None
+
+
+def release_fill_lock(subject_id, class_level, difficulty):
+    """Allow another fill of a bank to be queued"""
+    try:
+        cache.delete(fill_lock_key(subject_id, class_level, difficulty))
+    except Exception as e:
+        logger.error(f"Could not release question bank fill lock: {str(e)}")
+
+
+def sample_practice_questions(user, subject_id, class_level, difficulty, count):
+    """
+    Pick practice questions from the bank that the user has not seen yet
+
+    Questions the user has seen are only repeated, oldest first, once every
+    question in the bank has been shown to them. A top-up job is queued
+    when the bank runs low for the user and is not yet at QUESTION_BANK_MAX.
+
+    Args:
+        user (User): The user asking, or None to skip per-user tracking
+        subject_id (int): ID of the subject
+        class_level (str): Class level
+        difficulty (str): Difficulty level (easy, medium, hard)
+        count (int): Number of questions wanted
+
+    Returns:
+        list: Question dicts (question, answer), or an empty list if the bank
+        holds fewer than `count` questions
+    """
+    bank = PracticeQuestion.objects.filter(subject_id=subject_id, class_level=class_level, difficulty=difficulty)
+    if user is not None:
+        unseen_ids = list(bank.exclude(served__student=user).values_list('id', flat=True))
+    else:
+        unseen_ids = list(bank.values_list('id', flat=True))
+
+    chosen = random.sample(unseen_ids, min(count, len(unseen_ids)))
+    repeated = []
+    if len(chosen) < count and user is not None:
+        repeated = list(
+            PracticeQuestionServed.objects.filter(student=user, question__in=bank)
+            .order_by('served_at')
+            .values_list('question_id', flat=True)[:count - len(chosen)]
+        )
+
+    # A full bank cannot grow, so only queue a fill while there is room
+    if len(unseen_ids) - len(chosen) < QUESTION_BANK_LOW_WATER and bank.count() < QUESTION_BANK_MAX:
+        request_bank_fill(subject_id, class_level, difficulty)
+
+    if len(chosen) + len(repeated) < count:
+        return []
+
+    rows = PracticeQuestion.objects.in_bulk(chosen + repeated)
+    if user is not None:
+        PracticeQuestionServed.objects.bulk_create(
+            [PracticeQuestionServed(student=user, question_id=question_id) for question_id in chosen],
+            ignore_conflicts=True
+        )
+        if repeated:
+            PracticeQuestionServed.objects.filter(student=user, question_id__in=repeated).update(
+                served_at=timezone.now()
+            )
+
+    return [
+        {'question': rows[question_id].question, 'answer': rows[question_id].answer}
+        for question_id in chosen + repeated if question_id in rows
+    ]
+
+
+def fill_bank(subject_id, class_level, difficulty):
+    """
+    Generate questions into a bank
+
+    Brings the bank up to QUESTION_BANK_TARGET, or adds QUESTION_BANK_TOP_UP
+    when it is already there (students have worked through it), never going
+    beyond QUESTION_BANK_MAX. Batches are generated in parallel and questions
+    already in the bank, or near-duplicates of them, are skipped.
+
+    Args:
+        subject_id (int): ID of the subject
+        class_level (str): Class level
+        difficulty (str): Difficulty level (easy, medium, hard)
+
+    Returns:
+        int: Number of questions added
+    """
+    assignment = ClassSubject.objects.select_related('subject').filter(
+        subject_id=subject_id, class_level=class_level
+    ).first()
+    if assignment is None:
+        return 0
+
+    bank = PracticeQuestion.objects.filter(subject_id=subject_id, class_level=class_level, difficulty=difficulty)
+    existing = list(bank.values_list('question', flat=True))
+    wanted = min(max(QUESTION_BANK_TARGET - len(existing), QUESTION_BANK_TOP_UP), QUESTION_BANK_MAX - len(existing))
+    if wanted <= 0:
+        return 0
+
+    topic = f"{assignment.subject.name} for {get_class_level_display(class_level)}"
+    sizes = [min(QUESTION_BANK_BATCH_SIZE, wanted - start) for start in range(0, wanted, QUESTION_BANK_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=min(QUIZ_QUESTION_WORKERS, len(sizes))) as executor:
+        batches = list(executor.map(lambda size: generate_practice_questions(topic, size, difficulty), sizes))
+
+    deduplicator = QuestionDeduplicator(existing)
+    new_questions = []
+    for batch in batches:
+        for generated in batch:
+            if not isinstance(generated, dict):
+                continue
+            text = str(generated.get('question', '')).strip()
+            if not text or text.startswith(AI_ERROR_PREFIX) or not deduplicator.add(text):
+                continue
+            new_questions.append(PracticeQuestion(
+                subject_id=subject_id,
+                class_level=class_level,
+                difficulty=difficulty,
+                question=text,
+                answer=str(generated.get('answer', '')).strip(),
+                fingerprint=question_fingerprint(text)
+            ))
+
+    PracticeQuestion.objects.bulk_create(new_questions, ignore_conflicts=True)
+    logger.info(
+        f"Question bank {assignment.subject.name}/{class_level}/{difficulty}: "
+        f"added {len(new_questions)} of {wanted} requested"
+    )
+    return len(new_questions)
+
+
+def banks_below_target():
+    """
+    Every (subject, class level, difficulty) bank with fewer than QUESTION_BANK_TARGET questions
+
+    Returns:
+        list: (subject_id, class_level, difficulty) tuples
+    """
+    sizes = {
+        (row['subject_id'], row['class_level'], row['difficulty']): row['count']
+        for row in PracticeQuestion.objects.values('subject_id', 'class_level', 'difficulty')
+        .annotate(count=Count('id')).order_by()
+    }
+    return [
+        (subject_id, class_level, difficulty)
+        for subject_id, class_level in ClassSubject.objects.values_list('subject_id', 'class_level')
+        for difficulty in QUESTION_BANK_DIFFICULTIES
+        if sizes.get((subject_id, class_level, difficulty), 0) < QUESTION_BANK_TARGET
+    ]
@@ -0,0 +1,667 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import operator
+from collections import namedtuple, defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, F, Q, OuterRef, Subquery, Value, Case, When, FloatField
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from core.models import Quiz, QuizQuestion, QuizAttempt, QuizResponse, QuizStats, empty_score_histogram
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Answer keys are dropped whenever a question of the quiz is saved or deleted,
+# so the TTL only bounds how long an unused key stays in the cache.
+QUIZ_ANSWER_KEY_TTL = int(os.environ.get('QUIZ_ANSWER_KEY_TTL', '86400'))
+
+# Rendered question bundles for quiz_take, also dropped when questions change.
+# On a miss one request renders the bundle and the others wait up to
+# QUIZ_BUNDLE_BUILD_WAIT seconds for it instead of rendering it themselves.
+QUIZ_BUNDLE_TTL = int(os.environ.get('QUIZ_BUNDLE_TTL', '86400'))
+QUIZ_BUNDLE_BUILD_WAIT = 2.0
+
+# Open timed attempts are closed by the expiry sweeper (a periodic job) once
+# they are QUIZ_EXPIRY_GRACE seconds past their deadline; the grace period lets
+# the browser's own auto-submit at 00:00 arrive first.
+QUIZ_EXPIRY_INTERVAL = float(os.environ.get('QUIZ_EXPIRY_INTERVAL', '30'))
+QUIZ_EXPIRY_GRACE = int(os.environ.get('QUIZ_EXPIRY_GRACE', '60'))
+QUIZ_EXPIRY_BATCH_SIZE = int(os.environ.get('QUIZ_EXPIRY_BATCH_SIZE', '500'))
+
+# Options a response may select
+QUIZ_OPTIONS = frozenset('abcd')
+
+
+
+def on_time_condition(attempt_prefix, response_prefix):
+    """
+    Condition for responses that count towards a score
+
+    A response counts if it was saved by the attempt's deadline, or belongs to
+    an untimed attempt. Responses saved before saved_at existed have none.
+
+    Args:
+        attempt_prefix (str): Lookup path to the attempt, e.g. "attempt__"
+        response_prefix (str): Lookup path to the response, e.g. "responses__"
+
+    Returns:
+        Q: The condition
+    """
+    return (
+        Q(**{f'{attempt_prefix}deadline__isnull': True})
+        | Q(**{f'{response_prefix}saved_at__isnull': True})
+        | Q(**{f'{response_prefix}saved_at__lte': F(f'{attempt_prefix}deadline')})
+    )
+
+
+# On QuizResponse querysets
+ON_TIME_RESPONSES = on_time_condition('attempt__', '')
+# On QuizAttempt querysets, as the condition of a FilteredRelation on responses
+ON_TIME_ATTEMPT_RESPONSES = on_time_condition('', 'responses__')
+
+# Correct options in question_number order, and the question id at each position
+AnswerKey = namedtuple('AnswerKey', ['question_ids', 'correct_options'])
+
+# Counts returned by tally_responses
+ResponseTally = namedtuple('ResponseTally', ['correct', 'incorrect', 'unanswered', 'total'])
+
+
+def answer_key_cache_key(quiz_id):
+    """Cache key for a quiz's answer key"""
+    return f"quiz_answer_key:{quiz_id}"
+
+
+def load_answer_key(quiz_id):
+    """
+    Build a quiz's answer key from the database
+
+    Args:
+        quiz_id (int): ID of the quiz
+
+    Returns:
+        AnswerKey: Question ids and correct options, by question number
+    """
+    rows = list(
+        QuizQuestion.objects.filter(quiz_id=quiz_id)
+        .order_by('question_number')
+        .values_list('id', 'correct_option')
+    )
+    return AnswerKey(
+        question_ids=tuple(row[0] for row in rows),
+        correct_options=tuple(row[1] for row in rows)
+    )
+
+
+def get_answer_key(quiz_id):
+    """
+    Get a quiz's answer key, from the cache when possible
+
+    Args:
+        quiz_id (int): ID of the quiz
+
+    Returns:
+        AnswerKey: Question ids and correct options, by question number
+    """
+    key = answer_key_cache_key(quiz_id)
+    try:
+        answer_key = cache.get(key)
+    except Exception as e:
+        logger.error(f"Answer key cache unavailable: {str(e)}")
+        return load_answer_key(quiz_id)
+
+    if answer_key is None:
+        answer_key = load_answer_key(quiz_id)
+        try:
+            cache.set(key, answer_key, QUIZ_ANSWER_KEY_TTL)
+        except Exception as e:
+            logger.error(f"Could not cache answer key for quiz {quiz_id}: {str(e)}")
+    return answer_key
+
+
+def invalidate_answer_key(quiz_id):
+    """Drop a quiz's cached answer key after its questions change"""
+    try:
+        cache.delete(answer_key_cache_key(quiz_id))
+    except Exception as e:
+        logger.error(f"Could not invalidate answer key for quiz {quiz_id}: {str(e)}")
+
+
+def question_bundle_cache_key(quiz_id):
+    """Cache key for a quiz's question bundle"""
+    return f"quiz_bundle:v1:{quiz_id}"
+
+
+def invalidate_quiz_questions(quiz_id):
+    """Drop everything cached from a quiz's questions"""
+    invalidate_answer_key(quiz_id)
+    try:
+        cache.delete(question_bundle_cache_key(quiz_id))
+    except Exception as e:
+        logger.error(f"Could not invalidate question bundle for quiz {quiz_id}: {str(e)}")
+
+
+def build_question_bundle(quiz_id):
+    """
+    Render a quiz's questions for students
+
+    The bundle holds no answers and nothing attempt-specific, so it can be
+    shared by every student taking the quiz.
+
+    Args:
+        quiz_id (int): ID of the quiz
+
+    Returns:
+        dict: version (content hash, used as ETag), question_count, questions
+        (JSON-ready list), questions_html and nav_html (rendered fragments)
+    """
+    questions = list(QuizQuestion.objects.filter(quiz_id=quiz_id).order_by('question_number'))
+    data = [
+        {
+            'id': question.id,
+            'number': question.question_number,
+            'text': question.question_text,
+            'options': {
+                letter: getattr(question, f'option_{letter}')
+                for letter in 'abcd' if getattr(question, f'option_{letter}')
+            },
+        }
+        for question in questions
+    ]
+    version = hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()[:20]
+
+    return {
+        'version': version,
+        'question_count': len(questions),
+        'questions': data,
+        'questions_html': render_to_string('quiz/questions_fragment.html', {'questions': questions}),
+        'nav_html': render_to_string('quiz/question_nav_fragment.html', {'questions': questions}),
+    }
+
+
+def get_question_bundle(quiz_id):
+    """
+    Get a quiz's question bundle, rendering it at most once per change
+
+    Args:
+        quiz_id (int): ID of the quiz
+
+    Returns:
+        dict: See build_question_bundle
+    """
+    key = question_bundle_cache_key(quiz_id)
+    lock_key = f"{key}:building"
+    try:
+        bundle = cache.get(key)
+        if bundle is not None:
+            return bundle
+
+        building = not cache.add(lock_key, 1, int(QUIZ_BUNDLE_BUILD_WAIT * 5))
+        if building:
+            # Another request is rendering it
+            deadline = time.monotonic() + QUIZ_BUNDLE_BUILD_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                bundle = cache.get(key)
+                if bundle is not None:
+                    return bundle
+    except Exception as e:
+        logger.error(f"Question bundle cache unavailable: {str(e)}")
+        return build_question_bundle(quiz_id)
+
+    bundle = build_question_bundle(quiz_id)
+    try:
+        cache.set(key, bundle, QUIZ_BUNDLE_TTL)
+        if not building:
+            cache.delete(lock_key)
+    except Exception as e:
+        logger.error(f"Could not cache question bundle for quiz {quiz_id}: {str(e)}")
+    return bundle
+
+
+def append_quiz_questions(quiz_id, questions):
+    """
+    Add questions to the end of a quiz in one transaction
+
+    The quiz row is locked while numbering, so concurrent appends (e.g. two
+    generation jobs) cannot give questions the same number.
+
+    Args:
+        quiz_id (int): ID of the quiz
+        questions (list): Dicts with question, options (letter -> text),
+            correct_option and explanation
+
+    Returns:
+        list: The created QuizQuestion objects
+    """
+    with transaction.atomic():
+        Quiz.objects.select_for_update().filter(pk=quiz_id).values_list('pk', flat=True).get()
+        last_number = QuizQuestion.objects.filter(quiz_id=quiz_id).aggregate(
+            last=Max('question_number')
+        )['last'] or 0
+
+        created = QuizQuestion.objects.bulk_create([
+            QuizQuestion(
+                quiz_id=quiz_id,
+                question_number=last_number + index,
+                question_text=question['question'],
+                option_a=question['options'].get('a', ''),
+                option_b=question['options'].get('b', ''),
+                option_c=question['options'].get('c', ''),
+                option_d=question['options'].get('d', ''),
+                correct_option=question['correct_option'],
+                explanation=question.get('explanation', '')
+            )
+            for index, question in enumerate(questions, start=1)
+        ])
+        # bulk_create does not send the signals that drop the cached questions
+        transaction.on_commit(lambda: invalidate_quiz_questions(quiz_id))
+
+    return created
+
+
+def tally_responses(answer_key, responses):
+    """
+    Compare a set of responses with an answer key
+
+    Args:
+        answer_key (AnswerKey): The quiz's answer key
+        responses (dict): question_id -> selected option
+
+    Returns:
+        ResponseTally: Correct, incorrect and unanswered counts, and the number of questions
+    """
+    selected = [responses.get(question_id) for question_id in answer_key.question_ids]
+    answered = sum(option is not None for option in selected)
+    correct = sum(map(operator.eq, selected, answer_key.correct_options))
+    total = len(answer_key.question_ids)
+    return ResponseTally(
+        correct=correct,
+        incorrect=answered - correct,
+        unanswered=total - answered,
+        total=total
+    )
+
+
+def percentage_score(correct, total):
+    """Whole-number percentage score (0 for a quiz without questions)"""
+    if not total:
+        return 0
+    return correct * 100 // total
+
+
+def get_attempt_responses(attempt):
+    """
+    Get the options selected in an attempt
+
+    Answers saved after a timed attempt's deadline are left out.
+
+    Args:
+        attempt (QuizAttempt): The attempt
+
+    Returns:
+        dict: question_id -> selected option
+    """
+    return dict(
+        QuizResponse.objects.filter(ON_TIME_RESPONSES, attempt_id=attempt.pk)
+        .values_list('question_id', 'selected_option')
+    )
+
+
+def clean_responses(answer_key, submitted):
+    """
+    Validate submitted responses against a quiz's questions
+
+    Args:
+        answer_key (AnswerKey): The quiz's answer key
+        submitted (dict): question_id (int or str) -> selected option
+
+    Returns:
+        tuple: (dict of valid question_id -> option, list of rejected question ids)
+    """
+    question_ids = set(answer_key.question_ids)
+    responses = {}
+    rejected = []
+    for question_id, option in submitted.items():
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            rejected.append(question_id)
+            continue
+        # Options come from JSON, so they may be lists or objects, which are unhashable
+        if question_id not in question_ids or not isinstance(option, str) or option not in QUIZ_OPTIONS:
+            rejected.append(question_id)
+            continue
+        responses[question_id] = option
+    return responses, rejected
+
+
+def save_attempt_responses(attempt, responses):
+    """
+    Insert or update an attempt's responses in a single statement
+
+    Args:
+        attempt (QuizAttempt): The attempt, already checked to belong to the user
+        responses (dict): Validated question_id -> selected option
+
+    Returns:
+        int: Number of responses saved
+    """
+    if not responses:
+        return 0
+    saved_at = timezone.now()
+    QuizResponse.objects.bulk_create(
+        [
+            QuizResponse(attempt_id=attempt.pk, question_id=question_id, selected_option=option, saved_at=saved_at)
+            for question_id, option in responses.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['attempt', 'question'],
+        update_fields=['selected_option', 'saved_at']
+    )
+    return len(responses)
+
+
+def score_attempt(attempt):
+    """
+    Calculate an attempt's percentage score
+
+    Reads the responses in one query and compares them with the cached
+    answer key.
+
+    Args:
+        attempt (QuizAttempt): The attempt to score
+
+    Returns:
+        int: Score as a percentage
+    """
+    tally = tally_responses(get_answer_key(attempt.quiz_id), get_attempt_responses(attempt))
+    return percentage_score(tally.correct, tally.total)
+
+
+def rescore_quiz(quiz_id):
+    """
+    Recalculate the score of every completed attempt of a quiz
+
+    Runs as a single UPDATE that counts each attempt's correct responses
+    in a subquery, e.g. after a teacher corrects an answer key.
+
+    Args:
+        quiz_id (int): ID of the quiz
+
+    Returns:
+        int: Number of attempts rescored
+    """
+    invalidate_answer_key(quiz_id)
+
+    with transaction.atomic():
+        total = QuizQuestion.objects.filter(quiz_id=quiz_id).count()
+        attempts = QuizAttempt.objects.filter(quiz_id=quiz_id, completed=True)
+
+        if not total:
+            updated = attempts.update(score=Value(0.0))
+            rebuild_quiz_stats([quiz_id])
+            return updated
+
+        correct_counts = QuizResponse.objects.filter(
+            ON_TIME_RESPONSES,
+            attempt_id=OuterRef('pk'),
+            question__quiz_id=quiz_id,
+            selected_option=F('question__correct_option')
+        ).order_by().values('attempt_id').annotate(correct=Count('pk')).values('correct')
+
+        # Integer division, matching percentage_score
+        updated = attempts.update(
+            score=Coalesce(Subquery(correct_counts), 0) * 100 / total
+        )
+        rebuild_quiz_stats([quiz_id])
+
+    logger.info(f"Rescored {updated} attempts of quiz {quiz_id}")
+    return updated
+
+
+def score_bucket(score):
+    """Histogram index for a percentage score"""
+    return min(max(int(score), 0), 100)
+
+
+def lock_quiz_stats(quiz_id):
+    """
+    Get a quiz's stats row for update, creating it if needed
+
+    Must be called inside a transaction.
+
+    Args:
+        quiz_id (int): ID of the quiz
+
+    Returns:
+        QuizStats: The locked row
+    """
+    stats, created = QuizStats.objects.select_for_update().get_or_create(quiz_id=quiz_id)
+    return stats
+
+
+def record_attempt_started(quiz_id):
+    """Count a new attempt in the quiz's stats"""
+    with transaction.atomic():
+        stats = lock_quiz_stats(quiz_id)
+        stats.attempts += 1
+        stats.save(update_fields=['attempts', 'updated_at'])
+
+
+def complete_attempt(attempt, score, completed_at=None):
+    """
+    Mark an attempt completed and add it to the quiz's stats
+
+    Only the first completion of an attempt counts, so a double submit
+    cannot be recorded twice.
+
+    Args:
+        attempt (QuizAttempt): The attempt; updated in place
+        score (int): Percentage score
+        completed_at (datetime, optional): Completion time, now by default
+
+    Returns:
+        bool: False if the attempt had already been completed
+    """
+    completed_at = completed_at or timezone.now()
+    passing_score = attempt.quiz.passing_score
+
+    with transaction.atomic():
+        updated = QuizAttempt.objects.filter(pk=attempt.pk, completed=False).update(
+            completed=True, score=score, completed_at=completed_at
+        )
+        if not updated:
+            return False
+
+        add_completions_to_stats(attempt.quiz_id, [score], passing_score)
+
+    attempt.completed = True
+    attempt.score = score
+    attempt.completed_at = completed_at
+    return True
+
+
+def add_completions_to_stats(quiz_id, scores, passing_score):
+    """
+    Add completed attempts to a quiz's stats
+
+    Must be called inside a transaction.
+
+    Args:
+        quiz_id (int): ID of the quiz
+        scores (list): Percentage scores of the newly completed attempts
+        passing_score (int): The quiz's passing score
+    """
+    stats = lock_quiz_stats(quiz_id)
+    for score in scores:
+        stats.completions += 1
+        stats.score_sum += score
+        if score >= passing_score:
+            stats.pass_count += 1
+        stats.score_histogram[score_bucket(score)] += 1
+    stats.save(update_fields=['completions', 'score_sum', 'pass_count', 'score_histogram', 'updated_at'])
+
+
+def attempt_deadline(quiz, started_at):
+    """
+    When an attempt of a quiz must be submitted by
+
+    Args:
+        quiz (Quiz): The quiz
+        started_at (datetime): When the attempt started
+
+    Returns:
+        datetime: The deadline, or None if the quiz has no time limit
+    """
+    if not quiz.time_limit:
+        return None
+    return started_at + timedelta(minutes=quiz.time_limit)
+
+
+def attempt_timed_out(attempt, now=None):
+    """
+    Whether a timed attempt is past its deadline
+
+    Args:
+        attempt (QuizAttempt): The attempt
+        now (datetime, optional): Current time, for testing
+
+    Returns:
+        bool: True once no more answers or submissions are accepted
+    """
+    return attempt.deadline is not None and (now or timezone.now()) > attempt.deadline
+
+
+def expire_attempts(now=None, batch_size=QUIZ_EXPIRY_BATCH_SIZE):
+    """
+    Submit one batch of open attempts that are past their deadline
+
+    Attempts are read through the partial deadline index, oldest deadline
+    first, and locked with SKIP LOCKED so several workers can sweep at once.
+    Each is scored like calculate_score, on the answers saved by its
+    deadline, and completed at its deadline.
+
+    Args:
+        now (datetime, optional): Current time, for testing
+        batch_size (int): Maximum attempts to submit
+
+    Returns:
+        int: Number of attempts submitted
+    """
+    cutoff = (now or timezone.now()) - timedelta(seconds=QUIZ_EXPIRY_GRACE)
+
+    with transaction.atomic():
+        attempts = list(
+            QuizAttempt.objects.select_for_update(skip_locked=True)
+            .filter(completed=False, deadline__lte=cutoff)
+            .order_by('deadline')
+            .only('id', 'quiz_id', 'deadline')[:batch_size]
+        )
+        if not attempts:
+            return 0
+
+        attempt_ids = [attempt.pk for attempt in attempts]
+        responses = defaultdict(dict)
+        for attempt_id, question_id, option in QuizResponse.objects.filter(
+            ON_TIME_RESPONSES, attempt_id__in=attempt_ids
+        ).values_list('attempt_id', 'question_id', 'selected_option'):
+            responses[attempt_id][question_id] = option
+
+        answer_keys = {}
+        scores_by_quiz = defaultdict(list)
+        for attempt in attempts:
+            if attempt.quiz_id not in answer_keys:
+                answer_keys[attempt.quiz_id] = get_answer_key(attempt.quiz_id)
+            tally = tally_responses(answer_keys[attempt.quiz_id], responses[attempt.pk])
+            attempt.score = percentage_score(tally.correct, tally.total)
+            scores_by_quiz[attempt.quiz_id].append(attempt.score)
+
+        updated = QuizAttempt.objects.filter(pk__in=attempt_ids, completed=False).update(
+            completed=True,
+            completed_at=F('deadline'),
+            score=Case(
+                *[When(pk=attempt.pk, then=Value(attempt.score)) for attempt in attempts],
+                output_field=FloatField()
+            )
+        )
+
+        if updated == len(attempts):
+            passing_scores = dict(
+                Quiz.objects.filter(id__in=scores_by_quiz).values_list('id', 'passing_score')
+            )
+            for quiz_id, scores in scores_by_quiz.items():
+                add_completions_to_stats(quiz_id, scores, passing_scores[quiz_id])
+        else:
+            # Some were submitted meanwhile (no row locks on this database)
+            rebuild_quiz_stats(list(scores_by_quiz))
+
+    logger.info(f"Submitted {updated} expired quiz attempts")
+    return updated
+
+
+def update_pass_count(quiz):
+    """Recount passes from the score histogram after a quiz's passing score changes"""
+    with transaction.atomic():
+        stats = QuizStats.objects.select_for_update().filter(quiz_id=quiz.pk).first()
+        if stats is None:
+            return
+        pass_count = sum(stats.score_histogram[score_bucket(quiz.passing_score):])
+        if pass_count != stats.pass_count:
+            stats.pass_count = pass_count
+            stats.save(update_fields=['pass_count', 'updated_at'])
+
+
+def rebuild_quiz_stats(quiz_ids=None):
+    """
+    Recalculate quiz stats from QuizAttempt
+
+    Args:
+        quiz_ids (list, optional): Quizzes to rebuild; all quizzes by default
+
+    Returns:
+        int: Number of quizzes rebuilt
+    """
+    quizzes = Quiz.objects.all()
+    attempts = QuizAttempt.objects.all()
+    if quiz_ids is not None:
+        quizzes = quizzes.filter(id__in=quiz_ids)
+        attempts = attempts.filter(quiz_id__in=quiz_ids)
+
+    passing_scores = dict(quizzes.values_list('id', 'passing_score'))
+    stats = {
+        quiz_id: QuizStats(quiz_id=quiz_id, score_histogram=empty_score_histogram())
+        for quiz_id in passing_scores
+    }
+
+    for row in attempts.values('quiz_id').annotate(count=Count('id')).order_by():
+        stats[row['quiz_id']].attempts = row['count']
+
+    completed = attempts.filter(completed=True, score__isnull=False)
+    for row in completed.values('quiz_id', 'score').annotate(count=Count('id')).order_by():
+        quiz_stats = stats[row['quiz_id']]
+        quiz_stats.completions += row['count']
+        quiz_stats.score_sum += row['score'] * row['count']
+        quiz_stats.score_histogram[score_bucket(row['score'])] += row['count']
+        if row['score'] >= passing_scores[row['quiz_id']]:
+            quiz_stats.pass_count += row['count']
+
+    now = timezone.now()
+    for quiz_stats in stats.values():
+        quiz_stats.updated_at = now
+
+    QuizStats.objects.bulk_create(
+        stats.values(),
+        update_conflicts=True,
+        unique_fields=['quiz'],
+        update_fields=['attempts', 'completions', 'score_sum', 'pass_count', 'score_histogram', 'updated_at'],
+        batch_size=500
+    )
+    return len(stats)
@@ -3,20 +3,30 @@ import random
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404, HttpResponseNotModified
 from django.views.decorators.http import require_POST
 from django.utils import timezone
-from django.db.models import Avg, Count, Sum, F
+from django.urls import reverse
+from django.db.models import Avg, Count, Sum, F, OuterRef
 
 from .models import (
     UserProfile, Subject, Quiz, QuizQuestion, QuizAttempt, QuizResponse
 )
-from .ai_service import generate_practice_questions
+from .job_queue import enqueue
+from .ai_service import MAX_GENERATED_QUESTIONS
+from .jobs import generate_quiz_questions, rescore_quiz_attempts
+from .profile_service import get_profile_or_404
+from .item_analysis_service import get_item_analysis, ITEM_ANALYSIS_MIN_ATTEMPTS
+from .quiz_service import (
+    get_answer_key, get_attempt_responses, tally_responses, score_attempt,
+    clean_responses, save_attempt_responses, complete_attempt, record_attempt_started,
+    attempt_deadline, attempt_timed_out, get_question_bundle
+)
 
 @login_required
 def quizzes_list(request):
     """List available quizzes"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Filter quizzes by class level for students
     if profile.role == 'student':
@@ -32,6 +42,7 @@ def quizzes_list(request):
             ).order_by('-created_at')
         else:  # admin
             available_quizzes = Quiz.objects.all().order_by('-created_at')
+    available_quizzes = available_quizzes.select_related('subject', 'stats').defer('search_vector')
     
     # Get completed quizzes for the student
     completed_quizzes = []
@@ -45,11 +56,19 @@ def quizzes_list(request):
             id__in=completed_quiz_ids
         ).annotate(
             score=QuizAttempt.objects.filter(
-                quiz_id=F('id'), 
+                quiz_id=OuterRef('id'),
                 student=request.user,
                 completed=True
             ).values('score').order_by('-completed_at')[:1]
-        ).order_by('-created_at')
+        ).select_related('subject').defer('search_vector').order_by('-created_at')
+    
+    # Summary of the student's latest score per completed quiz
+    completed_quizzes = list(completed_quizzes)
+    completed_summary = {
+        'count': len(completed_quizzes),
+        'avg_score': sum(q.score for q in completed_quizzes) / len(completed_quizzes) if completed_quizzes else 0,
+        'passed': sum(1 for q in completed_quizzes if q.score >= q.passing_score),
+    }
     
     # Get subjects for filtering
     subjects = Subject.objects.all()
@@ -57,6 +76,7 @@ def quizzes_list(request):
     return render(request, 'quiz/list.html', {
         'available_quizzes': available_quizzes,
         'completed_quizzes': completed_quizzes,
+        'completed_summary': completed_summary,
         'subjects': subjects,
         'profile': profile
     })
@@ -64,7 +84,7 @@ def quizzes_list(request):
 @login_required
 def quiz_create(request):
     """Create a new quiz"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Only teachers and admins can create quizzes
     if profile.role not in ['teacher', 'admin']:
@@ -114,7 +134,7 @@ def quiz_create(request):
 def quiz_edit(request, quiz_id):
     """Edit a quiz and its questions"""
     quiz = get_object_or_404(Quiz, pk=quiz_id)
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Check if user has permission to edit
     if quiz.created_by != request.user and profile.role != 'admin':
@@ -129,59 +149,24 @@ def quiz_edit(request, quiz_id):
             # Generate AI questions
             subject = quiz.subject.name
             topic = request.POST.get('topic', subject)
-            num_questions = int(request.POST.get('num_questions', 5))
+            try:
+                num_questions = int(request.POST.get('num_questions', 5))
+            except ValueError:
+                num_questions = 5
+            num_questions = min(max(1, num_questions), MAX_GENERATED_QUESTIONS)
             difficulty = request.POST.get('difficulty', 'medium')
             
-            generated_questions = generate_practice_questions(
-                topic=f"{topic} {subject} for {quiz.get_class_level_display()}",
+            # The AI call runs in a background worker; the page polls the job
+            job_id = enqueue(
+                generate_quiz_questions, quiz.id,
+                f"{topic} {subject} for {quiz.get_class_level_display()}",
                 num_questions=num_questions,
-                difficulty=difficulty
+                difficulty=difficulty,
+                owner_id=request.user.id
             )
             
-            # Add generated questions to the quiz
-            for i, q in enumerate(generated_questions):
-                next_number = questions.count() + i + 1
-                options = [
-                    q.get('option_a', ''),
-                    q.get('option_b', ''),
-                    q.get('option_c', ''),
-                    q.get('option_d', '')
-                ]
-                
-                # Clean up options - remove empty ones
-                options = [opt for opt in options if opt]
-                
-                # If no options provided, create some basic ones from the answer
-                if not options and q.get('answer'):
-                    answer = q.get('answer')
-                    options = [answer]
-                    # Generate some plausible wrong answers
-                    wrong_answers = [
-                        f"Not {answer}" if len(answer) < 30 else "Incorrect option 1",
-                        "Incorrect option 2",
-                        "None of the above"
-                    ]
-                    options.extend(wrong_answers)
-                
-                # Determine correct answer index
-                correct_index = 0  # Default to first option
-                
-                new_question = QuizQuestion.objects.create(
-                    quiz=quiz,
-                    question_number=next_number,
-                    question_text=q.get('question', ''),
-                    option_a=options[0] if len(options) > 0 else '',
-                    option_b=options[1] if len(options) > 1 else '',
-                    option_c=options[2] if len(options) > 2 else '',
-                    option_d=options[3] if len(options) > 3 else '',
-                    correct_option=chr(97 + correct_index),  # 'a', 'b', 'c', or 'd'
-                    explanation=q.get('answer', '')
-                )
-            
-            messages.success(request, f"Added {len(generated_questions)} AI-generated questions to the quiz.")
-            
-            # Refresh questions list
-            questions = QuizQuestion.objects.filter(quiz=quiz).order_by('question_number')
+            messages.info(request, f"Generating {num_questions} AI questions. They will appear here when ready.")
+            return redirect(f"{reverse('quiz_edit', args=[quiz.id])}?job={job_id}")
         
         elif 'update_quiz' in request.POST:
             # Update quiz details
@@ -204,8 +189,31 @@ def quiz_edit(request, quiz_id):
             correct_option = request.POST.get('correct_option')
             explanation = request.POST.get('explanation', '')
             
+            question_id = request.POST.get('question_id')
+            
             if not (question_text and option_a and correct_option):
                 messages.error(request, "Question text, option A, and correct option are required.")
+            elif question_id:
+                # Update an existing question
+                question = get_object_or_404(QuizQuestion, pk=question_id, quiz=quiz)
+                key_changed = question.correct_option != correct_option
+                question.question_text = question_text
+                question.option_a = option_a
+                question.option_b = option_b or ''
+                question.option_c = option_c or ''
+                question.option_d = option_d or ''
+                question.correct_option = correct_option
+                question.explanation = explanation
+                question.save()
+                
+                if key_changed and quiz.completion_count:
+                    # Correct the scores of everyone who already took the quiz
+                    enqueue(rescore_quiz_attempts, quiz.id, owner_id=request.user.id)
+                    messages.success(request, "Question updated. Existing attempts are being rescored.")
+                else:
+                    messages.success(request, "Question updated successfully.")
+                
+                questions = QuizQuestion.objects.filter(quiz=quiz).order_by('question_number')
             else:
                 next_number = questions.count() + 1
                 QuizQuestion.objects.create(
@@ -223,6 +231,17 @@ def quiz_edit(request, quiz_id):
                 
                 # Refresh questions list
                 questions = QuizQuestion.objects.filter(quiz=quiz).order_by('question_number')
+        
+        elif 'delete_question' in request.POST:
+            question = get_object_or_404(QuizQuestion, pk=request.POST.get('delete_question'), quiz=quiz)
+            question.delete()
+            
+            # The number of questions is part of every score
+            if quiz.completion_count:
+                enqueue(rescore_quiz_attempts, quiz.id, owner_id=request.user.id)
+            messages.success(request, "Question deleted successfully.")
+            
+            questions = QuizQuestion.objects.filter(quiz=quiz).order_by('question_number')
     
     # Get subjects for generation form
     subjects = Subject.objects.all()
@@ -231,14 +250,16 @@ def quiz_edit(request, quiz_id):
         'quiz': quiz,
         'questions': questions,
         'subjects': subjects,
-        'profile': profile
+        'profile': profile,
+        'generation_job_id': request.GET.get('job', ''),
+        'max_generated_questions': MAX_GENERATED_QUESTIONS
     })
 
 @login_required
 def quiz_detail(request, quiz_id):
     """View quiz details and start quiz"""
-    quiz = get_object_or_404(Quiz, pk=quiz_id)
-    profile = get_object_or_404(UserProfile, user=request.user)
+    quiz = get_object_or_404(Quiz.objects.select_related('stats'), pk=quiz_id)
+    profile = get_profile_or_404(request)
     
     # Students can only access quizzes for their class level
     if profile.role == 'student' and quiz.class_level != profile.class_level:
@@ -255,7 +276,7 @@ def quiz_detail(request, quiz_id):
         ).order_by('-completed_at')
     
     # Get question count
-    question_count = QuizQuestion.objects.filter(quiz=quiz).count()
+    question_count = quiz.num_questions
     
     return render(request, 'quiz/detail.html', {
         'quiz': quiz,
@@ -265,11 +286,50 @@ def quiz_detail(request, quiz_id):
         'can_edit': quiz.created_by == request.user or profile.role == 'admin'
     })
 
+@login_required
+def quiz_item_analysis(request, quiz_id):
+    """Per-question statistics of a quiz for its teacher"""
+    quiz = get_object_or_404(Quiz, pk=quiz_id)
+    profile = get_profile_or_404(request)
+    
+    if quiz.created_by != request.user and profile.role != 'admin':
+        messages.error(request, "You don't have permission to view this quiz's analysis.")
+        return redirect('quizzes_list')
+    
+    analysis = get_item_analysis(quiz.id)
+    questions = {question.id: question for question in QuizQuestion.objects.filter(quiz=quiz)}
+    
+    items = []
+    for item in analysis['items']:
+        question = questions.get(item['question_id'])
+        if question is None:
+            continue
+        options = []
+        for letter in 'abcd':
+            text = getattr(question, f'option_{letter}')
+            if text:
+                options.append({
+                    'letter': letter.upper(),
+                    'text': text,
+                    'rate': item['options'][letter]['rate'] or 0,
+                    'mean_score': item['options'][letter]['mean_score'],
+                    'correct': letter == item['correct_option'],
+                })
+        items.append({'question': question, 'stats': item, 'options': options})
+    
+    return render(request, 'quiz/item_analysis.html', {
+        'quiz': quiz,
+        'analysis': analysis,
+        'items': items,
+        'min_attempts': ITEM_ANALYSIS_MIN_ATTEMPTS,
+        'profile': profile
+    })
+
 @login_required
 def quiz_take(request, quiz_id):
     """Take a quiz"""
     quiz = get_object_or_404(Quiz, pk=quiz_id)
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Only students can take quizzes
     if profile.role != 'student':
@@ -287,36 +347,35 @@ def quiz_take(request, quiz_id):
         return redirect('quiz_detail', quiz_id=quiz.id)
     
     # Create a new attempt or get an existing incomplete one
+    started_at = timezone.now()
     attempt, created = QuizAttempt.objects.get_or_create(
         quiz=quiz,
         student=request.user,
         completed=False,
         defaults={
-            'started_at': timezone.now()
+            'started_at': started_at,
+            'deadline': attempt_deadline(quiz, started_at)
         }
     )
     
-    if not created:
-        # Check if the attempt has timed out
-        if quiz.time_limit > 0:
-            time_elapsed = (timezone.now() - attempt.started_at).total_seconds() / 60
-            if time_elapsed > quiz.time_limit:
-                # Automatically submit the timed-out attempt
-                score = calculate_score(attempt)
-                attempt.score = score
-                attempt.completed = True
-                attempt.completed_at = timezone.now()
-                attempt.save()
-                
-                messages.warning(request, f"Your previous attempt timed out. Your score: {score}%")
-                return redirect('quiz_detail', quiz_id=quiz.id)
+    if created:
+        record_attempt_started(quiz.id)
+    else:
+        # Check if the attempt has timed out (the expiry sweeper may not have run yet)
+        deadline = attempt.deadline or attempt_deadline(quiz, attempt.started_at)
+        if deadline and timezone.now() > deadline:
+            # Automatically submit the timed-out attempt
+            score = calculate_score(attempt)
+            complete_attempt(attempt, score, completed_at=deadline)
+            
+            messages.warning(request, f"Your previous attempt timed out. Your score: {score}%")
+            return redirect('quiz_detail', quiz_id=quiz.id)
     
-    # Get all questions
-    questions = QuizQuestion.objects.filter(quiz=quiz).order_by('question_number')
+    # Questions are rendered once per quiz and shared by every attempt
+    bundle = get_question_bundle(quiz.id)
     
-    # Get existing responses
-    responses = QuizResponse.objects.filter(attempt=attempt).values_list('question_id', 'selected_option')
-    responses_dict = {q_id: opt for q_id, opt in responses}
+    # Get existing responses; the page checks them on top of the shared questions
+    responses_dict = {} if created else get_attempt_responses(attempt)
     
     # Send time information for timed quizzes
     time_data = None
@@ -330,13 +389,46 @@ def quiz_take(request, quiz_id):
     
     return render(request, 'quiz/take.html', {
         'quiz': quiz,
-        'questions': questions,
+        'bundle': bundle,
         'attempt': attempt,
         'responses_dict': responses_dict,
         'time_data': time_data,
         'profile': profile
     })
 
+@login_required
+def quiz_questions(request, quiz_id):
+    """
+    Questions of a quiz as JSON, without answers
+    
+    The response carries the bundle version as its ETag, so clients that
+    already have the current questions get a 304.
+    """
+    quiz = get_object_or_404(Quiz, pk=quiz_id)
+    profile = get_profile_or_404(request)
+    
+    if profile.role == 'student':
+        if quiz.class_level != profile.class_level or not quiz.is_active:
+            return JsonResponse({'success': False, 'error': "You don't have access to this quiz."}, status=403)
+    elif quiz.created_by != request.user and profile.role != 'admin':
+        return JsonResponse({'success': False, 'error': "You don't have access to this quiz."}, status=403)
+    
+    bundle = get_question_bundle(quiz.id)
+    etag = f'"{bundle["version"]}"'
+    
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({
+            'success': True,
+            'quiz_id': quiz.id,
+            'version': bundle['version'],
+            'questions': bundle['questions'],
+        })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 @require_POST
 @login_required
 def save_response(request):
@@ -349,24 +441,57 @@ def save_response(request):
         return JsonResponse({'success': False, 'error': 'Missing required data'})
     
     # Get the attempt and check if it belongs to the current user
-    attempt = get_object_or_404(QuizAttempt, pk=attempt_id)
-    if attempt.student != request.user:
+    attempt = get_object_or_404(QuizAttempt.objects.only('student_id', 'quiz_id', 'completed', 'deadline'), pk=attempt_id)
+    if attempt.student_id != request.user.id:
         return JsonResponse({'success': False, 'error': 'Unauthorized'})
     
     # Check if the attempt is still active
     if attempt.completed:
         return JsonResponse({'success': False, 'error': 'Quiz attempt already completed'})
+    if attempt_timed_out(attempt):
+        return JsonResponse({'success': False, 'error': 'Time is up for this quiz'})
     
     # Save or update the response
-    question = get_object_or_404(QuizQuestion, pk=question_id)
-    response, created = QuizResponse.objects.update_or_create(
-        attempt=attempt,
-        question=question,
-        defaults={'selected_option': selected_option}
-    )
+    responses, rejected = clean_responses(get_answer_key(attempt.quiz_id), {question_id: selected_option})
+    if rejected:
+        raise Http404("Question not found")
+    save_attempt_responses(attempt, responses)
     
     return JsonResponse({'success': True})
 
+@require_POST
+@login_required
+def save_responses(request):
+    """
+    Save a batch of question responses
+    
+    Expects a JSON body {"attempt_id": 1, "responses": {"<question_id>": "a", ...}}.
+    The take page collects answers and sends them together after a short pause.
+    """
+    try:
+        data = json.loads(request.body)
+        attempt_id = int(data['attempt_id'])
+        submitted = data.get('responses') or {}
+        if not isinstance(submitted, dict):
+            raise ValueError("responses must be an object")
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Invalid request format'})
+    
+    # Check ownership once for the whole batch
+    attempt = get_object_or_404(QuizAttempt.objects.only('student_id', 'quiz_id', 'completed', 'deadline'), pk=attempt_id)
+    if attempt.student_id != request.user.id:
+        return JsonResponse({'success': False, 'error': 'Unauthorized'})
+    
+    if attempt.completed:
+        return JsonResponse({'success': False, 'error': 'Quiz attempt already completed'})
+    if attempt_timed_out(attempt):
+        return JsonResponse({'success': False, 'error': 'Time is up for this quiz'})
+    
+    responses, rejected = clean_responses(get_answer_key(attempt.quiz_id), submitted)
+    saved = save_attempt_responses(attempt, responses)
+    
+    return JsonResponse({'success': True, 'saved': saved, 'rejected': rejected})
+
 @require_POST
 @login_required
 def submit_quiz(request):
@@ -381,18 +506,28 @@ def submit_quiz(request):
     if attempt.student != request.user:
         return JsonResponse({'success': False, 'error': 'Unauthorized'})
     
+    results_url = f'/quiz/{attempt.quiz_id}/results/{attempt.id}/'
+    
     # Check if the attempt is still active
     if attempt.completed:
         return JsonResponse({'success': False, 'error': 'Quiz already submitted'})
     
+    # Too late to submit: close the attempt at its deadline, like quiz_take and
+    # the expiry sweeper, scored on the answers saved before it
+    if attempt_timed_out(attempt):
+        complete_attempt(attempt, calculate_score(attempt), completed_at=attempt.deadline)
+        return JsonResponse({
+            'success': False,
+            'error': 'Time is up for this quiz; the answers saved before the time limit were submitted',
+            'redirect_url': results_url
+        })
+    
     # Calculate the score
     score = calculate_score(attempt)
     
-    # Update the attempt
-    attempt.score = score
-    attempt.completed = True
-    attempt.completed_at = timezone.now()
-    attempt.save()
+    # Update the attempt and the quiz statistics
+    if not complete_attempt(attempt, score):
+        return JsonResponse({'success': False, 'error': 'Quiz already submitted'})
     
     # Determine if passed
     passed = score >= attempt.quiz.passing_score
@@ -401,7 +536,7 @@ def submit_quiz(request):
         'success': True,
         'score': score,
         'passed': passed,
-        'redirect_url': f'/quiz/{attempt.quiz.id}/results/{attempt.id}/'
+        'redirect_url': results_url
     })
 
 @login_required
@@ -409,7 +544,7 @@ def quiz_results(request, quiz_id, attempt_id):
     """View quiz results"""
     quiz = get_object_or_404(Quiz, pk=quiz_id)
     attempt = get_object_or_404(QuizAttempt, pk=attempt_id)
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Check if the attempt belongs to current user or user is teacher/admin
     is_owner = attempt.student == request.user
@@ -421,13 +556,10 @@ def quiz_results(request, quiz_id, attempt_id):
     
     # Get all questions with student responses
     questions = QuizQuestion.objects.filter(quiz=quiz).order_by('question_number')
-    responses = QuizResponse.objects.filter(attempt=attempt)
-    responses_dict = {r.question_id: r.selected_option for r in responses}
+    responses_dict = get_attempt_responses(attempt)
     
     # Get correct/incorrect counts
-    correct_count = sum(1 for q in questions if q.id in responses_dict and responses_dict[q.id] == q.correct_option)
-    incorrect_count = sum(1 for q in questions if q.id in responses_dict and responses_dict[q.id] != q.correct_option)
-    unanswered_count = questions.count() - len(responses_dict)
+    tally = tally_responses(get_answer_key(quiz.id), responses_dict)
     
     # Calculate time taken if there's a time limit
     time_taken = None
@@ -442,9 +574,9 @@ def quiz_results(request, quiz_id, attempt_id):
         'attempt': attempt,
         'questions': questions,
         'responses_dict': responses_dict,
-        'correct_count': correct_count,
-        'incorrect_count': incorrect_count,
-        'unanswered_count': unanswered_count,
+        'correct_count': tally.correct,
+        'incorrect_count': tally.incorrect,
+        'unanswered_count': tally.unanswered,
         'time_taken': time_taken,
         'passed': passed,
         'profile': profile,
@@ -453,22 +585,4 @@ def quiz_results(request, quiz_id, attempt_id):
 
 def calculate_score(attempt):
     """Calculate the score as a percentage"""
-    quiz = attempt.quiz
-    questions = QuizQuestion.objects.filter(quiz=quiz)
-    total_questions = questions.count()
-    
-    if total_questions == 0:
-        return 0
-    
-    # Get student responses
-    responses = QuizResponse.objects.filter(attempt=attempt)
-    response_dict = {r.question_id: r.selected_option for r in responses}
-    
-    # Count correct answers
-    correct_answers = 0
-    for question in questions:
-        if question.id in response_dict and response_dict[question.id] == question.correct_option:
-            correct_answers += 1
-    
-    # Calculate percentage score
-    return int((correct_answers / total_questions) * 100)
\ No newline at end of file
+    return score_attempt(attempt)
@@ -1,6 +1,7 @@
 import os
 import logging
 import time
+from django.core.cache import cache
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.db import transaction
@@ -8,10 +9,14 @@ from django.db import transaction
 from core.models import RecordedSession, Subject
 from core.zoom_service import get_meeting_recordings, get_past_meeting_recordings
 from core.s3_service import create_presigned_url, delete_file_from_s3
+from core.counter_service import increment_counter
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# How long whether a recording exists is cached before a view is counted (seconds)
+RECORDING_EXISTS_TTL = int(os.environ.get('RECORDING_EXISTS_TTL', '300'))
+
 def save_zoom_recording_to_db(meeting_id, uploaded_by, subject_id=None, class_level=None, title=None, description=None):
     """
     Save a Zoom recording to the database with options for S3 or direct URL storage
@@ -141,7 +146,7 @@ def get_class_recordings(class_level):
     Returns:
         QuerySet: RecordedSession objects
     """
-    return RecordedSession.objects.filter(class_level=class_level).order_by('-recorded_date')
+    return RecordedSession.objects.filter(class_level=class_level).defer('search_vector').order_by('-recorded_date')
 
 def get_subject_recordings(subject_id, class_level=None):
     """
@@ -159,25 +164,52 @@ def get_subject_recordings(subject_id, class_level=None):
     if class_level:
         queryset = queryset.filter(class_level=class_level)
         
-    return queryset.order_by('-recorded_date')
+    return queryset.defer('search_vector').order_by('-recorded_date')
+
+def recording_exists(recording_id):
+    """
+    Check whether a recording exists, from the cache when possible
+    
+    Args:
+        recording_id (int): Recording ID
+        
+    Returns:
+        bool: True if the recording exists
+    """
+    key = f"recording_exists:{recording_id}"
+    try:
+        exists = cache.get(key)
+    except Exception as e:
+        logger.error(f"Recording cache unavailable: {str(e)}")
+        return RecordedSession.objects.filter(pk=recording_id).exists()
+    
+    if exists is None:
+        exists = RecordedSession.objects.filter(pk=recording_id).exists()
+        try:
+            cache.set(key, exists, RECORDING_EXISTS_TTL)
+        except Exception as e:
+            logger.error(f"Could not cache whether recording {recording_id} exists: {str(e)}")
+    return exists
 
 def increment_recording_view_count(recording_id):
     """
     Increment the view count for a recording
     
+    The increment is buffered and written to the database in batches by
+    counter_service.flush_counters, so the recording is looked up (with a
+    cached check) to keep unknown IDs from being counted.
+    
     Args:
         recording_id (int): Recording ID
         
     Returns:
-        bool: Success or failure
+        bool: False if the recording does not exist or the view could not be counted
     """
     try:
-        recording = RecordedSession.objects.get(id=recording_id)
-        recording.views += 1
-        recording.save(update_fields=['views'])
+        if not recording_exists(recording_id):
+            return False
+        increment_counter(RecordedSession, recording_id, 'views')
         return True
-    except RecordedSession.DoesNotExist:
-        return False
     except Exception as e:
         logger.error(f"Error incrementing view count: {str(e)}")
         return False
\ No newline at end of file
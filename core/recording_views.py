@@ -18,6 +18,9 @@ from core.recording_service import (
 )
 from core.zoom_service import get_meeting_recordings, is_zoom_configured
 from core.forms import RecordedSessionForm
+from core.profile_service import get_profile_or_404
+from core.counter_service import apply_pending_counts
+from core.search_service import search_queryset
 from core.s3_service import delete_file_from_s3
 
 # Set up logging
@@ -27,7 +30,7 @@ logger = logging.getLogger(__name__)
 def recordings_list(request):
     """List recorded sessions with filtering"""
     user = request.user
-    user_profile = get_object_or_404(UserProfile, user=user)
+    user_profile = get_profile_or_404(request)
     
     # Get filter parameters
     subject_id = request.GET.get('subject')
@@ -43,18 +46,15 @@ def recordings_list(request):
         recordings = recordings.filter(class_level=user_profile.class_level)
     elif user_profile.role == 'teacher':
         # Teachers can see recordings they uploaded OR recordings for classes they teach
-        teacher_classes = UserProfile.objects.filter(user=user).values_list('class_level', flat=True)
+        teacher_classes = [user_profile.class_level]
         recordings = recordings.filter(
             Q(uploaded_by=user) | Q(class_level__in=teacher_classes)
         )
     # Admins can see all recordings (no filtering needed)
     
-    # Apply search filters
+    # Apply search filters (full-text index, ranked; see search_service)
     if search_query:
-        recordings = recordings.filter(
-            Q(title__icontains=search_query) | 
-            Q(description__icontains=search_query)
-        )
+        recordings = search_queryset(recordings, search_query)
     
     # Apply subject filter
     if subject_id:
@@ -65,8 +65,10 @@ def recordings_list(request):
         recordings = recordings.filter(class_level=class_level)
     
     # Apply sorting based on user selection
-    sort_by = request.GET.get('sort', 'recent')
-    if sort_by == 'popular':
+    sort_by = request.GET.get('sort', 'relevance' if search_query else 'recent')
+    if sort_by == 'relevance' and search_query:
+        pass  # Already ordered by search rank
+    elif sort_by == 'popular':
         recordings = recordings.order_by('-views', '-recorded_date')
     elif sort_by == 'title':
         recordings = recordings.order_by('title')
@@ -74,7 +76,7 @@ def recordings_list(request):
         recordings = recordings.order_by('-recorded_date', '-upload_date')
     
     # Paginate results
-    paginator = Paginator(recordings, 12)  # 12 recordings per page
+    paginator = Paginator(recordings.defer('search_vector'), 12)  # 12 recordings per page
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
     
@@ -84,7 +86,7 @@ def recordings_list(request):
             class_assignments__class_level=user_profile.class_level
         ).distinct()
     elif user_profile.role == 'teacher':
-        class_levels = UserProfile.objects.filter(user=user).values_list('class_level', flat=True)
+        class_levels = [user_profile.class_level]
         subjects = Subject.objects.filter(
             class_assignments__class_level__in=class_levels
         ).distinct()
@@ -96,7 +98,7 @@ def recordings_list(request):
     if user_profile.role != 'student':
         if user_profile.role == 'teacher':
             class_levels = [(cl, dict(UserProfile.CLASS_CHOICES)[cl]) 
-                          for cl in UserProfile.objects.filter(user=user).values_list('class_level', flat=True)]
+                          for cl in [user_profile.class_level]]
         else:
             class_levels = UserProfile.CLASS_CHOICES
     
@@ -116,7 +118,7 @@ def recordings_list(request):
 def recording_detail(request, recording_id):
     """View details of a recorded session"""
     user = request.user
-    user_profile = get_object_or_404(UserProfile, user=user)
+    user_profile = get_profile_or_404(request)
     
     # Get recording and check permissions
     recording = get_object_or_404(RecordedSession, id=recording_id)
@@ -128,7 +130,7 @@ def recording_detail(request, recording_id):
     
     # Teachers can only access recordings they uploaded or for classes they teach
     if user_profile.role == 'teacher':
-        teacher_classes = UserProfile.objects.filter(user=user).values_list('class_level', flat=True)
+        teacher_classes = [user_profile.class_level]
         if recording.uploaded_by != user and recording.class_level not in teacher_classes:
             messages.error(request, "You don't have permission to view this recording.")
             return redirect('recordings_list')
@@ -139,12 +141,13 @@ def recording_detail(request, recording_id):
     # Increment view count (only on GET request to avoid double counting)
     if request.method == 'GET':
         increment_recording_view_count(recording_id)
+    apply_pending_counts(recording, 'views')
     
     # Get related recordings from the same subject
     related_recordings = RecordedSession.objects.filter(
         subject=recording.subject,
         class_level=recording.class_level
-    ).exclude(id=recording_id).order_by('-recorded_date')[:4]
+    ).exclude(id=recording_id).defer('search_vector').order_by('-recorded_date')[:4]
     
     context = {
         'recording': recording,
@@ -159,7 +162,7 @@ def recording_detail(request, recording_id):
 def upload_recording(request):
     """Upload a new recording"""
     user = request.user
-    user_profile = get_object_or_404(UserProfile, user=user)
+    user_profile = get_profile_or_404(request)
     
     # Only teachers and admins can upload recordings
     if user_profile.role == 'student':
@@ -175,7 +178,7 @@ def upload_recording(request):
             
             # Teachers can only upload for their assigned classes
             if user_profile.role == 'teacher':
-                teacher_classes = UserProfile.objects.filter(user=user).values_list('class_level', flat=True)
+                teacher_classes = [user_profile.class_level]
                 if recording.class_level not in teacher_classes:
                     messages.error(request, "You can only upload recordings for classes you teach.")
                     return redirect('recordings_list')
@@ -188,7 +191,7 @@ def upload_recording(request):
     
     # Get subjects for dropdown
     if user_profile.role == 'teacher':
-        class_levels = UserProfile.objects.filter(user=user).values_list('class_level', flat=True)
+        class_levels = [user_profile.class_level]
         subjects = Subject.objects.filter(
             class_assignments__class_level__in=class_levels
         ).distinct()
@@ -198,7 +201,7 @@ def upload_recording(request):
     # Get class levels for dropdown
     if user_profile.role == 'teacher':
         class_levels = [(cl, dict(UserProfile.CLASS_CHOICES)[cl]) 
-                      for cl in UserProfile.objects.filter(user=user).values_list('class_level', flat=True)]
+                      for cl in [user_profile.class_level]]
     else:
         class_levels = UserProfile.CLASS_CHOICES
     
@@ -214,7 +217,7 @@ def upload_recording(request):
 def edit_recording(request, recording_id):
     """Edit an existing recording"""
     user = request.user
-    user_profile = get_object_or_404(UserProfile, user=user)
+    user_profile = get_profile_or_404(request)
     
     # Get recording and check permissions
     recording = get_object_or_404(RecordedSession, id=recording_id)
@@ -230,7 +233,7 @@ def edit_recording(request, recording_id):
         if form.is_valid():
             # Teachers can only upload for their assigned classes
             if user_profile.role == 'teacher':
-                teacher_classes = UserProfile.objects.filter(user=user).values_list('class_level', flat=True)
+                teacher_classes = [user_profile.class_level]
                 if form.cleaned_data['class_level'] not in teacher_classes:
                     messages.error(request, "You can only upload recordings for classes you teach.")
                     context = {'form': form, 'recording': recording}
@@ -253,7 +256,7 @@ def edit_recording(request, recording_id):
 def delete_recording(request, recording_id):
     """Delete a recording"""
     user = request.user
-    user_profile = get_object_or_404(UserProfile, user=user)
+    user_profile = get_profile_or_404(request)
     
     # Get recording and check permissions
     recording = get_object_or_404(RecordedSession, id=recording_id)
@@ -286,7 +289,7 @@ def delete_recording(request, recording_id):
 def import_zoom_recording(request):
     """Import recording from Zoom cloud"""
     user = request.user
-    user_profile = get_object_or_404(UserProfile, user=user)
+    user_profile = get_profile_or_404(request)
     
     # Only teachers and admins can import recordings
     if user_profile.role == 'student':
@@ -327,7 +330,7 @@ def import_zoom_recording(request):
         
         # Teachers can only upload for their assigned classes
         if user_profile.role == 'teacher':
-            teacher_classes = UserProfile.objects.filter(user=user).values_list('class_level', flat=True)
+            teacher_classes = [user_profile.class_level]
             if class_level not in teacher_classes:
                 messages.error(request, "You can only import recordings for classes you teach.")
                 return redirect('import_zoom_recording')
@@ -350,7 +353,7 @@ def import_zoom_recording(request):
     
     # Get subjects for dropdown
     if user_profile.role == 'teacher':
-        class_levels = UserProfile.objects.filter(user=user).values_list('class_level', flat=True)
+        class_levels = [user_profile.class_level]
         subjects = Subject.objects.filter(
             class_assignments__class_level__in=class_levels
         ).distinct()
@@ -360,7 +363,7 @@ def import_zoom_recording(request):
     # Get class levels for dropdown
     if user_profile.role == 'teacher':
         class_levels = [(cl, dict(UserProfile.CLASS_CHOICES)[cl]) 
-                      for cl in UserProfile.objects.filter(user=user).values_list('class_level', flat=True)]
+                      for cl in [user_profile.class_level]]
     else:
         class_levels = UserProfile.CLASS_CHOICES
     
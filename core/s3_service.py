@@ -1,6 +1,8 @@
 import os
+import time
 import boto3
 import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from botocore.exceptions import ClientError
 import uuid
 
@@ -16,6 +18,14 @@ AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY', '')
 AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME', '4clearning-recordings')
 AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME', 'us-east-1')
 AWS_S3_SIGNATURE_VERSION = os.environ.get('AWS_S3_SIGNATURE_VERSION', 's3v4')
+# Set to use an S3-compatible server such as MinIO instead of AWS
+AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL') or None
+
+# Streamed uploads are sent in parts of this size, several parts in flight at once
+S3_MULTIPART_PART_SIZE = int(os.environ.get('S3_MULTIPART_PART_SIZE', str(16 * 1024 * 1024)))
+S3_MULTIPART_CONCURRENCY = int(os.environ.get('S3_MULTIPART_CONCURRENCY', '4'))
+# S3 rejects parts smaller than this, except the last one
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
 
 def get_s3_client():
     """
@@ -28,7 +38,8 @@ def get_s3_client():
         's3',
         aws_access_key_id=AWS_ACCESS_KEY_ID,
         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=AWS_S3_REGION_NAME
+        region_name=AWS_S3_REGION_NAME,
+        endpoint_url=AWS_S3_ENDPOINT_URL
     )
 
 def upload_file_to_s3(file_path, object_name=None, extra_args=None):
@@ -229,4 +240,205 @@ def list_s3_objects(prefix=None):
         return {
             'success': False,
             'error': str(e)
-        }
\ No newline at end of file
+        }
+
+def find_multipart_upload(s3_client, object_name):
+    """
+    Find an unfinished multipart upload of an object, to resume it
+    
+    Args:
+        s3_client (boto3.client): The S3 client
+        object_name (str): S3 object name
+        
+    Returns:
+        tuple: (upload ID, list of uploaded parts ordered by part number),
+        or (None, []) if there is no unfinished upload
+    """
+    response = s3_client.list_multipart_uploads(Bucket=AWS_STORAGE_BUCKET_NAME, Prefix=object_name)
+    uploads = [upload for upload in response.get('Uploads', []) if upload['Key'] == object_name]
+    if not uploads:
+        return None, []
+    upload_id = max(uploads, key=lambda upload: upload['Initiated'])['UploadId']
+    
+    parts = []
+    params = {'Bucket': AWS_STORAGE_BUCKET_NAME, 'Key': object_name, 'UploadId': upload_id}
+    while True:
+        response = s3_client.list_parts(**params)
+        parts.extend(response.get('Parts', []))
+        if not response.get('IsTruncated'):
+            break
+        params['PartNumberMarker'] = response['NextPartNumberMarker']
+    
+    return upload_id, sorted(parts, key=lambda part: part['PartNumber'])
+
+def upload_stream_to_s3(open_stream, object_name, extra_args=None, expected_size=None,
+                        part_size=S3_MULTIPART_PART_SIZE, concurrency=S3_MULTIPART_CONCURRENCY, progress=None):
+    """
+    Upload a stream of bytes to S3 as a multipart upload, without a local copy
+    
+    The stream is cut into parts of part_size bytes and up to `concurrency`
+    parts are uploaded at once, so at most (concurrency + 1) parts are held in
+    memory. If the upload is interrupted, the unfinished multipart upload is
+    left in S3 and the next call for the same object resumes after the parts
+    that were uploaded, asking open_stream for the remaining bytes only. A
+    bucket lifecycle rule should abort multipart uploads that are never
+    resumed.
+    
+    Args:
+        open_stream (callable): Called with a byte offset, returns an iterable of
+                                byte chunks from that offset to the end of the data
+        object_name (str): S3 object name; kept as is so the upload can be resumed
+        extra_args (dict, optional): Object settings such as ContentType and ACL
+        expected_size (int, optional): Size of the data; an object of this size
+                                       already in S3 is not uploaded again
+        part_size (int): Bytes per part, at least S3_MIN_PART_SIZE
+        concurrency (int): Parts uploaded at once
+        progress (callable, optional): Called with (bytes uploaded, expected_size) after each part
+        
+    Returns:
+        dict: Result with success status, file URL, size, the offset the
+        upload resumed from and throughput in MB/s
+    """
+    # If S3 credentials are missing, return error
+    if not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY:
+        return {
+            'success': False,
+            'error': 'AWS credentials are not configured'
+        }
+    
+    file_url = f"https://{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com/{object_name}"
+    bucket_key = {'Bucket': AWS_STORAGE_BUCKET_NAME, 'Key': object_name}
+    part_size = max(part_size, S3_MIN_PART_SIZE)
+    s3_client = get_s3_client()
+    start = time.perf_counter()
+    
+    # A previous attempt may have finished the upload before failing later on
+    if expected_size:
+        try:
+            head = s3_client.head_object(**bucket_key)
+            if head['ContentLength'] == expected_size:
+                return {
+                    'success': True,
+                    'object_name': object_name,
+                    'file_url': file_url,
+                    'size': expected_size,
+                    'resumed_from': expected_size,
+                    'throughput_mb_s': 0.0
+                }
+        except ClientError:
+            pass
+    
+    try:
+        # Resume after the leading run of full-size parts of an unfinished upload;
+        # parts after a gap are uploaded again
+        upload_id, uploaded_parts = find_multipart_upload(s3_client, object_name)
+        completed_parts = []
+        if upload_id:
+            if uploaded_parts and uploaded_parts[0]['Size'] >= S3_MIN_PART_SIZE:
+                part_size = uploaded_parts[0]['Size']
+            for number, part in enumerate(uploaded_parts, start=1):
+                if part['PartNumber'] != number or part['Size'] != part_size:
+                    break
+                completed_parts.append({'PartNumber': number, 'ETag': part['ETag']})
+            logger.info(f"Resuming upload of {object_name} after {len(completed_parts)} parts")
+        else:
+            upload_id = s3_client.create_multipart_upload(**bucket_key, **(extra_args or {}))['UploadId']
+    except ClientError as e:
+        logger.error(f"Error starting multipart upload to S3: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+    
+    resumed_from = len(completed_parts) * part_size
+    uploaded = resumed_from
+    
+    def upload_part(number, data):
+        response = s3_client.upload_part(**bucket_key, UploadId=upload_id, PartNumber=number, Body=data)
+        return {'PartNumber': number, 'ETag': response['ETag']}, len(data)
+    
+    def collect(done):
+        nonlocal uploaded
+        errors = [future.exception() for future in done if future.exception()]
+        for future in done:
+            if future.exception():
+                continue
+            part, size = future.result()
+            completed_parts.append(part)
+            uploaded += size
+            if progress:
+                progress(uploaded, expected_size)
+        if errors:
+            raise errors[0]
+    
+    # If every part was uploaded before completing failed (the data is a
+    # multiple of part_size), there is nothing left to read; asking the source
+    # for bytes past the end would only fail again
+    if expected_size is not None and resumed_from >= expected_size:
+        stream = ()
+    else:
+        stream = open_stream(resumed_from)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            in_flight = set()
+            number = len(completed_parts) + 1
+            buffer = bytearray()
+            
+            def submit(data):
+                nonlocal number, in_flight
+                if len(in_flight) >= concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight.add(executor.submit(upload_part, number, data))
+                number += 1
+            
+            try:
+                for chunk in stream:
+                    buffer += chunk
+                    while len(buffer) >= part_size:
+                        submit(bytes(buffer[:part_size]))
+                        del buffer[:part_size]
+                # The last part may be short; an empty one is only needed for empty data
+                if buffer or number == 1:
+                    submit(bytes(buffer))
+            finally:
+                # Even if the download failed, let the parts in flight finish
+                # so a resumed upload can keep them
+                done, in_flight = wait(in_flight)
+                collect(done)
+        
+        completed_parts.sort(key=lambda part: part['PartNumber'])
+        s3_client.complete_multipart_upload(
+            **bucket_key, UploadId=upload_id, MultipartUpload={'Parts': completed_parts}
+        )
+    except Exception as e:
+        logger.error(
+            f"Multipart upload of {object_name} interrupted after {uploaded} bytes, "
+            f"will resume on retry: {str(e)}"
+        )
+        return {
+            'success': False,
+            'error': str(e),
+            'bytes_uploaded': uploaded
+        }
+    finally:
+        close = getattr(stream, 'close', None)
+        if close:
+            close()
+    
+    elapsed = time.perf_counter() - start
+    throughput = (uploaded - resumed_from) / (1024 * 1024) / max(elapsed, 1e-6)
+    logger.info(
+        f"Uploaded {object_name}: {uploaded / (1024 * 1024):.1f} MB in {len(completed_parts)} parts, "
+        f"{elapsed:.1f}s, {throughput:.1f} MB/s"
+        + (f", resumed from {resumed_from} bytes" if resumed_from else "")
+    )
+    
+    return {
+        'success': True,
+        'object_name': object_name,
+        'file_url': file_url,
+        'size': uploaded,
+        'resumed_from': resumed_from,
+        'throughput_mb_s': round(throughput, 2)
+    }
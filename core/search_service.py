@@ -0,0 +1,180 @@
+import os
+import re
+import logging
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Q, F, Case, When, Value, FloatField
+from django.urls import reverse
+
+from core.models import StudyMaterial, RecordedSession, Assignment, Quiz
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Text search configuration used by the search_vector triggers (see migration 0015)
+SEARCH_CONFIG = 'english'
+SEARCH_MAX_TERMS = 10
+SEARCH_RESULTS_PER_TYPE = int(os.environ.get('SEARCH_RESULTS_PER_TYPE', '20'))
+
+# Title weight in the LIKE fallback ranking, mirroring weight A vs B on PostgreSQL
+FALLBACK_TITLE_RANK = 1.0
+FALLBACK_DESCRIPTION_RANK = 0.4
+
+
+def uses_full_text_search():
+    """Whether the database has tsvector search (PostgreSQL)"""
+    return connection.vendor == 'postgresql'
+
+
+def parse_search_terms(query):
+    """
+    Split a user query into search terms
+
+    Args:
+        query (str): Raw search text
+
+    Returns:
+        list: Lowercased word terms, at most SEARCH_MAX_TERMS
+    """
+    return [term.lower() for term in re.findall(r"\w+", query or '')][:SEARCH_MAX_TERMS]
+
+
+def build_prefix_query(terms):
+    """
+    Build a tsquery matching every term, the last one as a prefix
+
+    "photo synth" matches "photosynthesis"; earlier terms are matched as
+    whole (stemmed) words.
+
+    Args:
+        terms (list): Terms from parse_search_terms
+
+    Returns:
+        SearchQuery: Raw tsquery
+    """
+    parts = list(terms[:-1]) + [f"{terms[-1]}:*"]
+    return SearchQuery(' & '.join(parts), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_queryset(queryset, query):
+    """
+    Filter a queryset of a searchable model by a search query, best match first
+
+    Uses the search_vector GIN index on PostgreSQL, and case-insensitive
+    matching on title/description elsewhere (e.g. SQLite in tests).
+
+    Args:
+        queryset: QuerySet of StudyMaterial, RecordedSession, Assignment or Quiz
+        query (str): Raw search text
+
+    Returns:
+        QuerySet: Matching rows annotated with `rank`, ordered by rank; the
+        search_vector column itself is not loaded
+    """
+    terms = parse_search_terms(query)
+    if not terms:
+        return queryset.none()
+    queryset = queryset.defer('search_vector')
+
+    if uses_full_text_search():
+        tsquery = build_prefix_query(terms)
+        return queryset.filter(search_vector=tsquery).annotate(
+            rank=SearchRank(F('search_vector'), tsquery)
+        ).order_by('-rank', '-pk')
+
+    for term in terms:
+        queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+    return queryset.annotate(
+        rank=Case(
+            When(title__icontains=terms[0], then=Value(FALLBACK_TITLE_RANK)),
+            default=Value(FALLBACK_DESCRIPTION_RANK),
+            output_field=FloatField()
+        )
+    ).order_by('-rank', '-pk')
+
+
+def visible_materials(user, profile):
+    """Study materials the user may see (same rules as materials_list)"""
+    materials = StudyMaterial.objects.defer('search_vector')
+    if profile.role == 'student':
+        return materials.filter(class_level=profile.class_level)
+    if profile.role == 'teacher':
+        return materials.filter(Q(uploaded_by=user) | Q(class_level=profile.class_level))
+    return materials
+
+
+def visible_recordings(user, profile):
+    """Recorded sessions the user may see (same rules as recordings_list)"""
+    recordings = RecordedSession.objects.defer('search_vector')
+    if profile.role == 'student':
+        return recordings.filter(class_level=profile.class_level)
+    if profile.role == 'teacher':
+        return recordings.filter(Q(uploaded_by=user) | Q(class_level=profile.class_level))
+    return recordings
+
+
+def visible_assignments(user, profile):
+    """Assignments the user may see (same rules as assignments_list)"""
+    assignments = Assignment.objects.defer('search_vector')
+    if profile.role == 'student':
+        return assignments.filter(class_level=profile.class_level)
+    if profile.role == 'teacher':
+        return assignments.filter(created_by=user)
+    return assignments
+
+
+def visible_quizzes(user, profile):
+    """Quizzes the user may see (same rules as quizzes_list)"""
+    quizzes = Quiz.objects.defer('search_vector')
+    if profile.role == 'student':
+        return quizzes.filter(class_level=profile.class_level, is_active=True)
+    if profile.role == 'teacher':
+        return quizzes.filter(created_by=user)
+    return quizzes
+
+
+# Result type -> (visible queryset, detail URL name, URL argument)
+SEARCH_SOURCES = {
+    'material': (visible_materials, 'material_detail', 'pk'),
+    'recording': (visible_recordings, 'recording_detail', 'recording_id'),
+    'assignment': (visible_assignments, 'assignment_detail', 'pk'),
+    'quiz': (visible_quizzes, 'quiz_detail', 'quiz_id'),
+}
+
+
+def search_all(user, profile, query, types=None, limit=SEARCH_RESULTS_PER_TYPE):
+    """
+    Search every content type the user has access to
+
+    Args:
+        user (User): The user searching
+        profile (UserProfile): The user's profile, for class-level access rules
+        query (str): Raw search text
+        types (list, optional): Subset of SEARCH_SOURCES keys to search
+        limit (int): Maximum results per type
+
+    Returns:
+        list: Result dicts (type, id, title, description, class_level, url, rank), best first
+    """
+    results = []
+    for result_type, (visible, url_name, url_arg) in SEARCH_SOURCES.items():
+        if types and result_type not in types:
+            continue
+
+        rows = search_queryset(visible(user, profile), query).values(
+            'id', 'title', 'description', 'class_level', 'rank'
+        )[:limit]
+        for row in rows:
+            results.append({
+                'type': result_type,
+                'id': row['id'],
+                'title': row['title'],
+                'description': (row['description'] or '')[:200],
+                'class_level': row['class_level'],
+                'url': reverse(url_name, kwargs={url_arg: row['id']}),
+                'rank': float(row['rank']),
+            })
+
+    results.sort(key=lambda result: result['rank'], reverse=True)
+    return results
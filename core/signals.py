@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Subject, ClassSubject, UserProfile, UserSettings, Quiz, QuizQuestion
+from .ai_service import clear_system_prompt_cache
+from .profile_service import invalidate_user_context
+from .quiz_service import invalidate_quiz_questions, update_pass_count
+from .question_bank_service import request_bank_fill, QUESTION_BANK_DIFFICULTIES
+
+
+@receiver([post_save, post_delete], sender=Subject)
+@receiver([post_save, post_delete], sender=ClassSubject)
+def invalidate_system_prompts(sender, **kwargs):
+    """Subject names and class curricula are baked into the memoized AI system prompts"""
+    clear_system_prompt_cache()
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+@receiver([post_save, post_delete], sender=UserSettings)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    """Drop the per-user entry loaded by UserProfileMiddleware"""
+    user_id = instance.user_id
+    invalidate_user_context(user_id)
+    # Also after commit, in case a concurrent request re-cached the old row
+    transaction.on_commit(lambda: invalidate_user_context(user_id))
+
+
+@receiver([post_save, post_delete], sender=QuizQuestion)
+def invalidate_quiz_question_caches(sender, instance, **kwargs):
+    """Drop the cached answer key used for scoring and the question bundle used by quiz_take"""
+    quiz_id = instance.quiz_id
+    invalidate_quiz_questions(quiz_id)
+    # Also after commit, in case a concurrent request re-cached the old questions
+    transaction.on_commit(lambda: invalidate_quiz_questions(quiz_id))
+
+
+@receiver(post_save, sender=Quiz)
+def recount_quiz_passes(sender, instance, created, **kwargs):
+    """QuizStats.pass_count depends on the passing score"""
+    if not created:
+        update_pass_count(instance)
+
+
+@receiver(post_save, sender=ClassSubject)
+def fill_new_question_banks(sender, instance, created, **kwargs):
+    """Generate practice questions for a subject as soon as it is assigned to a class"""
+    # Fixtures being loaded are not new assignments
+    if not created or kwargs.get('raw'):
+        return
+    subject_id, class_level = instance.subject_id, instance.class_level
+
+    def fill():
+        for difficulty in QUESTION_BANK_DIFFICULTIES:
+            request_bank_fill(subject_id, class_level, difficulty)
+    transaction.on_commit(fill)
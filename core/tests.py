@@ -0,0 +1,823 @@
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from botocore.exceptions import ClientError
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import counter_service, job_queue
+from core.ai_service import AIStreamError
+from core.bulk_email_service import OutgoingEmail, EmailOutcome
+from core.counter_service import increment_counter, apply_pending_counts, flush_counters
+from core.item_analysis_service import load_response_matrix
+from core.login_notification_service import login_notification_stats
+from core.job_queue import JobRetry, MemoryBroker, RedisBroker, Worker, job
+from core.jobs import fill_question_bank, process_conference_recordings, send_login_notification
+from core.outbox_service import queue_emails, dispatch_batch
+from core.question_bank_service import fill_lock_key, question_fingerprint, sample_practice_questions
+from core.quiz_service import get_answer_key, rescore_quiz, score_attempt, expire_attempts
+from core.recording_service import increment_recording_view_count
+from core.s3_service import upload_stream_to_s3, S3_MIN_PART_SIZE
+from core.weekly_summary_service import send_weekly_summaries
+from core.zoom_service import stream_recording
+from core.models import (
+    UserProfile, Subject, ClassSubject, Assignment, AssignmentSubmission, StudyMaterial,
+    VideoConference, VideoConferenceParticipant, Quiz, QuizQuestion, QuizAttempt, QuizResponse,
+    QuizStats, AITutorSession, AITutorMessage, EmailOutbox, PracticeQuestion, RecordedSession
+)
+
+# Rows created of each kind, so a per-row query shows up in the counts
+ROWS = 3
+
+
+async def read_stream(response):
+    """Body of an async StreamingHttpResponse"""
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+class QueryCountTestCase(TestCase):
+    """
+    Query counts of the main pages with a warm profile cache
+
+    Every request starts with two queries for the session and the user. The
+    profile and settings come from the cache filled by UserProfileMiddleware
+    on the first request, so they are not counted.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = cls.create_user('teacher', 'teacher')
+        cls.student = cls.create_user('student', 'student')
+        cls.admin = cls.create_user('admin', 'admin')
+
+        now = timezone.now()
+        for i in range(ROWS):
+            subject = Subject.objects.create(name=f"Subject {i}")
+            ClassSubject.objects.create(subject=subject, class_level='7')
+
+            assignment = Assignment.objects.create(
+                title=f"Assignment {i}",
+                description="Read the chapter",
+                instructions="Answer the questions at the end",
+                subject=subject,
+                class_level='7',
+                created_by=cls.teacher,
+                due_date=now + timedelta(days=i + 1),
+            )
+            AssignmentSubmission.objects.create(
+                assignment=assignment,
+                student=cls.student,
+                submission_text="My answer",
+            )
+            StudyMaterial.objects.create(
+                title=f"Material {i}",
+                description="Notes",
+                subject=subject,
+                class_level='7',
+                uploaded_by=cls.teacher,
+                file_type='pdf',
+            )
+            VideoConference.objects.create(
+                title=f"Class {i}",
+                subject=subject,
+                class_level='7',
+                scheduled_by=cls.teacher,
+                platform='meet',
+                meeting_link='https://meet.example.com/abc',
+                start_time=now + timedelta(days=i + 1),
+                end_time=now + timedelta(days=i + 1, hours=1),
+            )
+            Quiz.objects.create(
+                title=f"Quiz {i}",
+                subject=subject,
+                class_level='7',
+                created_by=cls.teacher,
+                is_active=True,
+            )
+
+    @classmethod
+    def create_user(cls, username, role):
+        user = User.objects.create_user(username, f'{username}@example.com', 'password')
+        UserProfile.objects.create(user=user, role=role, class_level='7')
+        return user
+
+    def setUp(self):
+        cache.clear()
+
+    def assertQueriesPerRequest(self, user, url, expected):
+        """Request a page twice and check the queries of the second request"""
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+
+class DashboardQueryTests(QueryCountTestCase):
+
+    def test_student_dashboard(self):
+        self.assertQueriesPerRequest(self.student, '/dashboard/', 9)
+
+    def test_teacher_dashboard(self):
+        self.assertQueriesPerRequest(self.teacher, '/dashboard/', 10)
+
+    def test_admin_dashboard(self):
+        self.assertQueriesPerRequest(self.admin, '/dashboard/', 4)
+
+
+class ListQueryTests(QueryCountTestCase):
+
+    def test_quizzes_list(self):
+        self.assertQueriesPerRequest(self.student, '/quizzes/', 5)
+        self.assertQueriesPerRequest(self.teacher, '/quizzes/', 5)
+
+    def test_video_conferences_list(self):
+        self.assertQueriesPerRequest(self.student, '/video-conferences/', 5)
+        self.assertQueriesPerRequest(self.teacher, '/video-conferences/', 5)
+
+    def test_materials_list(self):
+        self.assertQueriesPerRequest(self.student, '/materials/', 5)
+
+    def test_assignments_list(self):
+        self.assertQueriesPerRequest(self.student, '/assignments/', 5)
+
+    def test_recordings_list(self):
+        self.assertQueriesPerRequest(self.student, '/recordings/', 4)
+
+
+class SearchVectorTests(QueryCountTestCase):
+    """List pages never select the search_vector column"""
+
+    def assertSearchVectorNotLoaded(self, user, url):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        loaded = [query['sql'] for query in captured.captured_queries if 'search_vector' in query['sql']]
+        self.assertEqual(loaded, [])
+
+    def test_dashboards(self):
+        for user in (self.student, self.teacher, self.admin):
+            self.assertSearchVectorNotLoaded(user, '/dashboard/')
+
+    def test_lists(self):
+        for url in ('/materials/', '/assignments/', '/quizzes/', '/recordings/'):
+            self.assertSearchVectorNotLoaded(self.student, url)
+            self.assertSearchVectorNotLoaded(self.teacher, url)
+
+    def test_searches(self):
+        for url in ('/materials/?q=material', '/recordings/?search=class', '/search/?q=subject'):
+            self.assertSearchVectorNotLoaded(self.student, url)
+
+
+class AITutorQueryTests(QueryCountTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        session = AITutorSession.objects.create(student=cls.student)
+        for i in range(ROWS):
+            AITutorMessage.objects.create(session=session, message_type='question', content=f"Question {i}")
+            AITutorMessage.objects.create(session=session, message_type='answer', content=f"Answer {i}")
+
+    def test_chat_page(self):
+        self.assertQueriesPerRequest(self.student, '/ai-tutor/', 5)
+
+    def test_history_page(self):
+        self.assertQueriesPerRequest(self.student, '/ai-tutor/history/', 4)
+
+    def test_chat_answer_does_not_load_the_profile(self):
+        self.client.force_login(self.student)
+        self.client.get('/ai-tutor/')
+
+        with mock.patch('core.views.aget_ai_response', return_value="An answer"), \
+                self.assertNumQueries(9):
+            response = self.client.post('/ai-tutor/ajax-chat/', {'question': "What is a cell?"})
+        self.assertEqual(response.json()['response'], "An answer")
+
+    def test_failed_stream_is_not_saved(self):
+        async def failing_stream(**kwargs):
+            yield "A partial"
+            raise AIStreamError("boom")
+
+        self.client.force_login(self.student)
+        with mock.patch('core.views.stream_ai_response', failing_stream):
+            response = self.client.post('/ai-tutor/ajax-chat/stream/', {'question': "What is a cell?"})
+            body = async_to_sync(read_stream)(response).decode()
+
+        self.assertIn('event: error', body)
+        self.assertNotIn('event: done', body)
+        self.assertFalse(AITutorMessage.objects.filter(content__startswith="A partial").exists())
+
+
+class ConferenceNotificationTests(TestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        UserProfile.objects.create(user=self.teacher, role='teacher', class_level='7')
+        self.student = User.objects.create_user('student', 'student@example.com', 'password')
+        UserProfile.objects.create(user=self.student, role='student', class_level='7')
+        self.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        self.conference = VideoConference.objects.create(
+            title="Class",
+            subject=Subject.objects.create(name="Science"),
+            class_level='7',
+            scheduled_by=self.teacher,
+            platform='meet',
+            meeting_link='https://meet.example.com/abc',
+            start_time=self.start,
+            end_time=self.start + timedelta(hours=1),
+        )
+        VideoConferenceParticipant.objects.create(conference=self.conference, user=self.student)
+        self.client.force_login(self.teacher)
+
+    def edit(self, start, revision):
+        return self.client.post(f'/video-conferences/{self.conference.pk}/edit/', {
+            'title': "Class",
+            'subject': self.conference.subject_id,
+            'class_level': '7',
+            'platform': 'meet',
+            'meeting_link': 'https://meet.example.com/abc',
+            'start_time': timezone.localtime(start).strftime('%Y-%m-%dT%H:%M'),
+            'end_time': timezone.localtime(start + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+            'revision': revision,
+        })
+
+    def test_moving_back_notifies_again(self):
+        moved = self.start + timedelta(hours=2)
+        self.edit(moved, 0)
+        self.edit(moved + timedelta(hours=2), 1)
+        self.edit(moved, 2)
+        self.assertEqual(EmailOutbox.objects.filter(to_email='student@example.com').count(), 3)
+
+    def test_recording_email_links_to_the_conference_page(self):
+        s3_url = 'https://bucket.s3.amazonaws.com/recordings/1.mp4'
+        with mock.patch('core.zoom_service.download_recording_to_s3',
+                        return_value={'success': True, 'recording_url': s3_url}):
+            process_conference_recordings(self.conference.pk)
+
+        email = EmailOutbox.objects.get(to_email='student@example.com')
+        self.assertIn(f'/video-conferences/{self.conference.pk}/', email.html_content)
+        self.assertNotIn(s3_url, email.html_content)
+
+    def test_resubmitted_form_notifies_once(self):
+        self.edit(self.start + timedelta(hours=2), 0)
+        self.edit(self.start + timedelta(hours=2), 0)
+        self.assertEqual(EmailOutbox.objects.filter(to_email='student@example.com').count(), 1)
+        self.conference.refresh_from_db()
+        self.assertEqual(self.conference.revision, 1)
+
+
+class OutboxTests(TestCase):
+
+    def queue_reminder(self, *addresses):
+        return queue_emails('reminder:1', [OutgoingEmail(address, "Reminder", "<p>Hi</p>") for address in addresses])
+
+    def test_same_key_is_queued_once(self):
+        self.assertEqual(self.queue_reminder('a@example.com', 'b@example.com'), 2)
+        self.assertEqual(self.queue_reminder('A@example.com', 'c@example.com'), 1)
+
+        self.assertEqual(EmailOutbox.objects.count(), 3)
+
+    def test_dispatch_sends_each_email_once(self):
+        self.queue_reminder('a@example.com', 'b@example.com')
+        connection = mail.get_connection()
+
+        self.assertEqual(dispatch_batch(connection=connection), {'claimed': 2, 'sent': 2, 'failed': 0})
+        self.assertEqual(dispatch_batch(connection=connection), {'claimed': 0, 'sent': 0, 'failed': 0})
+
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['a@example.com', 'b@example.com'])
+        self.assertFalse(EmailOutbox.objects.exclude(status='sent').exists())
+
+    def test_failed_email_is_retried_later(self):
+        self.queue_reminder('a@example.com')
+        outcome = EmailOutcome('a@example.com', False, 'smtp', "Connection refused")
+
+        with mock.patch('core.outbox_service.send_bulk_email', return_value=[outcome]):
+            self.assertEqual(dispatch_batch(), {'claimed': 1, 'sent': 0, 'failed': 0})
+        # Not due yet
+        self.assertEqual(dispatch_batch()['claimed'], 0)
+
+        row = EmailOutbox.objects.get()
+        self.assertEqual((row.status, row.attempts, row.last_error), ('pending', 1, "Connection refused"))
+        self.assertGreater(row.next_attempt_at, timezone.now())
+
+
+class WeeklySummaryTests(TestCase):
+
+    def test_summaries_are_queued_once_a_week(self):
+        for name in ('ann', 'bob'):
+            user = User.objects.create_user(name, f'{name}@example.com', 'password')
+            UserProfile.objects.create(user=user, role='student', class_level='7')
+
+        self.assertEqual(send_weekly_summaries(), {'students': 2, 'queued': 2})
+        self.assertEqual(send_weekly_summaries(), {'students': 2, 'queued': 0})
+
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=7)):
+            self.assertEqual(send_weekly_summaries()['queued'], 2)
+        self.assertEqual(EmailOutbox.objects.count(), 4)
+
+
+class LoginNotificationTests(TestCase):
+
+    @mock.patch('core.login_notification_service.login_notifications_enabled', return_value=False)
+    @mock.patch('core.email_service.send_user_login_notification')
+    def test_opted_out_user_is_counted_as_skipped(self, send_user_login_notification, enabled):
+        user = User.objects.create_user('ann', 'ann@example.com', 'password')
+        before = login_notification_stats()
+
+        result = send_login_notification(user.pk, timezone.now().isoformat(), '127.0.0.1', 'Browser')
+
+        self.assertEqual(result, {'sent': False})
+        send_user_login_notification.assert_not_called()
+        after = login_notification_stats()
+        self.assertEqual((after['skipped'] - before['skipped'], after['sent'] - before['sent']), (1, 0))
+
+
+class QuizTestCase(TestCase):
+    """A two-question quiz (answers a, b) and a student to attempt it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        UserProfile.objects.create(user=cls.teacher, role='teacher', class_level='7')
+        cls.student = User.objects.create_user('student', 'student@example.com', 'password')
+        UserProfile.objects.create(user=cls.student, role='student', class_level='7')
+        cls.quiz = Quiz.objects.create(
+            title="Cells",
+            subject=Subject.objects.create(name="Biology"),
+            class_level='7',
+            created_by=cls.teacher,
+            is_active=True,
+        )
+        cls.questions = [
+            QuizQuestion.objects.create(
+                quiz=cls.quiz, question_number=number, question_text=f"Question {number}",
+                option_a="A", option_b="B", correct_option=correct
+            )
+            for number, correct in ((1, 'a'), (2, 'b'))
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def create_attempt(self, deadline=None, completed=False, late=(), **options):
+        """
+        An attempt with a response per `q<number>=<option>` keyword
+
+        Responses to the question numbers in `late` are saved after the deadline.
+        """
+        now = timezone.now()
+        attempt = QuizAttempt.objects.create(
+            quiz=self.quiz, student=self.student, started_at=now - timedelta(minutes=10),
+            deadline=deadline, completed=completed, completed_at=now if completed else None,
+        )
+        for question in self.questions:
+            option = options.get(f'q{question.question_number}')
+            if option:
+                saved_at = now - timedelta(minutes=5)
+                if question.question_number in late:
+                    saved_at = deadline + timedelta(seconds=30)
+                QuizResponse.objects.create(
+                    attempt=attempt, question=question, selected_option=option, saved_at=saved_at
+                )
+        return attempt
+
+
+class AnswerKeyTests(QuizTestCase):
+
+    def test_answer_key_is_cached(self):
+        answer_key = get_answer_key(self.quiz.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_answer_key(self.quiz.pk), answer_key)
+        self.assertEqual(answer_key.correct_options, ('a', 'b'))
+
+    def test_editing_a_question_drops_the_cached_key(self):
+        get_answer_key(self.quiz.pk)
+        question = self.questions[1]
+        question.correct_option = 'a'
+        question.save()
+
+        self.assertEqual(get_answer_key(self.quiz.pk).correct_options, ('a', 'a'))
+
+    def test_rescore_uses_the_corrected_key(self):
+        attempt = self.create_attempt(completed=True, q1='a', q2='a')
+        rescore_quiz(self.quiz.pk)
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 50)
+
+        # A bulk update sends no signals, so only rescore_quiz drops the cached key
+        QuizQuestion.objects.filter(pk=self.questions[1].pk).update(correct_option='a')
+        self.assertEqual(rescore_quiz(self.quiz.pk), 1)
+
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 100)
+        self.assertEqual(get_answer_key(self.quiz.pk).correct_options, ('a', 'a'))
+
+
+class CompletionTests(QuizTestCase):
+
+    def test_double_submit_completes_once(self):
+        attempt = self.create_attempt(q1='a', q2='b')
+        self.client.force_login(self.student)
+
+        first = self.client.post('/quiz/submit/', {'attempt_id': attempt.pk})
+        second = self.client.post('/quiz/submit/', {'attempt_id': attempt.pk})
+
+        self.assertEqual(first.json()['score'], 100)
+        self.assertFalse(second.json()['success'])
+        stats = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual((stats.completions, stats.score_sum), (1, 100))
+
+    def test_expired_attempts_are_submitted_once(self):
+        deadline = timezone.now() - timedelta(minutes=2)
+        expired = self.create_attempt(deadline=deadline, q1='a', q2='a')
+        open_attempt = self.create_attempt(deadline=timezone.now() + timedelta(hours=1), q1='a')
+
+        self.assertEqual(expire_attempts(), 1)
+        self.assertEqual(expire_attempts(), 0)
+
+        expired.refresh_from_db()
+        self.assertEqual((expired.completed, expired.score, expired.completed_at), (True, 50, deadline))
+        open_attempt.refresh_from_db()
+        self.assertFalse(open_attempt.completed)
+        self.assertEqual(QuizStats.objects.get(quiz=self.quiz).completions, 1)
+
+
+class DeadlineTests(QuizTestCase):
+
+    def test_late_response_is_not_scored(self):
+        attempt = self.create_attempt(deadline=timezone.now() - timedelta(minutes=1), late=(2,), q1='a', q2='b')
+
+        self.assertEqual(score_attempt(attempt), 50)
+
+    def test_late_response_is_not_rescored(self):
+        deadline = timezone.now() - timedelta(minutes=1)
+        attempt = self.create_attempt(deadline=deadline, completed=True, late=(2,), q1='a', q2='b')
+
+        rescore_quiz(self.quiz.pk)
+
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 50)
+
+    def test_answers_after_the_deadline_are_refused(self):
+        attempt = self.create_attempt(deadline=timezone.now() - timedelta(minutes=1))
+        self.client.force_login(self.student)
+
+        response = self.client.post('/quiz/save-responses/', {
+            'attempt_id': attempt.pk, 'responses': {str(self.questions[0].pk): 'a'},
+        }, content_type='application/json')
+
+        self.assertFalse(response.json()['success'])
+        self.assertFalse(QuizResponse.objects.filter(attempt=attempt).exists())
+
+    def test_late_submit_is_closed_at_the_deadline(self):
+        deadline = timezone.now() - timedelta(minutes=1)
+        attempt = self.create_attempt(deadline=deadline, late=(2,), q1='a', q2='b')
+        self.client.force_login(self.student)
+
+        response = self.client.post('/quiz/submit/', {'attempt_id': attempt.pk})
+
+        self.assertFalse(response.json()['success'])
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.completed, attempt.score, attempt.completed_at), (True, 50, deadline))
+
+
+class ItemAnalysisTests(QuizTestCase):
+
+    def test_late_responses_are_not_analysed(self):
+        deadline = timezone.now() - timedelta(minutes=1)
+        self.create_attempt(deadline=deadline, completed=True, late=(2,), q1='a', q2='b')
+        self.create_attempt(completed=True)
+
+        matrix = load_response_matrix(self.quiz.pk, tuple(question.pk for question in self.questions))
+
+        self.assertEqual(sorted(matrix.tolist()), [[0, 0], [1, 0]])
+
+
+class SaveResponsesTests(QuizTestCase):
+
+    def test_malformed_options_are_rejected(self):
+        attempt = self.create_attempt()
+        first, second = self.questions
+        self.client.force_login(self.student)
+
+        response = self.client.post('/quiz/save-responses/', {
+            'attempt_id': attempt.pk,
+            'responses': {str(first.pk): ['a'], str(second.pk): 'b'},
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'success': True, 'saved': 1, 'rejected': [first.pk]})
+
+
+class CounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        cls.material = StudyMaterial.objects.create(
+            title="Cells", description="Notes", subject=Subject.objects.create(name="Biology"),
+            class_level='7', uploaded_by=teacher, file_type='pdf',
+        )
+
+    def setUp(self):
+        cache.clear()
+        # A buffer of our own, without the background flush thread
+        buffer = counter_service.MemoryCounterBuffer()
+        buffer.ensure_thread = mock.Mock()
+        patcher = mock.patch.object(counter_service, '_buffer', buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def views_in_database(self):
+        return StudyMaterial.objects.values_list('views', flat=True).get(pk=self.material.pk)
+
+    def test_increments_are_buffered(self):
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                increment_counter(StudyMaterial, self.material.pk, 'views')
+
+        self.assertEqual(self.views_in_database(), 0)
+        self.assertEqual(apply_pending_counts(self.material, 'views').views, 3)
+
+    def test_flushing_twice_counts_once(self):
+        for _ in range(3):
+            increment_counter(StudyMaterial, self.material.pk, 'views')
+
+        self.assertEqual(flush_counters(), 1)
+        self.assertEqual(flush_counters(), 0)
+
+        self.assertEqual(self.views_in_database(), 3)
+        self.assertEqual(apply_pending_counts(StudyMaterial.objects.get(pk=self.material.pk), 'views').views, 3)
+
+    def test_failed_flush_is_retried_with_new_increments(self):
+        increment_counter(StudyMaterial, self.material.pk, 'views')
+        with mock.patch('core.counter_service.transaction.atomic', side_effect=DatabaseError), \
+                self.assertLogs('core.counter_service', 'ERROR'):
+            self.assertEqual(flush_counters(), 0)
+        increment_counter(StudyMaterial, self.material.pk, 'views')
+
+        flush_counters()
+
+        self.assertEqual(self.views_in_database(), 2)
+
+    def test_unknown_recording_is_not_counted(self):
+        recording = RecordedSession.objects.create(
+            title="Cells", subject=self.material.subject, class_level='7', recording_url='https://example.com/cells',
+            uploaded_by=self.material.uploaded_by, recorded_date=timezone.now().date(),
+        )
+
+        self.assertTrue(increment_recording_view_count(recording.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(increment_recording_view_count(recording.pk))
+        self.assertFalse(increment_recording_view_count(recording.pk + 1))
+
+        self.assertEqual(apply_pending_counts(recording, 'views').views, 2)
+        self.assertEqual(counter_service.get_counter_buffer().keys(), {'core.recordedsession:views'})
+        self.assertEqual(flush_counters(), 1)
+
+
+class QuestionBankTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.subject = Subject.objects.create(name="Biology")
+        for number in (1, 2):
+            text = f"Question {number}"
+            PracticeQuestion.objects.create(
+                subject=cls.subject, class_level='7', difficulty='easy',
+                question=text, answer="Answer", fingerprint=question_fingerprint(text)
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch('core.question_bank_service.request_bank_fill')
+    def test_low_bank_is_filled(self, request_bank_fill):
+        self.assertEqual(len(sample_practice_questions(None, self.subject.pk, '7', 'easy', 1)), 1)
+
+        request_bank_fill.assert_called_once_with(self.subject.pk, '7', 'easy')
+
+    @mock.patch('core.question_bank_service.QUESTION_BANK_MAX', 2)
+    @mock.patch('core.question_bank_service.request_bank_fill')
+    def test_full_bank_is_not_filled(self, request_bank_fill):
+        self.assertEqual(len(sample_practice_questions(None, self.subject.pk, '7', 'easy', 1)), 1)
+
+        request_bank_fill.assert_not_called()
+
+    def test_fill_that_adds_nothing_keeps_the_lock(self):
+        lock_key = fill_lock_key(self.subject.pk, '7', 'easy')
+        cache.set(lock_key, 1)
+
+        with mock.patch('core.question_bank_service.fill_bank', return_value=0), \
+                self.assertLogs('core.jobs', 'WARNING'):
+            fill_question_bank(self.subject.pk, '7', 'easy')
+        self.assertTrue(cache.get(lock_key))
+
+        with mock.patch('core.question_bank_service.fill_bank', return_value=3):
+            fill_question_bank(self.subject.pk, '7', 'easy')
+        self.assertIsNone(cache.get(lock_key))
+
+
+class FakeRedis:
+    """Just enough of a Redis client for RedisBroker; keys never expire"""
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def sadd(self, key, member):
+        self.data.setdefault(key, set()).add(member)
+
+    def srem(self, key, member):
+        self.data.get(key, set()).discard(member)
+
+    def smembers(self, key):
+        return set(self.data.get(key, ()))
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def expire(self, key, seconds):
+        pass
+
+    def lpush(self, key, value):
+        self.data.setdefault(key, []).insert(0, value)
+
+    def lrem(self, key, count, value):
+        if value in self.data.get(key, ()):
+            self.data[key].remove(value)
+
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, ()))
+
+    def lmove(self, source, destination, wherefrom='RIGHT', whereto='LEFT'):
+        if not self.data.get(source):
+            return None
+        value = self.data[source].pop()
+        self.lpush(destination, value)
+        return value
+
+    def blmove(self, source, destination, timeout, wherefrom='RIGHT', whereto='LEFT'):
+        return self.lmove(source, destination)
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def zrem(self, key, member):
+        return int(self.data.get(key, {}).pop(member, None) is not None)
+
+    def zrangebyscore(self, key, low, high, start=None, num=None):
+        return [member for member, score in self.data.get(key, {}).items() if low <= score <= high]
+
+
+class FakePipeline:
+    """Queues commands and runs them on execute()"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.commands.append((getattr(self.redis, name), args, kwargs))
+        return command
+
+    def execute(self):
+        return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+class JobQueueTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(job_queue.JOBS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.redis = FakeRedis()
+
+    def redis_broker(self):
+        with mock.patch('redis.Redis.from_url', return_value=self.redis):
+            return RedisBroker('redis://localhost')
+
+    def queue_job(self, broker, job_id):
+        broker.push({
+            'id': job_id, 'name': 'noop', 'args': [], 'kwargs': {}, 'status': job_queue.QUEUED,
+            'attempts': 0, 'max_attempts': 1,
+        })
+
+    @mock.patch('core.job_queue.retry_delay', return_value=0)
+    def test_failed_attempt_is_retried(self, retry_delay):
+        calls = []
+
+        @job(name='flaky', max_attempts=3)
+        def flaky():
+            calls.append(1)
+            if len(calls) < 2:
+                raise JobRetry("try again")
+            return 'done'
+
+        broker = MemoryBroker(start_thread=False)
+        with mock.patch('core.job_queue.get_broker', return_value=broker):
+            job_id = job_queue.enqueue(flaky)
+        with self.assertLogs('core.job_queue', 'WARNING'):
+            Worker(broker).run(burst=True, poll_timeout=0)
+
+        record = broker.get(job_id)
+        self.assertEqual((record['status'], record['attempts'], record['result']), (job_queue.SUCCEEDED, 2, 'done'))
+
+    def test_job_fails_after_its_last_attempt(self):
+        @job(name='broken', max_attempts=1)
+        def broken():
+            raise ValueError("broken")
+
+        broker = MemoryBroker(start_thread=False)
+        with mock.patch('core.job_queue.get_broker', return_value=broker):
+            job_id = job_queue.enqueue(broken)
+        with self.assertLogs('core.job_queue', 'ERROR'):
+            Worker(broker).run(burst=True, poll_timeout=0)
+
+        self.assertEqual(broker.get(job_id)['status'], job_queue.FAILED)
+        self.assertEqual(broker.pending_count(), 0)
+
+    def test_taken_job_stays_in_the_processing_list_until_acked(self):
+        broker = self.redis_broker()
+        self.queue_job(broker, 'job1')
+
+        self.assertEqual(broker.pop(timeout=0), 'job1')
+        self.assertEqual(self.redis.lrange(broker.processing_key, 0, -1), ['job1'])
+
+        broker.ack('job1')
+        self.assertEqual(self.redis.lrange(broker.processing_key, 0, -1), [])
+
+    def test_dead_workers_jobs_are_recovered(self):
+        dead, alive, sweeper = self.redis_broker(), self.redis_broker(), self.redis_broker()
+        for job_id in ('job1', 'job2'):
+            self.queue_job(dead, job_id)
+        dead.heartbeat()
+        alive.heartbeat()
+        dead.pop(timeout=0)
+        alive.pop(timeout=0)
+
+        self.assertEqual(sweeper.recover(), 0)
+
+        # The dead worker's heartbeat key expires
+        self.redis.delete(dead.heartbeat_key(dead.worker_id))
+        self.assertEqual(sweeper.recover(), 1)
+
+        self.assertEqual(self.redis.lrange(dead.queue_key, 0, -1), ['job1'])
+        self.assertEqual(self.redis.lrange(alive.processing_key, 0, -1), ['job2'])
+        self.assertEqual(self.redis.smembers(dead.workers_key), {alive.worker_id})
+
+
+@mock.patch.multiple('core.s3_service', AWS_ACCESS_KEY_ID='key', AWS_SECRET_ACCESS_KEY='secret')
+class RecordingUploadTests(TestCase):
+
+    def test_upload_with_every_part_sent_is_completed_without_reading(self):
+        s3_client = mock.Mock()
+        s3_client.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        s3_client.list_multipart_uploads.return_value = {
+            'Uploads': [{'Key': 'recording.mp4', 'UploadId': 'upload', 'Initiated': 1}]
+        }
+        s3_client.list_parts.return_value = {'Parts': [
+            {'PartNumber': number, 'Size': S3_MIN_PART_SIZE, 'ETag': f'etag{number}'} for number in (1, 2)
+        ]}
+        open_stream = mock.Mock(side_effect=AssertionError("nothing is left to read"))
+
+        with mock.patch('core.s3_service.get_s3_client', return_value=s3_client):
+            result = upload_stream_to_s3(
+                open_stream, 'recording.mp4', expected_size=2 * S3_MIN_PART_SIZE, part_size=S3_MIN_PART_SIZE
+            )
+
+        self.assertTrue(result['success'])
+        open_stream.assert_not_called()
+        parts = s3_client.complete_multipart_upload.call_args.kwargs['MultipartUpload']['Parts']
+        self.assertEqual([part['PartNumber'] for part in parts], [1, 2])
+
+    def test_range_past_the_end_is_an_empty_stream(self):
+        response = mock.MagicMock(status_code=416)
+        response.__enter__.return_value = response
+        response.raise_for_status.side_effect = AssertionError("416 is not an error here")
+
+        with mock.patch('core.zoom_service.requests.get', return_value=response):
+            self.assertEqual(list(stream_recording('https://zoom.example.com/rec', offset=100)), [])
@@ -19,6 +19,7 @@ urlpatterns = [
     path('settings/', views.user_settings, name='user_settings'),
     
     # Study Materials
+    path('search/', views.search_view, name='search'),
     path('materials/', views.materials_list, name='materials_list'),
     path('materials/<int:pk>/', views.material_detail, name='material_detail'),
     path('materials/<int:pk>/download/', views.material_download, name='material_download'),
@@ -36,6 +37,7 @@ urlpatterns = [
     path('video-conferences/api/get-signature/<int:meeting_id>/', views.get_zoom_signature, name='get_zoom_signature'),
     path('video-conferences/create-server-to-server/', views.server_to_server_meeting, name='server_to_server_meeting'),
     path('video-conferences/process-recordings/<str:meeting_id>/', views.process_meeting_recordings, name='process_recordings'),
+    path('jobs/<str:job_id>/', views.job_status, name='job_status'),
     
     # Recorded Sessions
     path('recordings/', recording_views.recordings_list, name='recordings_list'),
@@ -55,6 +57,7 @@ urlpatterns = [
     # AI Tutor
     path('ai-tutor/', views.ai_tutor_chat, name='ai_tutor_chat'),
     path('ai-tutor/ajax-chat/', views.ajax_ai_chat_view, name='ajax_ai_chat'),
+    path('ai-tutor/ajax-chat/stream/', views.ajax_ai_chat_stream_view, name='ajax_ai_chat_stream'),
     path('ai-tutor/history/', views.ai_tutor_history, name='ai_tutor_history'),
     path('ai-tutor/history/<int:session_id>/', views.ai_tutor_history, name='ai_tutor_history_session'),
     path('ai-tutor/end-session/', views.end_ai_session, name='end_ai_session'),
@@ -105,8 +108,11 @@ urlpatterns = [
     path('quiz/<int:quiz_id>/', quiz_views.quiz_detail, name='quiz_detail'),
     path('quiz/<int:quiz_id>/edit/', quiz_views.quiz_edit, name='quiz_edit'),
     path('quiz/<int:quiz_id>/take/', quiz_views.quiz_take, name='quiz_take'),
+    path('quiz/<int:quiz_id>/questions/', quiz_views.quiz_questions, name='quiz_questions'),
+    path('quiz/<int:quiz_id>/analysis/', quiz_views.quiz_item_analysis, name='quiz_item_analysis'),
     path('quiz/<int:quiz_id>/results/<int:attempt_id>/', quiz_views.quiz_results, name='quiz_results'),
     path('quiz/save-response/', quiz_views.save_response, name='save_response'),
+    path('quiz/save-responses/', quiz_views.save_responses, name='save_responses'),
     path('quiz/submit/', quiz_views.submit_quiz, name='submit_quiz'),
     
     # User Management (Admin Only)
@@ -6,17 +6,19 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.models import User
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, Http404
 from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.urls import reverse
 import logging
+from asgiref.sync import sync_to_async
 from django.contrib.auth.views import LoginView
-from .email_service import send_user_login_notification
+from .login_notification_service import queue_login_notification
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -30,18 +32,17 @@ class CustomLoginView(LoginView):
         # Call the parent class's form_valid() method
         response = super().form_valid(form)
         
-        # Send login notification email
+        # Queue login notification email
         try:
-            send_user_login_notification(self.request.user, self.request)
-            logger.info(f"Login notification sent to {self.request.user.email}")
+            queue_login_notification(self.request.user, self.request)
         except Exception as e:
-            logger.error(f"Error sending login notification: {str(e)}")
+            logger.error(f"Error queueing login notification: {str(e)}")
         
         return response
 
 from .models import (
     UserProfile, Subject, ClassSubject, StudyMaterial, VideoConference,
-    RecordedSession, Assignment, AssignmentSubmission,
+    VideoConferenceParticipant, RecordedSession, Assignment, AssignmentSubmission,
     AITutorSession, AITutorMessage, UserSettings
 )
 from .forms import (
@@ -51,7 +52,18 @@ from .forms import (
     UserSettingsForm, SubjectForm
 )
 from .stripe_service import create_checkout_session, verify_checkout_session, handle_stripe_webhook
-from .ai_service import get_ai_response, generate_practice_questions
+from .ai_service import (
+    get_ai_response, aget_ai_response, stream_ai_response, generate_practice_questions,
+    AIStreamError, AI_ERROR_MESSAGE
+)
+from .conversation_service import get_conversation_history, reset_summary_if_rewritten
+from .job_queue import enqueue, get_job_status
+from .profile_service import get_or_create_profile, get_profile_or_404, get_or_create_user_settings
+from .counter_service import increment_counter, apply_pending_counts
+from .search_service import search_queryset, search_all, SEARCH_SOURCES
+from .question_bank_service import find_bank_subject, sample_practice_questions, QUESTION_BANK_DIFFICULTIES
+from .jobs import setup_zoom_meeting, process_conference_recordings
+from .outbox_service import queue_emails
 from .zoom_oauth_service import create_meeting_server_to_server, get_server_to_server_token
 from datetime import datetime, timedelta
 
@@ -320,13 +332,7 @@ def dashboard(request):
     """Role-based dashboard for users"""
     user = request.user
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Add debug message about the user's role
     messages.info(request, f"Debug: Your role is '{profile.role}' and your class level is '{profile.class_level}'")
@@ -345,22 +351,22 @@ def dashboard(request):
         upcoming_assignments = Assignment.objects.filter(
             class_level=class_level,
             due_date__gt=timezone.now()
-        ).order_by('due_date')[:5]
+        ).select_related('subject').defer('search_vector').order_by('due_date')[:5]
         
         recent_materials = StudyMaterial.objects.filter(
             class_level=class_level
-        ).order_by('-upload_date')[:5]
+        ).select_related('subject').defer('search_vector').order_by('-upload_date')[:5]
         
         # Get student's submitted assignments
         submitted_assignments = AssignmentSubmission.objects.filter(
             student=user
-        ).select_related('assignment').order_by('-submitted_at')[:5]
+        ).select_related('assignment__subject').defer('assignment__search_vector').order_by('-submitted_at')[:5]
         
         # Get upcoming classes
         upcoming_classes = VideoConference.objects.filter(
             class_level=class_level,
             start_time__gt=timezone.now()
-        ).order_by('start_time')[:3]
+        ).select_related('subject').order_by('start_time')[:3]
         
         return render(request, 'dashboard.html', {
             'profile': profile,
@@ -374,23 +380,23 @@ def dashboard(request):
         # Teacher-specific dashboard data
         created_assignments = Assignment.objects.filter(
             created_by=user
-        ).order_by('-created_at')[:5]
+        ).select_related('subject').defer('search_vector').order_by('-created_at')[:5]
         
         uploaded_materials = StudyMaterial.objects.filter(
             uploaded_by=user
-        ).order_by('-upload_date')[:5]
+        ).select_related('subject').defer('search_vector').order_by('-upload_date')[:5]
         
         # Get pending submissions to grade
         pending_submissions = AssignmentSubmission.objects.filter(
             assignment__created_by=user,
             is_graded=False
-        ).select_related('assignment', 'student').order_by('submitted_at')[:10]
+        ).select_related('assignment__subject', 'student').defer('assignment__search_vector').order_by('submitted_at')[:10]
         
         # Get upcoming classes scheduled by the teacher
         upcoming_classes = VideoConference.objects.filter(
             scheduled_by=user,
             start_time__gt=timezone.now()
-        ).order_by('start_time')[:3]
+        ).select_related('subject').order_by('start_time')[:3]
         
         return render(request, 'dashboard.html', {
             'profile': profile,
@@ -402,8 +408,8 @@ def dashboard(request):
         
     elif profile.role == 'admin':
         # Admin-specific dashboard data
-        recent_users = UserProfile.objects.all().order_by('-date_joined')[:10]
-        recent_materials = StudyMaterial.objects.all().order_by('-upload_date')[:10]
+        recent_users = UserProfile.objects.select_related('user').order_by('-date_joined')[:10]
+        recent_materials = StudyMaterial.objects.select_related('subject', 'uploaded_by').defer('search_vector').order_by('-upload_date')[:10]
         
         # Get recent video conferences
         recent_conferences = VideoConference.objects.all().order_by('-start_time')[:10]
@@ -445,13 +451,7 @@ def profile_view(request, username):
 def profile_edit(request):
     """Edit user profile"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     if request.method == 'POST':
         form = UserProfileForm(request.POST, instance=profile, user=request.user)
@@ -469,13 +469,7 @@ def profile_edit(request):
 def materials_list(request):
     """List and search study materials with class-level filtering"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     query = request.GET.get('q', '')
     subject_id = request.GET.get('subject', '')
@@ -498,11 +492,9 @@ def materials_list(request):
                 Q(uploaded_by=request.user) | Q(class_level=profile.class_level)
             ).distinct()
     
-    # Apply search and other filters
+    # Apply search (full-text index, ranked; see search_service) and other filters
     if query:
-        materials = materials.filter(
-            Q(title__icontains=query) | Q(description__icontains=query)
-        )
+        materials = search_queryset(materials, query)
     
     if subject_id:
         materials = materials.filter(subject_id=subject_id)
@@ -519,10 +511,11 @@ def materials_list(request):
     class_levels = UserProfile.CLASS_CHOICES
     file_types = StudyMaterial.FILE_TYPE_CHOICES
     
-    # Pagination
-    paginator = Paginator(materials, 10)
+    # Pagination; every row shows its subject
+    paginator = Paginator(materials.select_related('subject').defer('search_vector'), 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.object_list = apply_pending_counts(list(page_obj.object_list), 'views', 'downloads')
     
     return render(request, 'materials/list.html', {
         'page_obj': page_obj,
@@ -537,27 +530,53 @@ def materials_list(request):
     })
 
 
+@login_required
+def search_view(request):
+    """
+    Unified search across materials, recordings, assignments and quizzes
+    
+    Results respect the same class-level access rules as the list pages.
+    
+    Query parameters:
+        q: Search text (prefix matching on the last word)
+        type: Optional result type to restrict to, may be repeated
+    
+    Returns:
+        JsonResponse with results ordered by relevance
+    """
+    profile, created = get_or_create_profile(request)
+    
+    query = request.GET.get('q', '').strip()
+    types = [t for t in request.GET.getlist('type') if t in SEARCH_SOURCES]
+    
+    if not query:
+        return JsonResponse({'success': False, 'error': 'Search query is required'}, status=400)
+    
+    results = search_all(request.user, profile, query, types=types or None)
+    
+    return JsonResponse({
+        'success': True,
+        'query': query,
+        'count': len(results),
+        'results': results,
+    })
+
+
 @login_required
 def material_detail(request, pk):
     """View details of a specific study material with class-level access control"""
     material = get_object_or_404(StudyMaterial, pk=pk)
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Check if student has access to this material
     if profile.role == 'student' and profile.class_level != material.class_level:
         messages.error(request, "You don't have access to this material. It's for a different class level.")
         return redirect('materials_list')
     
-    # Increment view count
-    material.views += 1
-    material.save()
+    # Count the view (buffered; see counter_service) and show live counts
+    increment_counter(StudyMaterial, material.pk, 'views')
+    apply_pending_counts(material, 'views', 'downloads')
     
     return render(request, 'materials/detail.html', {'material': material, 'profile': profile})
 
@@ -567,22 +586,15 @@ def material_download(request, pk):
     """Track download of a study material with class-level access control"""
     material = get_object_or_404(StudyMaterial, pk=pk)
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Check if student has access to this material
     if profile.role == 'student' and profile.class_level != material.class_level:
         messages.error(request, "You don't have access to this material. It's for a different class level.")
         return redirect('materials_list')
     
-    # Increment download count
-    material.downloads += 1
-    material.save()
+    # Count the download (buffered; see counter_service)
+    increment_counter(StudyMaterial, material.pk, 'downloads')
     
     # If material has a file stored in the database, serve it
     if material.file and hasattr(material.file, 'url'):
@@ -605,13 +617,7 @@ def material_download(request, pk):
 def material_upload(request):
     """Upload new study material - restricted to admin and teachers"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Check if user is admin or teacher
     if profile.role == 'student':
@@ -652,13 +658,7 @@ def material_upload(request):
 def video_conferences_list(request):
     """List upcoming and past video conferences"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Filter conferences by class level for students
     now = timezone.now()
@@ -692,12 +692,12 @@ def video_conferences_list(request):
         if profile.role == 'teacher':
             past_conferences = past_conferences.filter(scheduled_by=request.user)
     
-    # Pagination
-    upcoming_paginator = Paginator(upcoming_conferences, 5)
+    # Pagination; every row shows its subject and organiser
+    upcoming_paginator = Paginator(upcoming_conferences.select_related('subject', 'scheduled_by'), 5)
     upcoming_page = request.GET.get('upcoming_page')
     upcoming_page_obj = upcoming_paginator.get_page(upcoming_page)
     
-    past_paginator = Paginator(past_conferences, 5)
+    past_paginator = Paginator(past_conferences.select_related('subject', 'scheduled_by'), 5)
     past_page = request.GET.get('past_page')
     past_page_obj = past_paginator.get_page(past_page)
     
@@ -714,13 +714,7 @@ def video_conference_detail(request, pk):
     try:
         conference = get_object_or_404(VideoConference, pk=pk)
         # Get or create user profile to avoid 404 errors
-        profile, created = UserProfile.objects.get_or_create(
-            user=request.user,
-            defaults={
-                'role': 'student',
-                'class_level': '1',
-            }
-        )
+        profile, created = get_or_create_profile(request)
         
         # Get participants if any
         from .models import VideoConferenceParticipant
@@ -731,6 +725,7 @@ def video_conference_detail(request, pk):
             'profile': profile,
             'participants': participants,
             'is_host': request.user == conference.scheduled_by or profile.role == 'admin',
+            'recording_link': conference.get_recording_url() if conference.recording_status == 'available' else None,
         }
         
         return render(request, 'video/detail.html', context)
@@ -743,13 +738,7 @@ def video_conference_detail(request, pk):
 def video_conference_create(request):
     """Create a new video conference with Zoom integration and email notifications"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Check if user is teacher or admin
     if profile.role not in ['teacher', 'admin']:
@@ -759,101 +748,71 @@ def video_conference_create(request):
     if request.method == 'POST':
         form = VideoConferenceForm(request.POST)
         if form.is_valid():
-            conference = form.save(commit=False)
-            conference.scheduled_by = request.user
-            conference.status = 'scheduled'
-            conference.save()
-            
-            # Get selected participants if any
-            selected_participants = form.cleaned_data.get('selected_participants', [])
-            
-            # Initialize potential participant list for notification
-            participants_to_notify = []
-            
-            # Create Zoom meeting if platform is Zoom
-            if conference.platform == 'zoom':
-                # Check if SDK checkbox was selected
-                use_sdk = request.POST.get('use_zoom_sdk') == 'on'
-                conference.enable_sdk = use_sdk
-                
-                # Check if OAuth checkbox was selected
-                use_oauth = request.POST.get('use_zoom_oauth') == 'on'
-                conference.used_oauth = use_oauth
-                conference.save(update_fields=['enable_sdk', 'used_oauth'])
+            # The conference, its participants and the queued setup job are
+            # saved together or not at all
+            with transaction.atomic():
+                conference = form.save(commit=False)
+                conference.scheduled_by = request.user
+                conference.status = 'scheduled'
+                conference.save()
                 
-                # Create the Zoom meeting based on OAuth preference
-                if use_oauth:
-                    # For OAuth, use the specific OAuth method
-                    zoom_result = conference.create_zoom_meeting_oauth()
-                else:
-                    # For regular JWT, use the standard method
-                    zoom_result = conference.create_zoom_meeting()
+                # Get selected participants if any
+                selected_participants = form.cleaned_data.get('selected_participants', [])
                 
-                if zoom_result:
+                # Create Zoom meeting if platform is Zoom
+                if conference.platform == 'zoom':
+                    # Check if SDK checkbox was selected
+                    use_sdk = request.POST.get('use_zoom_sdk') == 'on'
+                    conference.enable_sdk = use_sdk
+                    
+                    # Check if OAuth checkbox was selected
+                    use_oauth = request.POST.get('use_zoom_oauth') == 'on'
+                    conference.used_oauth = use_oauth
+                    conference.save(update_fields=['enable_sdk', 'used_oauth'])
+                    
+                    # Determine participants: selected users, or all students in the class level
+                    is_targeted = bool(selected_participants)
+                    if is_targeted:
+                        participants = list(selected_participants.select_related('profile'))
+                    else:
+                        participants = list(User.objects.filter(
+                            profile__role='student',
+                            profile__class_level=conference.class_level
+                        ).select_related('profile'))
+                    
+                    participant_records = []
+                    for user in participants:
+                        # Determine participant type based on user's role
+                        try:
+                            participant_type = 'teacher' if user.profile.role == 'teacher' else 'student'
+                        except UserProfile.DoesNotExist:
+                            participant_type = 'student'  # Default
+                        participant_records.append(VideoConferenceParticipant(
+                            conference=conference,
+                            user=user,
+                            participant_type=participant_type
+                        ))
+                    VideoConferenceParticipant.objects.bulk_create(participant_records)
+                    
+                    # Zoom and email calls run in a background worker once the
+                    # conference is committed; invitations go to the email outbox
+                    # once the meeting exists
+                    invite_user_ids = [user.id for user in participants]
+                    transaction.on_commit(lambda: enqueue(
+                        setup_zoom_meeting, conference.id,
+                        use_oauth=use_oauth,
+                        invite_user_ids=invite_user_ids,
+                        is_targeted=is_targeted,
+                        owner_id=request.user.id
+                    ))
+                    
                     sdk_message = "with SDK for in-browser meetings" if conference.enable_sdk else "with standard Zoom client"
                     oauth_message = " using your connected Zoom account" if use_oauth else ""
-                    messages.success(request, f"Video conference scheduled successfully with Zoom integration{oauth_message} {sdk_message}!")
-                    
-                    # Send email notifications based on selection
-                    try:
-                        # Import here to avoid circular imports
-                        from core.email_service import send_meeting_invitation
-                        from core.models import VideoConferenceParticipant
-                        
-                        # Determine recipients based on whether specific participants were selected
-                        if selected_participants:
-                            # Add selected participants to the conference
-                            for user in selected_participants:
-                                # Determine participant type based on user's role
-                                try:
-                                    user_role = user.userprofile.role
-                                    participant_type = 'teacher' if user_role == 'teacher' else 'student'
-                                except:
-                                    participant_type = 'student'  # Default
-                                
-                                # Create the participant relationship
-                                VideoConferenceParticipant.objects.create(
-                                    conference=conference,
-                                    user=user,
-                                    participant_type=participant_type
-                                )
-                            
-                            # Send emails to selected participants
-                            email_result = send_meeting_invitation(conference, selected_participants, is_targeted=True)
-                            if email_result:
-                                messages.success(request, f"Email invitations sent to {len(selected_participants)} participants.")
-                            else:
-                                messages.warning(request, "Conference scheduled, but there was an issue sending email invitations.")
-                                
-                        else:
-                            # Get all students in this class level
-                            class_level = conference.class_level
-                            students = User.objects.filter(
-                                userprofile__role='student',
-                                userprofile__class_level=class_level
-                            )
-                            
-                            # Add them as participants
-                            for student in students:
-                                VideoConferenceParticipant.objects.create(
-                                    conference=conference,
-                                    user=student,
-                                    participant_type='student'
-                                )
-                            
-                            # Send email to all students in class level
-                            if students.exists():
-                                email_result = send_meeting_invitation(conference, students)
-                                if email_result:
-                                    messages.success(request, f"Email invitations sent to {students.count()} students in {conference.get_class_level_display()}.")
-                                else:
-                                    messages.warning(request, "Conference scheduled, but there was an issue sending email invitations.")
-                    except Exception as e:
-                        messages.warning(request, f"Conference scheduled, but there was an issue managing participants: {str(e)}")
+                    messages.success(request, f"Video conference scheduled! The Zoom meeting is being created{oauth_message} {sdk_message}.")
+                    if participants:
+                        messages.info(request, f"Email invitations will be sent to {len(participants)} participants once the meeting is ready.")
                 else:
-                    messages.warning(request, "Conference scheduled, but there was an issue with Zoom integration. You may need to set up the meeting manually.")
-            else:
-                messages.success(request, "Video conference scheduled successfully!")
+                    messages.success(request, "Video conference scheduled successfully!")
                 
             return redirect('video_conferences_list')
     else:
@@ -874,13 +833,7 @@ def video_conference_create(request):
 def video_conference_edit(request, pk):
     """Edit an existing video conference"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Check if user is teacher or admin
     if profile.role not in ['teacher', 'admin']:
@@ -929,73 +882,71 @@ def video_conference_edit(request, pk):
                     else:
                         changed_fields.append(f"{field.replace('_', ' ').title()} was updated")
             
-            # Now save the updated conference
-            updated_conference.save()
-            
-            messages.success(request, f"Conference '{updated_conference.title}' has been updated.")
-            
-            # Get all existing participants to notify them of the change
+            # Now save the updated conference, together with the emails about it
             from .models import VideoConferenceParticipant
-            existing_participants = VideoConferenceParticipant.objects.filter(
-                conference=updated_conference
-            ).select_related('user')
-            existing_users = [p.user for p in existing_participants if p.user.is_active and p.user.email]
+            from core.email_service import build_meeting_invitations, build_meeting_update_notifications
             
-            # Add new participants if selected
-            if selected_participants:
-                try:
-                    selected_users = User.objects.filter(id__in=selected_participants)
-                    if selected_users.exists():
-                        # Import email services here to avoid circular imports
-                        from core.email_service import send_meeting_invitation, send_meeting_update_notification
-                        
-                        # Get new users not already in the participants list
+            # The form carries the revision it was rendered from. Each save moves the
+            # conference to the next revision, which keys its update emails; a
+            # resubmitted form names a revision that has already been saved
+            try:
+                revision = int(request.POST.get('revision', conference.revision))
+            except ValueError:
+                revision = conference.revision
+            
+            try:
+                with transaction.atomic():
+                    claimed = VideoConference.objects.filter(pk=conference.pk, revision=revision).update(
+                        revision=revision + 1
+                    )
+                    if not claimed:
+                        messages.info(request, "This conference has already been updated. Review the current details before editing again.")
+                        return redirect('video_conference_detail', pk=conference.pk)
+                    
+                    updated_conference.revision = revision + 1
+                    updated_conference.save()
+                    
+                    # Get all existing participants to notify them of the change
+                    existing_participants = VideoConferenceParticipant.objects.filter(
+                        conference=updated_conference
+                    ).select_related('user')
+                    existing_users = [p.user for p in existing_participants if p.user.is_active and p.user.email]
+                    
+                    # Invite newly selected participants
+                    new_users = []
+                    if selected_participants:
+                        selected_users = User.objects.filter(id__in=selected_participants)
                         new_users = [user for user in selected_users if user not in existing_users]
+                    
+                    invited = 0
+                    if new_users:
+                        invited = queue_emails(
+                            f"conference-invite:{updated_conference.id}",
+                            build_meeting_invitations(updated_conference, new_users, is_targeted=True)
+                        )
                         
-                        # If there are new users, send them an invitation
-                        if new_users:
-                            # Send targeted invitations to new participants
-                            email_result = send_meeting_invitation(updated_conference, new_users, is_targeted=True)
-                            if email_result:
-                                messages.success(request, f"Email invitations sent to {len(new_users)} new participants.")
-                            
-                            # Add new users to existing users list for update notification
-                            existing_users.extend(new_users)
-                        
-                        # Send update notification to all participants
-                        if existing_users:
-                            update_result = send_meeting_update_notification(
-                                meeting=updated_conference,
-                                recipients=existing_users,
-                                update_type='Meeting Updated',
-                                changes=changed_fields
-                            )
-                            
-                            if update_result:
-                                messages.success(request, f"Meeting update notification sent to {len(existing_users)} participants.")
-                            else:
-                                messages.warning(request, "Conference updated, but there was an issue sending update notifications.")
-                except Exception as e:
-                    messages.warning(request, f"Conference updated, but email notifications failed: {str(e)}")
-            else:
-                # If no specific participants selected, still notify existing participants of the changes
-                try:
+                        # Add new users to existing users list for update notification
+                        existing_users.extend(new_users)
+                    
+                    # Notify all participants of the update
+                    notified = 0
                     if existing_users:
-                        # Import email service here to avoid circular imports
-                        from core.email_service import send_meeting_update_notification
-                        
-                        # Send update notification to all existing participants
-                        update_result = send_meeting_update_notification(
-                            meeting=updated_conference,
-                            recipients=existing_users,
-                            update_type='Meeting Updated',
-                            changes=changed_fields
+                        notified = queue_emails(
+                            f"conference-update:{updated_conference.id}:{updated_conference.revision}",
+                            build_meeting_update_notifications(
+                                updated_conference, existing_users, 'Meeting Updated', changes=changed_fields
+                            )
                         )
-                        
-                        if update_result:
-                            messages.success(request, f"Meeting update notification sent to {len(existing_users)} participants.")
-                except Exception as e:
-                    messages.warning(request, f"Conference updated, but email notifications failed: {str(e)}")
+            except Exception as e:
+                logger.error(f"Error updating conference {conference.id}: {str(e)}")
+                messages.error(request, f"Conference could not be updated: {str(e)}")
+                return redirect('video_conferences_list')
+            
+            messages.success(request, f"Conference '{updated_conference.title}' has been updated.")
+            if invited:
+                messages.success(request, f"Email invitations are being sent to {invited} new participants.")
+            if notified:
+                messages.success(request, f"Meeting update notification is being sent to {notified} participants.")
             
             return redirect('video_conferences_list')
     else:
@@ -1021,13 +972,7 @@ def video_conference_join(request, pk):
     """Join a video conference with class-level access control"""
     conference = get_object_or_404(VideoConference, pk=pk)
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Check if student has access to this conference
     if profile.role == 'student' and profile.class_level != conference.class_level:
@@ -1080,13 +1025,7 @@ def video_conference_join_sdk(request, pk):
     """Join a Zoom conference using the web SDK interface"""
     conference = get_object_or_404(VideoConference, pk=pk)
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Check if student has access to this conference
     if profile.role == 'student' and profile.class_level != conference.class_level:
@@ -1139,13 +1078,7 @@ def get_zoom_signature(request, meeting_id):
         return JsonResponse({'success': False, 'error': 'Meeting ID is required'})
     
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     try:
         # Find the conference with this meeting ID
@@ -1182,7 +1115,7 @@ def get_zoom_signature(request, meeting_id):
 def toggle_auto_record(request, pk):
     """Toggle auto-recording setting for a meeting"""
     # Check if user is allowed to process recordings (admin or teacher)
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     if profile.role not in ['admin', 'teacher']:
         return JsonResponse({
             'success': False,
@@ -1234,7 +1167,7 @@ def toggle_auto_record(request, pk):
 def process_meeting_recordings(request, meeting_id):
     """Process and save recordings from a completed Zoom meeting to S3"""
     # Check if user is allowed to process recordings (admin or teacher)
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     if profile.role not in ['admin', 'teacher']:
         messages.error(request, "You don't have permission to process recordings.")
         return redirect('video_conferences_list')
@@ -1249,66 +1182,55 @@ def process_meeting_recordings(request, meeting_id):
     
     # Set the recording status to processing
     conference.recording_status = 'processing'
-    conference.save()
+    conference.save(update_fields=['recording_status'])
     
-    # Process the recordings
-    from core.zoom_service import download_recording_to_s3
+    # Downloading from Zoom and uploading to S3 runs in a background worker
+    enqueue(process_conference_recordings, conference.id, owner_id=request.user.id)
     
-    result = download_recording_to_s3(meeting_id, conference_obj=conference)
-    
-    if result.get('success'):
-        messages.success(request, "Meeting recordings processed successfully.")
-        
-        # Get the recording URL from result
-        recording_url = result.get('recording_url')
-        
-        # Get participants to notify about the recording availability
-        if recording_url:
-            try:
-                # Get all participants of this conference
-                from .models import VideoConferenceParticipant
-                participants = VideoConferenceParticipant.objects.filter(
-                    conference=conference
-                ).select_related('user')
-                
-                # Create list of users to notify about recording availability
-                recipients = [p.user for p in participants if p.user.is_active and p.user.email]
-                
-                # Send recording availability notifications if there are recipients
-                if recipients:
-                    from core.email_service import send_meeting_update_notification
-                    
-                    notification_result = send_meeting_update_notification(
-                        meeting=conference,
-                        recipients=recipients,
-                        update_type='Recording Available',
-                        recording_url=recording_url
-                    )
-                    
-                    if notification_result:
-                        messages.success(request, f"Recording availability notification sent to {len(recipients)} participants.")
-                    else:
-                        messages.warning(request, "Recording processed, but there was an issue sending notifications.")
-            except Exception as e:
-                logger.error(f"Error sending recording availability notifications: {str(e)}")
-                messages.warning(request, f"Recording processed, but could not send notifications: {str(e)}")
-    else:
-        messages.error(request, f"Error processing recordings: {result.get('error', 'Unknown error')}")
+    messages.info(request, "Meeting recordings are being processed. Participants will be notified when they are available.")
     
     return redirect('video_conference_detail', pk=conference.id)
 
 
+@login_required
+def job_status(request, job_id):
+    """
+    Report the status of a background job for polling
+
+    Args:
+        request: The HTTP request
+        job_id: The job ID returned when the job was queued
+
+    Returns:
+        JsonResponse with the job status, attempts, result, progress and last error
+    """
+    record = get_job_status(job_id)
+
+    # Jobs are only visible to the user who queued them and to admins
+    if record and record.get('owner_id') and record['owner_id'] != request.user.id and not request.user.is_staff:
+        record = None
+
+    if record is None:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+
+    return JsonResponse({
+        'success': True,
+        'id': record['id'],
+        'name': record['name'],
+        'status': record['status'],
+        'attempts': record['attempts'],
+        'max_attempts': record['max_attempts'],
+        'result': record.get('result'),
+        'progress': record.get('progress'),
+        'error': record.get('error', ''),
+    })
+
+
 @login_required
 def recordings_list(request):
     """List recorded sessions"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     query = request.GET.get('q', '')
     subject_id = request.GET.get('subject', '')
@@ -1339,7 +1261,7 @@ def recordings_list(request):
     subjects = Subject.objects.all()
     
     # Pagination
-    paginator = Paginator(recordings, 8)
+    paginator = Paginator(recordings.defer('search_vector'), 8)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -1355,7 +1277,7 @@ def recordings_list(request):
 def recording_detail(request, pk):
     """View a recorded session with class-level access control"""
     recording = get_object_or_404(RecordedSession, pk=pk)
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Check if student has access to this recording
     if profile.role == 'student' and profile.class_level != recording.class_level:
@@ -1367,9 +1289,9 @@ def recording_detail(request, pk):
         messages.error(request, "You don't have access to this recording. It's for a different class level.")
         return redirect('recordings_list')
     
-    # Increment view count
-    recording.views += 1
-    recording.save()
+    # Count the view (buffered; see counter_service) and show the live count
+    increment_counter(RecordedSession, recording.pk, 'views')
+    apply_pending_counts(recording, 'views')
     
     return render(request, 'recordings/detail.html', {'recording': recording, 'profile': profile})
 
@@ -1377,7 +1299,7 @@ def recording_detail(request, pk):
 @login_required
 def recording_upload(request):
     """Upload a recorded session"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Check if user is teacher or admin
     if profile.role not in ['teacher', 'admin']:
@@ -1401,7 +1323,7 @@ def recording_upload(request):
 @login_required
 def assignments_list(request):
     """List assignments"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Determine which assignments to show based on user role
     if profile.role == 'student':
@@ -1449,12 +1371,12 @@ def assignments_list(request):
         # No submissions lookup needed for admins
         submissions = []
     
-    # Pagination
-    active_paginator = Paginator(active_assignments, 5)
+    # Pagination; every row shows its subject and author
+    active_paginator = Paginator(active_assignments.select_related('subject', 'created_by').defer('search_vector'), 5)
     active_page = request.GET.get('active_page')
     active_page_obj = active_paginator.get_page(active_page)
     
-    past_paginator = Paginator(past_assignments, 5)
+    past_paginator = Paginator(past_assignments.select_related('subject', 'created_by').defer('search_vector'), 5)
     past_page = request.GET.get('past_page')
     past_page_obj = past_paginator.get_page(past_page)
     
@@ -1470,7 +1392,7 @@ def assignments_list(request):
 def assignment_detail(request, pk):
     """View assignment details"""
     assignment = get_object_or_404(Assignment, pk=pk)
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Students can only view assignments for their class level
     if profile.role == 'student' and assignment.class_level != profile.class_level:
@@ -1506,7 +1428,7 @@ def assignment_detail(request, pk):
 @login_required
 def assignment_create(request):
     """Create a new assignment"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Only teachers and admins can create assignments
     if profile.role not in ['teacher', 'admin']:
@@ -1531,7 +1453,7 @@ def assignment_create(request):
 def assignment_submit(request, pk):
     """Submit an assignment"""
     assignment = get_object_or_404(Assignment, pk=pk)
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Only students can submit assignments
     if profile.role != 'student':
@@ -1580,7 +1502,7 @@ def assignment_submit(request, pk):
 def submission_grade(request, pk):
     """Grade an assignment submission"""
     submission = get_object_or_404(AssignmentSubmission, pk=pk)
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Only teachers and admins can grade submissions
     if profile.role not in ['teacher', 'admin']:
@@ -1614,7 +1536,7 @@ def submission_grade(request, pk):
 @login_required
 def ai_tutor_chat(request):
     """AI tutor chat interface with role-based syllabus content"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Get or create an active AI session
     try:
@@ -1742,7 +1664,7 @@ def ai_tutor_chat(request):
 @login_required
 def ai_tutor_history(request, session_id=None):
     """View chat history for a specific session"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # If session_id is provided, get that specific session
     if session_id:
@@ -1803,7 +1725,7 @@ def generate_practice_questions_view(request):
         return JsonResponse({'error': 'Topic is required'}, status=400)
     
     # Get user profile to enforce role and class-level constraints
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Create a contextual prompt that respects the user's class level
     contextualized_topic = topic
@@ -1953,7 +1875,7 @@ def export_ai_session_email(request, session_id):
 
 @login_required
 @require_POST
-def add_thread_reply(request):
+async def add_thread_reply(request):
     """Handle thread replies to existing AI messages"""
     parent_message_id = request.POST.get('parent_message_id')
     content = request.POST.get('content', '').strip()
@@ -1962,31 +1884,32 @@ def add_thread_reply(request):
         return JsonResponse({'success': False, 'error': 'Missing parent message ID or content'})
     
     try:
+        user = await request.auser()
+        
         # Get the parent message and its session
-        parent_message = AITutorMessage.objects.get(id=parent_message_id)
+        parent_message = await AITutorMessage.objects.select_related(
+            'session', 'session__subject'
+        ).aget(id=parent_message_id)
         session = parent_message.session
         
         # Verify this is the user's session
-        if session.student != request.user:
+        if session.student_id != user.id:
             return JsonResponse({'success': False, 'error': 'Unauthorized access to this message'})
         
         # Create the user's thread reply
-        user_reply = AITutorMessage.objects.create(
+        user_reply = await AITutorMessage.objects.acreate(
             session=session,
             message_type='thread_question',
             content=content,
             parent_message=parent_message
         )
         
-        # Import the AI service
-        from .ai_service import get_ai_response
-        
         # Get subject context if available
         subject = session.subject
         subject_name = subject.name if subject else None
         
-        # Get user role and class level for context
-        user_profile = request.user.profile
+        # Get user role and class level for context (loaded by the middleware)
+        user_profile = get_profile_or_404(request)
         role = user_profile.role
         class_level = user_profile.class_level
         
@@ -1994,7 +1917,7 @@ def add_thread_reply(request):
         thread_context = f"This is a thread reply to your previous answer: '{parent_message.content}'. "
         thread_context += f"The user is asking: {content}"
         
-        ai_response = get_ai_response(
+        ai_response = await aget_ai_response(
             content, 
             subject_name=subject_name,
             role=role,
@@ -2003,7 +1926,7 @@ def add_thread_reply(request):
         )
         
         # Create the AI's thread response
-        ai_reply = AITutorMessage.objects.create(
+        ai_reply = await AITutorMessage.objects.acreate(
             session=session,
             message_type='thread_answer',
             content=ai_response,
@@ -2038,7 +1961,7 @@ def add_thread_reply(request):
 
 @login_required
 @require_POST
-def edit_message(request):
+async def edit_message(request):
     """Edit a user's message and regenerate AI responses"""
     message_id = request.POST.get('message_id')
     new_content = request.POST.get('content', '').strip()
@@ -2047,12 +1970,16 @@ def edit_message(request):
         return JsonResponse({'success': False, 'error': 'Missing message ID or content'})
     
     try:
+        user = await request.auser()
+        
         # Get the message and its session
-        message = AITutorMessage.objects.get(id=message_id)
+        message = await AITutorMessage.objects.select_related(
+            'session', 'session__subject'
+        ).aget(id=message_id)
         session = message.session
         
         # Verify this is the user's message and session
-        if session.student != request.user or message.message_type != 'question':
+        if session.student_id != user.id or message.message_type != 'question':
             return JsonResponse({
                 'success': False, 
                 'error': 'You can only edit your own questions'
@@ -2065,7 +1992,10 @@ def edit_message(request):
         message.content = new_content
         message.is_edited = True
         message.edited_at = timezone.now()
-        message.save()
+        await message.asave()
+        
+        # The rolling context summary no longer matches if it covered this message
+        await sync_to_async(reset_summary_if_rewritten)(session, message)
         
         # Get all messages after this one
         subsequent_messages = AITutorMessage.objects.filter(
@@ -2074,23 +2004,22 @@ def edit_message(request):
         ).order_by('timestamp')
         
         # Delete all subsequent messages (they'll be regenerated)
-        message_ids_to_delete = list(subsequent_messages.values_list('id', flat=True))
-        subsequent_messages.delete()
-        
-        # Import the AI service
-        from .ai_service import get_ai_response
+        message_ids_to_delete = [
+            message_id async for message_id in subsequent_messages.values_list('id', flat=True)
+        ]
+        await subsequent_messages.adelete()
         
         # Get subject context if available
         subject = session.subject
         subject_name = subject.name if subject else None
         
-        # Get user role and class level for context
-        user_profile = request.user.profile
+        # Get user role and class level for context (loaded by the middleware)
+        user_profile = get_profile_or_404(request)
         role = user_profile.role
         class_level = user_profile.class_level
         
         # Get new AI response based on edited question
-        ai_response = get_ai_response(
+        ai_response = await aget_ai_response(
             new_content, 
             subject_name=subject_name,
             role=role,
@@ -2099,7 +2028,7 @@ def edit_message(request):
         )
         
         # Create the new AI response
-        new_ai_message = AITutorMessage.objects.create(
+        new_ai_message = await AITutorMessage.objects.acreate(
             session=session,
             message_type='answer',
             content=ai_response
@@ -2127,35 +2056,15 @@ def edit_message(request):
         return JsonResponse({'success': False, 'error': str(e)})
 
 
-@login_required
-def ajax_ai_chat_view(request):
-    """AJAX endpoint for AI chat interactions"""
-    # Print headers for debugging
-    print(f"Request method: {request.method}")
-    print(f"Request headers: {request.headers}")
-    
-    # Accept both AJAX and non-AJAX requests for testing
-    # If not Ajax, we can turn this on for debugging
-    # if not request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-    #     return JsonResponse({'error': 'AJAX requests only'}, status=400)
-    
-    user = request.user
-    profile = get_object_or_404(UserProfile, user=user)
-    
-    # Get question from request (handle both GET and POST)
-    if request.method == 'POST':
-        question = request.POST.get('question', '').strip()
-        subject_id = request.POST.get('subject', '')
-    else:
-        question = request.GET.get('question', '').strip()
-        subject_id = request.GET.get('subject', '')
-        
-    print(f"Question received: {question}")
-    print(f"Subject ID: {subject_id}")
+def prepare_ai_chat_turn(user, profile, question, subject_id=None):
+    """
+    Record a new AI chat question and gather the context needed to answer it
     
-    if not question:
-        return JsonResponse({'error': 'Question is required'}, status=400)
+    Shared by the JSON and streaming chat endpoints.
     
+    Returns:
+        tuple: (session, subject, question_msg, class_subjects, history)
+    """
     # Get or create an active AI session
     try:
         session = AITutorSession.objects.get(student=user, is_active=True)
@@ -2201,17 +2110,50 @@ def ajax_ai_chat_view(request):
     else:
         class_subjects = list(Subject.objects.all().values_list('name', flat=True))
     
+    # Earlier turns of this session, bounded by the context window
+    history, history_stats = get_conversation_history(session, exclude_message_id=question_msg.id)
+    
+    return session, subject, question_msg, class_subjects, history
+
+
+@login_required
+async def ajax_ai_chat_view(request):
+    """AJAX endpoint for AI chat interactions"""
+    # Accept both AJAX and non-AJAX requests for testing
+    # If not Ajax, we can turn this on for debugging
+    # if not request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+    #     return JsonResponse({'error': 'AJAX requests only'}, status=400)
+    
+    user = await request.auser()
+    profile = get_profile_or_404(request)
+    
+    # Get question from request (handle both GET and POST)
+    if request.method == 'POST':
+        question = request.POST.get('question', '').strip()
+        subject_id = request.POST.get('subject', '')
+    else:
+        question = request.GET.get('question', '').strip()
+        subject_id = request.GET.get('subject', '')
+    
+    if not question:
+        return JsonResponse({'error': 'Question is required'}, status=400)
+    
+    session, subject, question_msg, class_subjects, history = await sync_to_async(prepare_ai_chat_turn)(
+        user, profile, question, subject_id
+    )
+    
     # Get AI response with contextual awareness
-    ai_response = get_ai_response(
+    ai_response = await aget_ai_response(
         question=question,
         subject_name=subject.name if subject else None,
         role=profile.role,
         class_level=profile.class_level,
-        class_subjects=class_subjects
+        class_subjects=class_subjects,
+        history=history
     )
     
     # Save the response
-    response_msg = AITutorMessage.objects.create(
+    response_msg = await AITutorMessage.objects.acreate(
         session=session,
         message_type='answer',
         content=ai_response
@@ -2219,7 +2161,7 @@ def ajax_ai_chat_view(request):
     
     # Update last activity time
     session.last_activity = timezone.now()
-    session.save()
+    await session.asave()
     
     # Format timestamp for the response
     timestamp = response_msg.timestamp.strftime('%I:%M %p')
@@ -2233,11 +2175,89 @@ def ajax_ai_chat_view(request):
     })
 
 
+def sse_event(data, event=None):
+    """Format a JSON payload as a server-sent event"""
+    payload = f"data: {json.dumps(data)}\n\n"
+    if event:
+        payload = f"event: {event}\n{payload}"
+    return payload
+
+
+@login_required
+async def ajax_ai_chat_stream_view(request):
+    """
+    Streaming variant of ajax_ai_chat_view using server-sent events
+    
+    The answer is forwarded to the browser as it is generated and saved as an
+    AITutorMessage once the stream completes. If generation fails partway,
+    an error event is sent and the partial answer is not saved.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST request required'}, status=405)
+    
+    user = await request.auser()
+    profile = get_profile_or_404(request)
+    
+    question = request.POST.get('question', '').strip()
+    subject_id = request.POST.get('subject', '')
+    
+    if not question:
+        return JsonResponse({'error': 'Question is required'}, status=400)
+    
+    session, subject, question_msg, class_subjects, history = await sync_to_async(prepare_ai_chat_turn)(
+        user, profile, question, subject_id
+    )
+    
+    async def event_stream():
+        yield sse_event({'question_id': question_msg.id}, event='start')
+        
+        chunks = []
+        try:
+            async for delta in stream_ai_response(
+                question=question,
+                subject_name=subject.name if subject else None,
+                role=profile.role,
+                class_level=profile.class_level,
+                class_subjects=class_subjects,
+                history=history
+            ):
+                chunks.append(delta)
+                yield sse_event({'delta': delta})
+        except AIStreamError:
+            yield sse_event({'error': AI_ERROR_MESSAGE, 'question_id': question_msg.id}, event='error')
+            return
+        
+        # Save the full response once the stream has completed
+        ai_response = ''.join(chunks)
+        response_msg = await AITutorMessage.objects.acreate(
+            session=session,
+            message_type='answer',
+            content=ai_response
+        )
+        
+        # Update last activity time
+        session.last_activity = timezone.now()
+        await session.asave()
+        
+        yield sse_event({
+            'response': ai_response,
+            'timestamp': response_msg.timestamp.strftime('%I:%M %p'),
+            'question_id': question_msg.id,
+            'response_id': response_msg.id
+        }, event='done')
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Disable proxy buffering (nginx) so chunks reach the browser immediately
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def user_settings(request):
     """User settings and preferences page"""
     user = request.user
-    settings, created = UserSettings.objects.get_or_create(user=user)
+    settings, created = get_or_create_user_settings(request)
     
     if request.method == 'POST':
         form = UserSettingsForm(request.POST, instance=settings, user=user)
@@ -2245,7 +2265,7 @@ def user_settings(request):
             settings = form.save(commit=False)
             
             # Handle the default_class_level field for teachers/admins
-            if hasattr(user, 'userprofile') and user.userprofile.role in ['teacher', 'admin']:
+            if request.profile and request.profile.role in ['teacher', 'admin']:
                 settings.default_class_level = form.cleaned_data.get('default_class_level', '')
             
             settings.save()
@@ -2257,7 +2277,7 @@ def user_settings(request):
     return render(request, 'settings/user_settings.html', {
         'form': form,
         'user': user,
-        'profile': hasattr(user, 'userprofile') and user.userprofile,
+        'profile': request.profile,
     })
 
 
@@ -2265,13 +2285,7 @@ def user_settings(request):
 def class_subjects_list(request):
     """List and manage subjects assigned to classes (admin and teacher only)"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Only admin and teachers can manage subject assignments
     if profile.role not in ['admin', 'teacher']:
@@ -2312,13 +2326,7 @@ def class_subjects_list(request):
 def class_subject_add(request):
     """Add a new subject to a class level"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Only admin and teachers can add subject assignments
     if profile.role not in ['admin', 'teacher']:
@@ -2357,13 +2365,7 @@ def class_subject_add(request):
 def class_subject_edit(request, pk):
     """Edit a class-subject assignment"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Only admin and teachers can edit class-subject assignments
     if profile.role not in ['admin', 'teacher']:
@@ -2400,13 +2402,7 @@ def class_subject_edit(request, pk):
 def class_subject_delete(request, pk):
     """Delete a subject-class assignment"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Only admin and teachers can delete subject assignments
     if profile.role not in ['admin', 'teacher']:
@@ -2437,13 +2433,7 @@ def class_subject_delete(request, pk):
 def subject_list(request):
     """List all subjects in the system"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Only admin and teachers can view subject management
     if profile.role not in ['admin', 'teacher']:
@@ -2469,13 +2459,7 @@ def subject_list(request):
 def subject_add(request):
     """Add a new subject to the system"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Only admin and teachers can add new subjects
     if profile.role not in ['admin', 'teacher']:
@@ -2510,13 +2494,7 @@ def subject_add(request):
 def subject_detail(request, pk):
     """View details of a specific subject"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Only admin and teachers can view subject details in the management area
     if profile.role not in ['admin', 'teacher']:
@@ -2529,10 +2507,10 @@ def subject_detail(request, pk):
     class_assignments = ClassSubject.objects.filter(subject=subject).order_by('class_level')
     
     # Get study materials for this subject
-    study_materials = StudyMaterial.objects.filter(subject=subject).order_by('-upload_date')[:5]
+    study_materials = StudyMaterial.objects.filter(subject=subject).defer('search_vector').order_by('-upload_date')[:5]
     
     # Get assignments for this subject
-    assignments = Assignment.objects.filter(subject=subject).order_by('-created_at')[:5]
+    assignments = Assignment.objects.filter(subject=subject).defer('search_vector').order_by('-created_at')[:5]
     
     # Get video conferences for this subject
     conferences = VideoConference.objects.filter(subject=subject).order_by('-start_time')[:5]
@@ -2551,13 +2529,7 @@ def subject_detail(request, pk):
 def subject_edit(request, pk):
     """Edit an existing subject"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Only admin and teachers can edit subjects
     if profile.role not in ['admin', 'teacher']:
@@ -2586,13 +2558,7 @@ def subject_edit(request, pk):
 def subject_delete(request, pk):
     """Delete an existing subject"""
     # Get or create user profile to avoid 404 errors
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'student',
-            'class_level': '1',
-        }
-    )
+    profile, created = get_or_create_profile(request)
     
     # Only admin can delete subjects
     if profile.role != 'admin':
@@ -2640,7 +2606,7 @@ def subject_delete(request, pk):
 @login_required
 def user_management(request):
     """List all users for administrative management"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile_or_404(request)
     
     # Only allow admins to access this page
     if profile.role != 'admin':
@@ -2689,7 +2655,7 @@ def user_management(request):
 @login_required
 def edit_user_access(request, user_id):
     """Edit a user's role and permissions"""
-    admin_profile = get_object_or_404(UserProfile, user=request.user)
+    admin_profile = get_profile_or_404(request)
     
     # Only allow admins to access this page
     if admin_profile.role != 'admin':
@@ -2728,7 +2694,7 @@ def edit_user_access(request, user_id):
 @require_POST
 def toggle_user_active(request, user_id):
     """Quickly toggle a user's active status"""
-    admin_profile = get_object_or_404(UserProfile, user=request.user)
+    admin_profile = get_profile_or_404(request)
     
     # Only allow admins to access this action
     if admin_profile.role != 'admin':
@@ -2784,8 +2750,18 @@ def generate_practice_questions_view(request):
         if not topic:
             return JsonResponse({'error': 'Topic is required'}, status=400)
         
+        if difficulty not in QUESTION_BANK_DIFFICULTIES:
+            difficulty = 'medium'
+        
         # Get user profile to enforce role and class-level constraints
-        profile = get_object_or_404(UserProfile, user=request.user)
+        profile = get_profile_or_404(request)
+        
+        # Subjects of the user's class are served from the pre-generated question bank
+        subject = find_bank_subject(profile.class_level, topic)
+        if subject is not None:
+            questions = sample_practice_questions(request.user, subject.id, profile.class_level, difficulty, count)
+            if questions:
+                return JsonResponse({'questions': questions, 'source': 'bank'})
         
         # Create a contextual prompt that respects the user's class level
         contextualized_topic = topic
@@ -3112,13 +3088,13 @@ def zoom_oauth_create_meeting(request):
                 # Handle selected participants if any
                 if selected_participant_ids:
                     # Get the selected users
-                    selected_participants = User.objects.filter(id__in=selected_participant_ids)
+                    selected_participants = User.objects.filter(id__in=selected_participant_ids).select_related('profile')
                     
                     # Create participant records
                     for user in selected_participants:
                         # Determine participant type based on user's role
                         try:
-                            user_role = user.userprofile.role
+                            user_role = user.profile.role
                             participant_type = 'teacher' if user_role == 'teacher' else 'student'
                         except:
                             participant_type = 'student'  # Default
@@ -3140,8 +3116,8 @@ def zoom_oauth_create_meeting(request):
                 else:
                     # Get all students in this class level
                     students = User.objects.filter(
-                        userprofile__role='student',
-                        userprofile__class_level=class_level
+                        profile__role='student',
+                        profile__class_level=class_level
                     )
                     
                     # Add them as participants
@@ -3195,7 +3171,7 @@ def video_conference_delete(request, pk):
         conference = VideoConference.objects.get(id=pk)
         
         # Check if user has permission to delete this meeting
-        if conference.scheduled_by != request.user and request.user.userprofile.role != 'admin':
+        if conference.scheduled_by != request.user and request.user.profile.role != 'admin':
             messages.error(request, 'You do not have permission to delete this meeting')
             return redirect('video_conferences_list')
         
@@ -3227,13 +3203,14 @@ def video_conference_delete(request, pk):
             if not success:
                 messages.warning(request, 'Could not delete meeting from Zoom, but it will be removed from the database.')
         
-        # Delete the conference record
-        conference.delete()
-        
-        # Send cancellation notifications if there are recipients
-        if recipients:
-            try:
-                from core.email_service import send_meeting_update_notification
+        # Delete the conference record, queueing the cancellation emails with it
+        with transaction.atomic():
+            conference_id = conference.id
+            conference.delete()
+            
+            notified = 0
+            if recipients:
+                from core.email_service import build_meeting_update_notifications
                 
                 # Create a simple meeting object with the stored details
                 class SimpleMeeting:
@@ -3247,18 +3224,14 @@ def video_conference_delete(request, pk):
                         self.meeting_id = details['meeting_id']
                         self.get_class_level_display = details['get_class_level_display']
                 
-                # Send meeting cancellation notification
-                notification_result = send_meeting_update_notification(
-                    meeting=SimpleMeeting(meeting_details),
-                    recipients=recipients,
-                    update_type='Meeting Cancelled'
+                # Queue meeting cancellation notification
+                notified = queue_emails(
+                    f"conference-cancel:{conference_id}",
+                    build_meeting_update_notifications(SimpleMeeting(meeting_details), recipients, 'Meeting Cancelled')
                 )
-                
-                if notification_result:
-                    messages.success(request, f'Meeting cancellation notification sent to {len(recipients)} participants')
-            except Exception as e:
-                logger.error(f"Error sending cancellation notifications: {str(e)}")
-                messages.warning(request, f'Meeting deleted but could not send cancellation notifications: {str(e)}')
+        
+        if notified:
+            messages.success(request, f'Meeting cancellation notification is being sent to {notified} participants')
         
         messages.success(request, 'Meeting deleted successfully')
         return redirect('video_conferences_list')
@@ -3285,7 +3258,7 @@ def zoom_oauth_delete_meeting(request, meeting_id):
     if not request.user.is_authenticated:
         return redirect('login')
     
-    if request.user.userprofile.role not in ['teacher', 'admin']:
+    if request.user.profile.role not in ['teacher', 'admin']:
         messages.error(request, "Only teachers and administrators can delete Zoom meetings.")
         return redirect('dashboard')
         
@@ -3297,7 +3270,7 @@ def zoom_oauth_delete_meeting(request, meeting_id):
         conference = VideoConference.objects.get(id=meeting_id)
         
         # Check if user has permission to delete this meeting
-        if conference.scheduled_by != request.user and request.user.userprofile.role != 'admin':
+        if conference.scheduled_by != request.user and request.user.profile.role != 'admin':
             messages.error(request, 'You do not have permission to delete this meeting')
             return redirect('video_conferences_list')
             
@@ -3346,7 +3319,7 @@ def payment_checkout(request, user_id):
     """
     # Only allow admins or the user themselves to access their checkout
     if request.user.is_authenticated:
-        if request.user.id != user_id and request.user.userprofile.role != 'admin':
+        if request.user.id != user_id and request.user.profile.role != 'admin':
             messages.error(request, "You don't have permission to access this payment page.")
             return redirect('dashboard')
     
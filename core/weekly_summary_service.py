@@ -0,0 +1,276 @@
+import os
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Max, Sum, F, Q
+from django.utils import timezone
+
+from core.models import Assignment, AssignmentSubmission, AITutorSession, VideoConferenceParticipant
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Students per chunk; each chunk is summarised with a fixed number of grouped queries
+WEEKLY_SUMMARY_CHUNK_SIZE = int(os.environ.get('WEEKLY_SUMMARY_CHUNK_SIZE', '1000'))
+
+# Past-due assignments older than this are no longer reported as missing
+WEEKLY_SUMMARY_MISSING_WINDOW_DAYS = 28
+# Subjects studied before but not within this many days are reported as inactive
+WEEKLY_SUMMARY_INACTIVE_DAYS = 14
+
+GOOD_GRADE_RATIO = 0.8
+ACTIVE_SESSIONS_ACHIEVEMENT = 5
+
+
+class WeeklySummaryContext:
+    """
+    Data shared by every student in a summary run
+
+    Holds the reporting window and each class level's upcoming and past-due
+    assignments, loaded once per class level instead of once per student.
+    """
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+        self.week_ago = self.now - timedelta(days=7)
+        self.upcoming = {}  # class level -> [{'title', 'due_date'}], soonest first
+        self.past_due = {}  # class level -> [(assignment id, title)], most recent first
+
+    def load_class_levels(self, class_levels):
+        """Load the assignments of class levels not seen yet in this run"""
+        new_levels = {level for level in class_levels if level not in self.upcoming}
+        if not new_levels:
+            return
+        for level in new_levels:
+            self.upcoming[level] = []
+            self.past_due[level] = []
+
+        upcoming = Assignment.objects.filter(
+            class_level__in=new_levels,
+            due_date__gt=self.now,
+            due_date__lt=self.now + timedelta(days=7)
+        ).order_by('due_date').values('class_level', 'title', 'due_date')
+        for row in upcoming:
+            if len(self.upcoming[row['class_level']]) < 5:
+                self.upcoming[row['class_level']].append({'title': row['title'], 'due_date': row['due_date']})
+
+        past_due = Assignment.objects.filter(
+            class_level__in=new_levels,
+            due_date__lt=self.now,
+            due_date__gte=self.now - timedelta(days=WEEKLY_SUMMARY_MISSING_WINDOW_DAYS)
+        ).order_by('-due_date').values_list('class_level', 'id', 'title')
+        for class_level, assignment_id, title in past_due:
+            self.past_due[class_level].append((assignment_id, title))
+
+
+def compute_weekly_summaries(students, context=None):
+    """
+    Compute the weekly learning summaries of a group of students
+
+    Runs the same small set of grouped queries whatever the number of
+    students, so callers should pass students in chunks (see
+    iter_weekly_summaries).
+
+    Args:
+        students (list): (user_id, class_level) tuples
+        context (WeeklySummaryContext, optional): Shared data for a run of several chunks
+
+    Returns:
+        dict: user_id -> {'stats': {...}, 'highlights': {...}}, as used by the
+        weekly summary page and email
+    """
+    context = context or WeeklySummaryContext()
+    now, week_ago = context.now, context.week_ago
+    user_ids = [user_id for user_id, _ in students]
+    context.load_class_levels({class_level for _, class_level in students if class_level})
+
+    submitted = dict(
+        AssignmentSubmission.objects.filter(student_id__in=user_ids, submitted_at__gte=week_ago)
+        .values('student_id').annotate(count=Count('id')).order_by()
+        .values_list('student_id', 'count')
+    )
+
+    good_grades = defaultdict(list)
+    for student_id, points, total_points, title in AssignmentSubmission.objects.filter(
+        student_id__in=user_ids,
+        submitted_at__gte=week_ago,
+        is_graded=True,
+        points_earned__gte=F('assignment__total_points') * GOOD_GRADE_RATIO
+    ).order_by('student_id', '-submitted_at').values_list(
+        'student_id', 'points_earned', 'assignment__total_points', 'assignment__title'
+    ):
+        good_grades[student_id].append(f"Scored {points}/{total_points} on '{title}'")
+
+    classes_attended = dict(
+        VideoConferenceParticipant.objects.filter(
+            user_id__in=user_ids,
+            attended=True,
+            conference__start_time__gte=week_ago,
+            conference__start_time__lte=now
+        ).values('user_id').annotate(count=Count('conference_id', distinct=True)).order_by()
+        .values_list('user_id', 'count')
+    )
+
+    # Session time is approximated by first to last activity
+    sessions = defaultdict(list)
+    for row in AITutorSession.objects.filter(
+        student_id__in=user_ids, started_at__gte=week_ago
+    ).values('student_id', 'subject__name').annotate(
+        count=Count('id'),
+        duration=Sum(F('last_activity') - F('started_at'))
+    ).order_by():
+        sessions[row['student_id']].append(row)
+
+    inactive_since = now - timedelta(days=WEEKLY_SUMMARY_INACTIVE_DAYS)
+    inactive_subjects = defaultdict(list)
+    for student_id, subject_name, last_started in AITutorSession.objects.filter(
+        student_id__in=user_ids, subject__isnull=False
+    ).values('student_id', 'subject__name').annotate(last=Max('started_at')).order_by(
+        'student_id', 'subject__name'
+    ).values_list('student_id', 'subject__name', 'last'):
+        if last_started < inactive_since:
+            inactive_subjects[student_id].append(subject_name)
+
+    past_due_ids = {
+        assignment_id
+        for class_level in {class_level for _, class_level in students if class_level}
+        for assignment_id, _ in context.past_due[class_level]
+    }
+    submitted_past_due = set()
+    if past_due_ids:
+        submitted_past_due = set(
+            AssignmentSubmission.objects.filter(
+                student_id__in=user_ids, assignment_id__in=past_due_ids
+            ).values_list('student_id', 'assignment_id')
+        )
+
+    summaries = {}
+    for user_id, class_level in students:
+        subject_rows = sessions.get(user_id, [])
+        session_count = sum(row['count'] for row in subject_rows)
+        study_seconds = sum(row['duration'].total_seconds() for row in subject_rows if row['duration'])
+        top_subjects = sorted(
+            (row for row in subject_rows if row['subject__name']),
+            key=lambda row: row['duration'] or timedelta(0),
+            reverse=True
+        )[:3]
+
+        achievements = list(good_grades.get(user_id, []))
+        if session_count >= ACTIVE_SESSIONS_ACHIEVEMENT:
+            achievements.append(f"Completed {session_count} AI tutoring sessions this week")
+
+        improvement_areas = []
+        missing = [
+            title for assignment_id, title in context.past_due.get(class_level, [])
+            if (user_id, assignment_id) not in submitted_past_due
+        ]
+        for title in missing[:2]:
+            improvement_areas.append({
+                'description': f"Missing submission for '{title}'",
+                'suggestion': "Try to complete assignments before their due dates"
+            })
+        for subject_name in inactive_subjects.get(user_id, [])[:2]:
+            improvement_areas.append({
+                'description': f"Low recent activity in {subject_name}",
+                'suggestion': f"Consider scheduling more study time for {subject_name}"
+            })
+
+        summaries[user_id] = {
+            'stats': {
+                # Material views are only counted per material, not per student
+                'materials_viewed': 0,
+                'assignments_completed': submitted.get(user_id, 0),
+                'classes_attended': classes_attended.get(user_id, 0),
+                'study_hours': round(study_seconds / 3600, 1),
+            },
+            'highlights': {
+                'top_subjects': [
+                    {
+                        'name': row['subject__name'],
+                        'hours': round(row['duration'].total_seconds() / 3600, 1) if row['duration'] else 0
+                    }
+                    for row in top_subjects
+                ],
+                'recent_achievements': achievements[:3],
+                'improvement_areas': improvement_areas,
+                'upcoming_deadlines': context.upcoming.get(class_level, []),
+            },
+        }
+    return summaries
+
+
+def weekly_summary_recipients():
+    """Active students with an email address who have not turned weekly summaries off"""
+    return User.objects.filter(
+        is_active=True, profile__role='student'
+    ).exclude(email='').filter(
+        Q(settings__isnull=True) | Q(settings__email_weekly_summary=True)
+    )
+
+
+def iter_weekly_summaries(chunk_size=WEEKLY_SUMMARY_CHUNK_SIZE, now=None, users=None):
+    """
+    Compute weekly summaries chunk by chunk
+
+    Args:
+        chunk_size (int): Students per chunk
+        now (datetime, optional): End of the reporting week
+        users (QuerySet, optional): Students to summarise, weekly_summary_recipients() by default
+
+    Yields:
+        list: (user, summary) pairs for one chunk, in user id order
+    """
+    users = weekly_summary_recipients() if users is None else users
+    context = WeeklySummaryContext(now)
+    last_id = 0
+    while True:
+        chunk = list(
+            users.filter(id__gt=last_id).order_by('id').select_related('profile')
+            .only('id', 'username', 'email', 'first_name', 'last_name', 'profile__class_level')[:chunk_size]
+        )
+        if not chunk:
+            return
+        last_id = chunk[-1].id
+        summaries = compute_weekly_summaries([(user.id, user.profile.class_level) for user in chunk], context)
+        yield [(user, summaries[user.id]) for user in chunk]
+
+
+def weekly_summary_key(now):
+    """Outbox key prefix of a week's summaries, e.g. "weekly-summary:2024-W07" (ISO week)"""
+    year, week, _ = now.isocalendar()
+    return f"weekly-summary:{year}-W{week:02d}"
+
+
+def send_weekly_summaries(chunk_size=WEEKLY_SUMMARY_CHUNK_SIZE, dry_run=False, progress=None):
+    """
+    Compute every recipient's weekly summary and put it in the email outbox
+
+    Emails are keyed by ISO week and address, so running this again in the
+    same week (e.g. after a crash) does not email anyone twice.
+
+    Args:
+        chunk_size (int): Students per chunk
+        dry_run (bool): Compute the summaries without queueing them
+        progress (callable, optional): Called as progress(processed, total, queued) after each chunk
+
+    Returns:
+        dict: Number of students processed and of emails newly queued
+    """
+    from core.email_service import build_weekly_summary_emails
+    from core.outbox_service import queue_emails
+
+    now = timezone.now()
+    key_prefix = weekly_summary_key(now)
+    total = weekly_summary_recipients().count()
+    processed = queued = 0
+    for chunk in iter_weekly_summaries(chunk_size, now=now):
+        if not dry_run:
+            queued += queue_emails(key_prefix, build_weekly_summary_emails(chunk))
+        processed += len(chunk)
+        if progress:
+            progress(processed, total, queued)
+
+    logger.info(f"Weekly summaries: {processed} students, {queued} emails queued")
+    return {'students': processed, 'queued': queued}
@@ -3,12 +3,11 @@ import json
 import time
 import jwt
 import requests
-import tempfile
 import logging
 from datetime import datetime, timedelta
 from django.conf import settings
 from zoomus import ZoomClient
-from core.s3_service import upload_file_to_s3, create_presigned_url
+from core.s3_service import upload_stream_to_s3, create_presigned_url
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -18,6 +17,11 @@ ZOOM_API_KEY = os.environ.get('ZOOM_API_KEY')
 ZOOM_API_SECRET = os.environ.get('ZOOM_API_SECRET')
 ZOOM_API_BASE_URL = 'https://api.zoom.us/v2'
 
+# Recordings are read from Zoom in chunks of this size while streaming to S3
+RECORDING_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Seconds to wait for Zoom to connect or send the next chunk of a recording
+RECORDING_DOWNLOAD_TIMEOUT = 60
+
 def is_zoom_configured():
     """
     Check if Zoom API is configured with valid credentials
@@ -479,15 +483,49 @@ def get_meeting_participants(meeting_id):
         }
 
 
-def download_recording_to_s3(meeting_id, recording_file=None, conference_obj=None):
+def stream_recording(download_url, offset=0):
+    """
+    Stream a recording download from Zoom, starting at a byte offset
+    
+    Args:
+        download_url (str): Authenticated recording download URL
+        offset (int): Bytes to skip, requested with an HTTP Range header
+        
+    Yields:
+        bytes: Chunks of the recording
+    """
+    headers = {'Range': f"bytes={offset}-"} if offset else {}
+    with requests.get(download_url, headers=headers, stream=True, timeout=RECORDING_DOWNLOAD_TIMEOUT) as r:
+        # Range Not Satisfiable: the offset is the end of the recording
+        if offset and r.status_code == 416:
+            return
+        r.raise_for_status()
+        
+        # Skip the bytes ourselves if the server sent the whole file
+        skip = offset if r.status_code != 206 else 0
+        for chunk in r.iter_content(chunk_size=RECORDING_DOWNLOAD_CHUNK_SIZE):
+            if skip:
+                if len(chunk) <= skip:
+                    skip -= len(chunk)
+                    continue
+                chunk = chunk[skip:]
+                skip = 0
+            yield chunk
+
+def download_recording_to_s3(meeting_id, recording_file=None, conference_obj=None, progress=None):
     """
-    Download a recording from Zoom and upload it to S3
+    Stream recordings from Zoom into S3
+    
+    Each recording is piped into an S3 multipart upload as it downloads, so
+    no local copy is made. An upload interrupted by a crash is resumed from
+    its last uploaded part the next time the recording is processed.
     
     Args:
         meeting_id (str): Past meeting ID
         recording_file (dict, optional): Specific recording file object to download.
                                         If None, all recording files will be processed.
         conference_obj (VideoConference, optional): Associated VideoConference object to update with recording info
+        progress (callable, optional): Called with (bytes uploaded, file size) as each recording uploads
         
     Returns:
         dict: Result with success status and uploaded file information
@@ -557,39 +595,29 @@ def download_recording_to_s3(meeting_id, recording_file=None, conference_obj=Non
         download_url_with_token = f"{download_url}?access_token={generate_jwt_token()}"
         
         try:
-            # Download the file to a temporary location
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
-                temp_path = temp_file.name
-                
-                logger.info(f"Downloading recording to {temp_path}")
-                
-                # Stream the download to avoid memory issues with large files
-                with requests.get(download_url_with_token, stream=True) as r:
-                    r.raise_for_status()
-                    for chunk in r.iter_content(chunk_size=8192):
-                        temp_file.write(chunk)
-            
-            # Get file size in MB for record keeping
-            file_size_mb = os.path.getsize(temp_path) / (1024 * 1024)
-            
-            # Generate a meaningful object name with meeting info
+            # Generate a meaningful object name with meeting info; it stays the
+            # same across attempts so an interrupted upload can be resumed
             meeting_topic = recording_info.get('topic', '').replace(' ', '_')
             recording_start = file.get('recording_start', '').replace(':', '-').replace(' ', '_')
             
             object_name = f"recordings/{meeting_id}/{meeting_topic}_{recording_start}_{file.get('id')}.mp4"
             
-            # Upload the file to S3
-            s3_result = upload_file_to_s3(
-                file_path=temp_path,
-                object_name=object_name,
+            logger.info(f"Streaming recording {file.get('id')} to S3 as {object_name}")
+            
+            # Stream the download straight into S3 without a local copy
+            s3_result = upload_stream_to_s3(
+                lambda offset: stream_recording(download_url_with_token, offset),
+                object_name,
                 extra_args={
                     'ContentType': 'video/mp4',
                     'ACL': 'private'
-                }
+                },
+                expected_size=file.get('file_size'),
+                progress=progress
             )
             
-            # Clean up the temporary file
-            os.unlink(temp_path)
+            # Get file size in MB for record keeping
+            file_size_mb = s3_result.get('size', 0) / (1024 * 1024)
             
             if s3_result.get('success'):
                 # Add result to the list of successful uploads
@@ -600,6 +628,7 @@ def download_recording_to_s3(meeting_id, recording_file=None, conference_obj=Non
                     's3_object_key': object_name,
                     'file_url': s3_result.get('file_url'),
                     'file_size_mb': file_size_mb,
+                    'throughput_mb_s': s3_result.get('throughput_mb_s'),
                     'recording_start': file.get('recording_start'),
                     'recording_end': file.get('recording_end')
                 }
@@ -612,7 +641,8 @@ def download_recording_to_s3(meeting_id, recording_file=None, conference_obj=Non
                     conference_obj.recording_s3_key = object_name
                     conference_obj.recording_processed_at = datetime.now(timezone.utc)
                     conference_obj.save()
-                    
+                
+                results['recording_url'] = s3_result.get('file_url')
                 results['uploads'].append(upload_info)
             else:
                 logger.error(f"S3 upload failed: {s3_result.get('error')}")
@@ -22,8 +22,8 @@ def is_admin(user):
     if not user.is_authenticated:
         return False
     try:
-        profile = UserProfile.objects.get(user=user)
-        return profile.role == 'admin'
+        # Primed by UserProfileMiddleware, so this does not query
+        return user.profile.role == 'admin'
     except UserProfile.DoesNotExist:
         return False
 
@@ -196,7 +196,7 @@ bind = "unix:/var/www/the360learning-production/gunicorn.sock"
 workers = 3
 user = "www-data"
 group = "www-data"
-worker_class = "sync"
+worker_class = "uvicorn.workers.UvicornWorker"
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 100
@@ -211,7 +211,7 @@ bind = "unix:/var/www/the360learning-development/gunicorn.sock"
 workers = 2
 user = "www-data"
 group = "www-data"
-worker_class = "sync"
+worker_class = "uvicorn.workers.UvicornWorker"
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 100
@@ -252,7 +252,7 @@ User=www-data
 Group=www-data
 WorkingDirectory=/var/www/the360learning-production
 Environment=PATH=/var/www/the360learning-production/venv/bin
-ExecStart=/var/www/the360learning-production/venv/bin/gunicorn -c gunicorn.conf.py learning_is_easy.wsgi:application
+ExecStart=/var/www/the360learning-production/venv/bin/gunicorn -c gunicorn.conf.py learning_is_easy.asgi:application
 ExecReload=/bin/kill -s HUP $MAINPID
 Restart=on-failure
 RestartSec=10
@@ -273,7 +273,7 @@ User=www-data
 Group=www-data
 WorkingDirectory=/var/www/the360learning-development
 Environment=PATH=/var/www/the360learning-development/venv/bin
-ExecStart=/var/www/the360learning-development/venv/bin/gunicorn -c gunicorn.conf.py learning_is_easy.wsgi:application
+ExecStart=/var/www/the360learning-development/venv/bin/gunicorn -c gunicorn.conf.py learning_is_easy.asgi:application
 ExecReload=/bin/kill -s HUP $MAINPID
 Restart=on-failure
 RestartSec=10
@@ -283,8 +283,9 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // Handle visibility of meeting fields and form submission with OAuth option
-    const conferenceForm = document.querySelector('form');
     const useZoomOAuth = document.getElementById('use_zoom_oauth');
+    // The form holding the checkbox, not the navbar's logout form
+    const conferenceForm = useZoomOAuth ? useZoomOAuth.form : null;
     const manualMeetingFields = document.getElementById('manual_meeting_fields');
     const oauthMeetingInfo = document.getElementById('oauth_meeting_info');
     